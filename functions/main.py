@@ -1,13 +1,100 @@
-# Welcome to Cloud Functions for Firebase for Python!
-# To get started, simply uncomment the below code or create your own.
-# Deploy with `firebase deploy`
+# Python Cloud Functions for the Litrix backend: the scrape and chat handlers
+# and the scheduled jobs (profile refresh, collaboration suggestions).
+# Deploy with `firebase deploy --only functions`.
+#
+# The handlers reuse the Flask backend in src/backend. Locally (emulator) it is
+# imported from the repository; for a deploy, copy src/backend into
+# functions/backend. Nothing heavy is imported at module load: each handler
+# imports its backend module on its first request, and the Firestore client is
+# created by database/client.py on first use (default credentials).
 
-from firebase_functions import https_fn
-from firebase_admin import initialize_app
+import os
+import sys
+import json
+import time
+import logging
 
-# initialize_app()
-#
-#
-# @https_fn.on_request()
-# def on_request_example(req: https_fn.Request) -> https_fn.Response:
-#     return https_fn.Response("Hello world!")
\ No newline at end of file
+from firebase_functions import https_fn, scheduler_fn, options
+
+_here = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.join(_here, "backend"), os.path.join(_here, "..", "src", "backend")):
+    if os.path.isdir(_path):
+        sys.path.insert(0, _path)
+        break
+
+_loaded = time.perf_counter()
+_served = set()
+
+cors = options.CorsOptions(cors_origins=["https://litrix-f06e0.web.app"], cors_methods=["get", "post"])
+
+
+def json_response(body, status=200):
+    return https_fn.Response(json.dumps(body), status=status, mimetype="application/json")
+
+
+# Log how long the instance took from module load to its first response
+def log_first_request(name, started):
+    if name not in _served:
+        _served.add(name)
+        now = time.perf_counter()
+        logging.info(f"{name}: first request {(now - started) * 1000:.0f} ms, "
+                     f"{(now - _loaded) * 1000:.0f} ms since module load")
+
+
+# Scrape one profile and store it. Instances may be throttled once a response
+# is sent, so the scrape runs inside the request instead of on the job queue.
+@https_fn.on_request(cors=cors, timeout_sec=540, memory=options.MemoryOption.GB_1)
+def scrape(req: https_fn.Request) -> https_fn.Response:
+    started = time.perf_counter()
+    import app as backend
+    from jobs import Job
+
+    data = req.get_json(silent=True) or {}
+    scholar_id = backend.extract_scholar_id(data.get("googleScholarLink") or "")
+    if not scholar_id:
+        return json_response({"error": "Invalid Google Scholar URL"}, 400)
+
+    college = data.get("college")
+    department = data.get("department")
+    job = Job(scholar_id, {"scholar_id": scholar_id, "college": college, "department": department})
+    try:
+        result = backend.scrape_and_store(job, scholar_id, college, department)
+    except Exception as e:
+        logging.error(f"Scrape failed for {scholar_id} at '{job.stage}': {e}")
+        return json_response({"error": str(e), "stage": job.stage}, 500)
+    finally:
+        log_first_request("scrape", started)
+    return json_response(result)
+
+
+# Same request/response contract as the Flask /chat route (including streaming)
+@https_fn.on_request(cors=cors, timeout_sec=120, memory=options.MemoryOption.MB_512)
+def chat(req: https_fn.Request) -> https_fn.Response:
+    started = time.perf_counter()
+    import scraping as backend
+
+    with backend.app.request_context(req.environ):
+        response = backend.app.make_response(backend.chat())
+    log_first_request("chat", started)
+    return response
+
+
+# Spend the daily Scholar request budget on the most valuable profile
+# refreshes. Runs hourly so the budget is spread over the day; each run stops
+# before the function timeout and the next one carries on.
+@scheduler_fn.on_schedule(schedule="every 1 hours", timeout_sec=540, memory=options.MemoryOption.GB_1)
+def refresh(event: scheduler_fn.ScheduledEvent) -> None:
+    from database.client import db
+    from scraping.refresh_scheduler import RefreshScheduler
+
+    RefreshScheduler(db).run(time_limit=480)
+
+
+# Recompute collaboration suggestions for colleges whose graph inputs changed
+# since the last run (scrapes only mark the graph stale)
+@scheduler_fn.on_schedule(schedule="every 1 hours", timeout_sec=540, memory=options.MemoryOption.GB_1)
+def collaborations(event: scheduler_fn.ScheduledEvent) -> None:
+    from database.client import db
+    from database.collaborations import update_stale_collaborations
+
+    update_stale_collaborations(db)
@@ -1,32 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore
-from scholarly import scholarly
 import re
 import logging
-import random
-
-
-# Initialize Firebase
-cred = credentials.Certificate('/Users/ruba/Downloads/Majd/litrix/litrix-f06e0-firebase-adminsdk-5uspj-5aecd2badc.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-# List of proxies 
-proxy_pool = [
-   '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-   '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-   '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-]
-
-def get_random_proxy():
-    return random.choice(proxy_pool)
+import os
+import time
+from jobs import JobQueue
+from metrics import instrument_app, SCHOLAR_SECONDS, SCRAPE_STAGE_SECONDS, JOBS_IN_FLIGHT
+from database.rollups import get_rollup
+from database.collaborations import CollaborationRecommender
+from database.topics import TopicIndex
+from database.client import db
+from firebase_admin import firestore
 
 
 # Initialize Flask
 app = Flask(__name__)
 CORS(app, origins=["https://litrix-f06e0.web.app"])
+instrument_app(app)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
@@ -35,6 +25,45 @@ def extract_scholar_id(scholar_url):
     match = re.search(pattern, scholar_url)
     return match.group(1) if match else None
 
+# Scrape a profile and store it; runs on the job queue, not in the request
+def scrape_and_store(job, scholar_id, college, department):
+    # scholarly pulls in selenium/httpx; only pay for it when a scrape runs
+    from scholarly import scholarly
+    from scraping.proxy_manager import install_proxy_manager
+    from scraping.scraped_and_stored.store_json_files import store_faculty_data
+
+    # Every page of this author's crawl goes through one healthy proxy
+    proxies = install_proxy_manager()
+    try:
+        with proxies.session(scholar_id):
+            job.update("fetching author", 0.1)
+            with SCHOLAR_SECONDS.time(operation="search_author_id"):
+                author = scholarly.search_author_id(scholar_id)
+            job.update("filling profile", 0.3)
+            with SCHOLAR_SECONDS.time(operation="fill"):
+                author_filled = scholarly.fill(author)
+    finally:
+        proxies.end_session(scholar_id)
+
+    job.update("storing profile", 0.8)
+    stage_started = time.perf_counter()
+    # Slim summary on the faculty document and the publications in its
+    # subcollection; this also updates the rollups and collaboration graph
+    store_faculty_data(college, department, dict(author_filled, scholar_id=scholar_id), extra_fields={
+        "last_scraped": firestore.SERVER_TIMESTAMP,
+        "refresh_requested": firestore.DELETE_FIELD,
+    })
+    SCRAPE_STAGE_SECONDS.observe(time.perf_counter() - stage_started, stage="store_profile")
+
+    return {"scholar_id": scholar_id, "name": author_filled.get("name", ""),
+            "publications": len(author_filled.get("publications", []))}
+
+
+# Worker pool for scrape jobs (SCRAPE_WORKERS sets its size)
+scrape_queue = JobQueue(scrape_and_store, workers=int(os.environ.get("SCRAPE_WORKERS", 2)))
+JOBS_IN_FLIGHT.set_function(scrape_queue.in_flight, queue="scrape")
+
+
 @app.route('/api/scrape', methods=['POST'])
 def scrape_data():
     data = request.json
@@ -46,37 +75,110 @@ def scrape_data():
     if not scholar_id:
         return jsonify({"error": "Invalid Google Scholar URL"}), 400
 
+    # Requests for a scholar_id that is already queued or running share one job
+    job, created = scrape_queue.submit(scholar_id, scholar_id=scholar_id, college=college, department=department)
+    if created:
+        logging.info(f"Queued scrape job {job.id} for {scholar_id}")
+
+    return jsonify({"job_id": job.id, "status": job.status,
+                    "status_url": f"/api/scrape/{job.id}"}), 202
+
+
+# Ask for a profile to be refreshed by the next scheduled refresh run
+@app.route('/api/refresh', methods=['POST'])
+def refresh_profile():
+    from scraping.refresh_scheduler import request_refresh
+
+    data = request.json
+    scholar_id = data.get('scholar_id') or extract_scholar_id(data.get('googleScholarLink') or '')
+    college = data.get('college')
+    department = data.get('department')
+
+    if not scholar_id or not college or not department:
+        return jsonify({"error": "scholar_id (or googleScholarLink), college and department are required"}), 400
+
+    request_refresh(db, college, department, scholar_id)
+    return jsonify({"scholar_id": scholar_id, "status": "refresh requested"}), 202
+
+
+@app.route('/api/scrape/<job_id>', methods=['GET'])
+def scrape_status(job_id):
+    job = scrape_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(job.to_dict()), 200
+
+
+# Fuzzy search over faculty and publications, one page at a time.
+# ?q=&college=&department=(repeatable)&type=faculty|publication&year_from=&year_to=&limit=&cursor=
+@app.route('/api/search', methods=['GET'])
+def search():
+    from scraping.fuzzy_search import get_fuzzy_search
+
     try:
-        author = scholarly.search_author_id(scholar_id)
-        author_filled = scholarly.fill(author)
-        faculty_ref = db.collection("colleges").document(college) \
-            .collection("departments").document(department) \
-            .collection("faculty_members").document(scholar_id)
-
-        faculty_ref.set({
-            "name": author_filled.get("name", ""),
-            "scholar_id": scholar_id,
-            "affiliation": author_filled.get("affiliation", ""),
-            "interests": author_filled.get("interests", []),
-            "hindex": author_filled.get("hindex", 0),
-            "email_domain": author_filled.get("email_domain", ""),
-            "homepage": author_filled.get("homepage", ""),
-            "hindex5y": author_filled.get("hindex5y", 0),
-            "i10index": author_filled.get("i10index", 0),
-            "i10index5y": author_filled.get("i10index5y", 0),
-            "citedby": author_filled.get("citedby", 0),
-            "citedby5y": author_filled.get("citedby5y", 0),
-            "cites_per_year": author_filled.get("cites_per_year", {}),
-            "coauthors": author_filled.get("coauthors", []),
-            "url_picture": author_filled.get("url_picture", ""),
-            "publications": author_filled.get("publications", [])
-        })
-
-        return jsonify({"message": "Data scraped and stored successfully"}), 200
-
-    except Exception as e:
-        logging.error(f"Error scraping data: {e}")
-        return jsonify({"error": f"Failed to scrape data: {str(e)}"}), 500
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+        year_from = request.args.get('year_from', type=int)
+        year_to = request.args.get('year_to', type=int)
+        if request.args.get('year'):
+            year_from = year_to = int(request.args['year'])
+        departments = [d for value in request.args.getlist('department') for d in value.split(',') if d]
+        types = [t for t in request.args.get('type', '').split(',') if t]
+        results = get_fuzzy_search(db).search(request.args.get('q', ''), college_id=request.args.get('college'),
+                                               types=types, departments=departments, year_from=year_from,
+                                               year_to=year_to, limit=limit, cursor=request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(results), 200
+
+# Stream a department's publications or faculty members as NDJSON or CSV.
+# ?kind=publications|faculty&format=ndjson|csv&gzip=1&cursor=
+@app.route('/api/export/<college_id>/<department_id>', methods=['GET'])
+def export(college_id, department_id):
+    from database.export import export_department, export_filename, CONTENT_TYPES
+
+    kind = request.args.get('kind', 'publications')
+    fmt = request.args.get('format', 'ndjson')
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        chunks = export_department(db, college_id, department_id, kind, fmt, compress, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    filename = export_filename(college_id, department_id, kind, fmt, compress)
+    return Response(stream_with_context(chunks),
+                    mimetype="application/gzip" if compress else CONTENT_TYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+# Pre-aggregated department/college analytics (one document read)
+@app.route('/api/analytics/<college_id>', methods=['GET'])
+def analytics(college_id):
+    department_id = request.args.get('department')
+    rollup = get_rollup(db, college_id, department_id)
+    if rollup is None:
+        return jsonify({"error": "No analytics available"}), 404
+    return jsonify(rollup), 200
+
+collaboration_recommender = CollaborationRecommender(db)
+
+# Precomputed collaboration suggestions for one researcher
+@app.route('/api/collaborations/<college_id>/<scholar_id>', methods=['GET'])
+def collaborations(college_id, scholar_id):
+    suggestions = collaboration_recommender.recommend(college_id, scholar_id)
+    if suggestions is None:
+        return jsonify({"error": "No suggestions for this researcher"}), 404
+    return jsonify({"scholar_id": scholar_id, "suggestions": suggestions}), 200
+
+topic_index = TopicIndex(db)
+
+# Faculty working on a topic (?topic=t03 or ?q=artificial intelligence), or
+# the college's topics when neither is given; one cached document read
+@app.route('/api/topics/<college_id>', methods=['GET'])
+def topics(college_id):
+    result = topic_index.lookup(college_id, topic_id=request.args.get('topic'), query=request.args.get('q'),
+                                department_id=request.args.get('department'),
+                                limit=min(request.args.get('limit', 50, type=int), 200))
+    if result is None:
+        return jsonify({"error": "No topic index for this college"}), 404
+    return jsonify(result), 200
 
 if __name__ == '__main__':
       app.run(debug=False)
\ No newline at end of file
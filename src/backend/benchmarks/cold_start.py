@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+# Cold start benchmark for the API entry points. Each run is a fresh
+# interpreter that imports the entry module and serves one request through
+# the Flask test client, so the numbers are what a new instance pays:
+#
+#   python -m benchmarks.cold_start                 # offline, from src/backend
+#   python -m benchmarks.cold_start --live --college faculty_computing
+#
+# Offline runs replace the two network calls (Firestore retrieval and the
+# completion API) inside the child process; --live leaves them in place and
+# needs FIREBASE_CREDENTIALS (or default credentials) and OPENAI_API_KEY.
+# "eager_imports" is the import cost the entry modules paid at load time
+# before initialization was made lazy, for comparison.
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r'''
+import sys, json, time
+t0 = time.perf_counter()
+{setup}
+t1 = time.perf_counter()
+{request}
+t2 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000, "modules": len(sys.modules)}}))
+'''
+
+OFFLINE_CHAT = '''
+from types import SimpleNamespace
+scraping.faculty_search.search = lambda *args, **kwargs: []
+scraping.complete = lambda messages, stream=False: SimpleNamespace(
+    choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+'''
+
+TARGETS = {
+    "scrape": {
+        "setup": "import app",
+        "request": "response = app.app.test_client().get('/api/scrape/missing')\nassert response.status_code == 404",
+        "live_request": "response = app.app.test_client().get('/api/analytics/{college}')\nassert response.status_code in (200, 404)",
+    },
+    "chat": {
+        "setup": "import scraping",
+        "request": OFFLINE_CHAT + "response = scraping.app.test_client().post('/chat', json={{'query': 'machine learning', "
+                                  "'college': '{college}', 'department': '{department}'}})\nassert response.status_code == 200",
+        "live_request": "response = scraping.app.test_client().post('/chat', json={{'query': 'machine learning', "
+                        "'college': '{college}', 'department': '{department}'}})\nassert response.status_code == 200",
+    },
+    "eager_imports": {
+        "setup": "import flask, flask_cors\nfrom firebase_admin import firestore\nfrom scholarly import scholarly\nimport openai\n"
+                 "import numpy, scipy.sparse\nfrom sklearn.feature_extraction.text import HashingVectorizer",
+        "request": "pass",
+        "live_request": "pass",
+    },
+}
+
+
+def run_once(target, live, college, department, env):
+    spec = TARGETS[target]
+    request = (spec["live_request"] if live else spec["request"]).format(college=college, department=department)
+    code = CHILD.format(setup=spec["setup"], request=request)
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{target} run failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    imports = [s["import_ms"] for s in samples]
+    requests = [s["first_request_ms"] for s in samples]
+    totals = [s["import_ms"] + s["first_request_ms"] for s in samples]
+    return {
+        "runs": len(samples),
+        "import_ms": round(statistics.median(imports), 1),
+        "first_request_ms": round(statistics.median(requests), 1),
+        "cold_start_ms": round(statistics.median(totals), 1),
+        "cold_start_max_ms": round(max(totals), 1),
+        "modules": samples[-1]["modules"],
+    }
+
+
+def benchmark(targets, runs=5, live=False, college="faculty_computing", department="dept_cs"):
+    env = dict(os.environ)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        if not live:
+            # Empty vector store so the offline chat request doesn't touch real data
+            env["VECTOR_STORE_DIR"] = os.path.join(tmp, "vector_store")
+        for target in targets:
+            # First run warms the bytecode cache; it isn't counted
+            run_once(target, live, college, department, env)
+            results[target] = summarize([run_once(target, live, college, department, env) for _ in range(runs)])
+    return results
+
+
+def print_results(results):
+    print(f"{'target':<15}{'import ms':>12}{'1st request ms':>16}{'cold start ms':>15}{'max ms':>10}{'modules':>9}")
+    for target, r in results.items():
+        print(f"{target:<15}{r['import_ms']:>12.1f}{r['first_request_ms']:>16.1f}{r['cold_start_ms']:>15.1f}"
+              f"{r['cold_start_max_ms']:>10.1f}{r['modules']:>9}")
+    eager = results.get("eager_imports")
+    if eager:
+        for target in ("scrape", "chat"):
+            if target in results and eager["import_ms"] > 0:
+                saved = eager["import_ms"] - results[target]["import_ms"]
+                print(f"{target}: import is {saved:.0f} ms faster than the eager imports "
+                      f"({results[target]['import_ms'] / eager['import_ms']:.0%} of the cost)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure import time and first-request latency of the API entry points")
+    parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=["scrape", "chat", "eager_imports"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="hit Firestore and the completion API for real")
+    parser.add_argument("--college", default="faculty_computing")
+    parser.add_argument("--department", default="dept_cs")
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = benchmark(args.targets, runs=args.runs, live=args.live, college=args.college, department=args.department)
+    print_results(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,253 @@
+import json
+import time
+import itertools
+from firebase_admin import firestore
+
+# In-memory stand-in for the parts of the Firestore client the backend uses:
+# documents, collections, queries (select/order_by/limit/start_after), write
+# batches, transactions and listeners. Every call that would be a round trip
+# is counted in `rpcs`, with documents read and written (and their encoded
+# size) counted separately, so benchmarks can report RPC counts without a
+# network.
+#
+# Transactions implement the small protocol firestore.transactional drives
+# (_begin/_commit/_rollback/_clean_up), which lets decorated functions run
+# unchanged.
+
+_auto_ids = itertools.count()
+
+
+def resolve(value, existing=None):
+    if value is firestore.SERVER_TIMESTAMP:
+        return time.time()
+    if type(value).__name__ == "ArrayUnion":
+        current = list(existing or [])
+        return current + [v for v in value.values if v not in current]
+    if type(value).__name__ == "ArrayRemove":
+        return [v for v in (existing or []) if v not in value.values]
+    if value is firestore.DELETE_FIELD:
+        return None
+    return value
+
+
+def apply_write(current, data, merge):
+    result = dict(current) if merge and current is not None else {}
+    for key, value in data.items():
+        if value is firestore.DELETE_FIELD:
+            result.pop(key, None)
+        else:
+            result[key] = resolve(value, result.get(key))
+    return result
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocument:
+    def __init__(self, db, parent_path, doc_id):
+        self._db = db
+        self.parent_path = parent_path
+        self.id = doc_id
+        self.path = "/".join(parent_path + (doc_id,))
+
+    def collection(self, name):
+        return FakeCollection(self._db, self.parent_path + (self.id, name))
+
+    def collections(self):
+        self._db.rpcs += 1
+        prefix = self.parent_path + (self.id,)
+        return [FakeCollection(self._db, path) for path in sorted(self._db.docs)
+                if len(path) == len(prefix) + 1 and path[:-1] == prefix and self._db.docs[path]]
+
+    def _data(self):
+        return self._db.docs.get(self.parent_path, {}).get(self.id)
+
+    def get(self, field_paths=None, transaction=None):
+        self._db.rpcs += 1
+        self._db.reads += 1
+        return FakeSnapshot(self, self._data())
+
+    def set(self, data, merge=False):
+        self._db.rpcs += 1
+        self._db._write(self, data, merge)
+
+    def update(self, data):
+        self._db.rpcs += 1
+        if self._data() is None:
+            raise KeyError(f"No document to update: {self.path}")
+        self._db._write(self, data, True)
+
+    def delete(self):
+        self._db.rpcs += 1
+        self._db._delete(self)
+
+
+class FakeQuery:
+    def __init__(self, collection, order=None, count=None, after=None):
+        self.collection = collection
+        self.order = order
+        self.count = count
+        self.after = after
+
+    def select(self, field_paths):
+        return self
+
+    def order_by(self, field, direction=None):
+        return FakeQuery(self.collection, field, self.count, self.after)
+
+    def limit(self, count):
+        return FakeQuery(self.collection, self.order, count, self.after)
+
+    def start_after(self, snapshot):
+        return FakeQuery(self.collection, self.order, self.count, snapshot.id)
+
+    def stream(self, transaction=None):
+        db = self.collection._db
+        db.rpcs += 1
+        docs = db.docs.get(self.collection.path, {})
+        ids = sorted(docs) if self.order or self.after is not None else list(docs)
+        if self.after is not None:
+            ids = [doc_id for doc_id in ids if doc_id > self.after]
+        if self.count is not None:
+            ids = ids[:self.count]
+        for doc_id in ids:
+            db.reads += 1
+            yield FakeSnapshot(FakeDocument(db, self.collection.path, doc_id), docs[doc_id])
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class FakeWatch:
+    def unsubscribe(self):
+        pass
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path):
+        super().__init__(self)
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+
+    def document(self, doc_id=None):
+        return FakeDocument(self._db, self.path, doc_id or f"auto{next(_auto_ids):012d}")
+
+    # Listeners never fire; the initial state is read with stream()
+    def on_snapshot(self, callback):
+        return FakeWatch()
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self.ops = []
+
+    def set(self, reference, data, merge=False):
+        self.ops.append(("set", reference, data, merge))
+
+    def update(self, reference, data):
+        self.ops.append(("set", reference, data, True))
+
+    def delete(self, reference):
+        self.ops.append(("delete", reference, None, False))
+
+    def __len__(self):
+        return len(self.ops)
+
+    def commit(self):
+        self._db.rpcs += 1
+        self._db.commits += 1
+        self._db.batch_sizes.append(len(self.ops))
+        for op, reference, data, merge in self.ops:
+            if op == "set":
+                self._db._write(reference, data, merge)
+            else:
+                self._db._delete(reference)
+        self.ops = []
+        return []
+
+
+class FakeTransaction(FakeBatch):
+    _read_only = False
+    _max_attempts = 5
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._id = None
+
+    def _clean_up(self):
+        self.ops = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._db.rpcs += 1
+        self._id = b"fake"
+
+    def _commit(self):
+        self.commit()
+        self._id = None
+
+    def _rollback(self):
+        self._clean_up()
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def get(self, reference):
+        return reference.get(transaction=self)
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.rpcs = 0
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.commits = 0
+        self.bytes_written = 0
+        self.batch_sizes = []
+
+    def counters(self):
+        return {"rpcs": self.rpcs, "reads": self.reads, "writes": self.writes,
+                "deletes": self.deletes, "commits": self.commits,
+                "max_batch": max(self.batch_sizes, default=0), "bytes_written": self.bytes_written}
+
+    def collection(self, name):
+        return FakeCollection(self, (name,))
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def transaction(self, **kwargs):
+        return FakeTransaction(self)
+
+    def _write(self, reference, data, merge):
+        self.writes += 1
+        # Encoding stands in for the client serializing the document
+        self.bytes_written += len(json.dumps(data, default=str))
+        docs = self.docs.setdefault(reference.parent_path, {})
+        docs[reference.id] = apply_write(docs.get(reference.id), data, merge)
+
+    def _delete(self, reference):
+        self.deletes += 1
+        self.docs.get(reference.parent_path, {}).pop(reference.id, None)
+
+    def document_count(self):
+        return sum(len(docs) for docs in self.docs.values())
@@ -0,0 +1,321 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tracemalloc
+import contextlib
+
+import database.client
+from benchmarks.fake_firestore import FakeFirestore
+
+# Micro-benchmarks for the storage and retrieval paths, run offline against
+# the in-memory Firestore in fake_firestore.py with synthetic authors:
+#
+#   python -m benchmarks.storage                          # from src/backend
+#   python -m benchmarks.storage --sizes 10 1k --cases store_faculty_data
+#   python -m benchmarks.storage --update-baseline        # accept the current numbers
+#
+# Every case reports ops/sec (publications, URLs or queries per second),
+# Firestore RPC/read/write counts for one call and the peak memory allocated
+# during that call. The results are compared with the JSON baseline and the
+# run exits non-zero when a case is slower, uses more memory than the
+# threshold allows, or issues more RPCs than the baseline. Timings are only
+# comparable on one machine, so the first run on a machine writes its baseline.
+
+SIZES = {"10": 10, "1k": 1000, "50k": 50000}
+COLLEGE = "faculty_computing"
+DEPARTMENT = "dept_cs"
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "storage.json")
+
+WORDS = ("learning deep neural network model data analysis secure cloud computing system performance "
+         "distributed graph algorithm optimization arabic language processing detection image mobile "
+         "privacy blockchain internet things energy efficient scheduling federated survey framework").split()
+NAMES = ("Ahmed Alghamdi", "Sara Alzahrani", "Fahad Alqarni", "Noura Alshehri", "Omar Saeed",
+         "Layla Hassan", "Khalid Almalki", "Huda Alharbi", "Yousef Ali", "Mona Alotaibi")
+
+
+# One publication in the shape scholarly returns after fill()
+def synthetic_publication(rng, scholar_id, i):
+    year = rng.randint(2005, 2024)
+    # A few rare tokens per title, so titles are about as distinct as real ones
+    words = [rng.choice(WORDS) for _ in range(rng.randint(4, 9))] + [f"x{rng.randint(0, 10 ** 6):x}" for _ in range(3)]
+    rng.shuffle(words)
+    title = " ".join(words).capitalize() + f" {i}"
+    doi = f"10.{rng.randint(1000, 9999)}/j.{rng.randint(100000, 999999)}.{i}"
+    return {
+        "bib": {
+            "title": title,
+            "pub_year": str(year),
+            "author": " and ".join(rng.sample(NAMES, rng.randint(1, 4))),
+            "journal": f"Journal of {rng.choice(WORDS).capitalize()}",
+            "citation": f"Journal {rng.randint(1, 40)} ({year})",
+            "abstract": " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90))),
+        },
+        "num_citations": rng.randint(0, 300),
+        "author_pub_id": f"{scholar_id}:{i:08x}" if rng.random() < 0.9 else "",
+        "pub_url": f"https://doi.org/{doi}" if rng.random() < 0.4 else f"https://scholar.example.org/p/{i}",
+        "cites_per_year": {str(y): rng.randint(0, 30) for y in range(year, min(year + 5, 2025))},
+        "filled": True,
+    }
+
+
+def synthetic_author(publications, seed=1, scholar_id="SYNTH0000001"):
+    rng = random.Random(seed)
+    return {
+        "scholar_id": scholar_id,
+        "name": rng.choice(NAMES),
+        "affiliation": "Al-Baha University",
+        "interests": rng.sample(WORDS, 4),
+        "hindex": rng.randint(1, 40),
+        "i10index": rng.randint(1, 80),
+        "citedby": rng.randint(10, 5000),
+        "cites_per_year": {str(y): rng.randint(0, 500) for y in range(2010, 2025)},
+        "coauthors": [{"name": name, "scholar_id": f"CO{j:010d}"} for j, name in enumerate(rng.sample(NAMES, 3))],
+        "publications": [synthetic_publication(rng, scholar_id, i) for i in range(publications)],
+        "college_id": COLLEGE,
+        "department_id": DEPARTMENT,
+    }
+
+
+def fresh_db():
+    db = FakeFirestore()
+    database.client._client = db
+    return db
+
+
+def faculty_ref(db, scholar_id):
+    return db.collection("colleges").document(COLLEGE).collection("departments").document(DEPARTMENT) \
+        .collection("faculty_members").document(scholar_id)
+
+
+# Each case: setup(dataset, db) -> state (untimed), run(state) (timed), ops(dataset)
+def case_extract_doi():
+    from scraping.scraped_and_stored.records import extract_doi
+
+    def setup(author, db):
+        return [pub["pub_url"] for pub in author["publications"]]
+
+    def run(urls):
+        for url in urls:
+            extract_doi(url)
+
+    return setup, run, lambda author: len(author["publications"])
+
+
+def case_store_faculty_profile():
+    from database.firestore import store_faculty_profile
+
+    def setup(author, db):
+        return author
+
+    def run(author):
+        store_faculty_profile(COLLEGE, DEPARTMENT, author)
+
+    return setup, run, lambda author: len(author["publications"])
+
+
+def case_store_publications():
+    from database.firestore import store_publications
+    from scraping.scraped_and_stored.records import publication_record
+
+    def setup(author, db):
+        return faculty_ref(db, author["scholar_id"]), [publication_record(pub) for pub in author["publications"]]
+
+    def run(state):
+        store_publications(*state)
+
+    return setup, run, lambda author: len(author["publications"])
+
+
+def case_store_faculty_data(resync=False):
+    import database.dedup
+    from scraping.scraped_and_stored.store_json_files import store_faculty_data
+
+    def setup(author, db):
+        database.dedup._indexes.clear()
+        if resync:
+            # Store once so the timed call finds everything unchanged
+            store_faculty_data(COLLEGE, DEPARTMENT, author)
+            db.reset_counters()
+        return author
+
+    def run(author):
+        store_faculty_data(COLLEGE, DEPARTMENT, author)
+
+    return setup, run, lambda author: len(author["publications"])
+
+
+# Department of authors with up to 50 publications each, written straight into the fake
+def seed_department(db, author):
+    publications = author["publications"]
+    for start in range(0, max(1, len(publications)), 50):
+        scholar_id = f"SYNTH{start // 50:07d}"
+        ref = faculty_ref(db, scholar_id)
+        member = {k: v for k, v in author.items() if k != "publications"}
+        member["scholar_id"] = scholar_id
+        ref.set(member)
+        for i, pub in enumerate(publications[start:start + 50]):
+            ref.collection("publications").document(f"{scholar_id}_{i}").set({
+                "title": pub["bib"]["title"], "abstract": pub["bib"]["abstract"],
+                "pub_year": pub["bib"]["pub_year"], "num_citations": pub["num_citations"]})
+    db.reset_counters()
+
+
+QUERIES = ["deep learning for arabic language", "secure cloud computing", "graph algorithm optimization",
+           "federated learning privacy", "energy efficient scheduling", "image detection neural network"]
+
+
+def case_retrieve_relevant_docs(cold=False):
+    import scraping
+    from scraping.search_index import FacultySearch
+
+    def setup(author, db):
+        seed_department(db, author)
+        scraping.faculty_search = FacultySearch(db)
+        if not cold:
+            scraping.retrieve_relevant_docs(QUERIES[0], COLLEGE, DEPARTMENT)
+            db.reset_counters()
+        return None
+
+    def run(state):
+        if cold:
+            scraping.retrieve_relevant_docs(QUERIES[0], COLLEGE, DEPARTMENT)
+            return
+        for query in QUERIES * 5:
+            scraping.retrieve_relevant_docs(query, COLLEGE, DEPARTMENT)
+
+    # Cold: publications indexed per second; warm: queries per second
+    return setup, run, (lambda author: len(author["publications"])) if cold else (lambda author: len(QUERIES) * 5)
+
+
+CASES = {
+    "extract_doi": case_extract_doi,
+    "store_faculty_profile": case_store_faculty_profile,
+    "store_publications": case_store_publications,
+    "store_faculty_data": case_store_faculty_data,
+    "store_faculty_data_resync": lambda: case_store_faculty_data(resync=True),
+    "retrieve_relevant_docs": case_retrieve_relevant_docs,
+    "retrieve_relevant_docs_cold": lambda: case_retrieve_relevant_docs(cold=True),
+}
+
+
+@contextlib.contextmanager
+def quiet():
+    # The storage functions print a line per call (or per skipped publication)
+    with contextlib.redirect_stdout(io.StringIO()):
+        logging.disable(logging.CRITICAL)
+        try:
+            yield
+        finally:
+            logging.disable(logging.NOTSET)
+
+
+def measure(name, author, min_time=0.5, max_repeats=20):
+    setup, run, ops = CASES[name]()
+
+    # Warm-up call, so modules imported on first use don't count as memory
+    db = fresh_db()
+    with quiet():
+        run(setup(author, db))
+
+    # One instrumented call for RPC counts and peak memory
+    db = fresh_db()
+    with quiet():
+        state = setup(author, db)
+        db.reset_counters()
+        tracemalloc.start()
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    counters = db.counters()
+
+    # Timed calls, each against a fresh database; the fastest one is reported
+    times = []
+    while not times or (sum(times) < min_time and len(times) < max_repeats):
+        db = fresh_db()
+        with quiet():
+            state = setup(author, db)
+            started = time.perf_counter()
+            run(state)
+            times.append(time.perf_counter() - started)
+
+    seconds = min(times)
+    return dict(counters, seconds=round(seconds, 6), repeats=len(times),
+                ops=ops(author), ops_per_sec=round(ops(author) / seconds, 1) if seconds > 0 else None,
+                peak_memory_kb=round(peak / 1024, 1))
+
+
+def run_suite(cases, sizes, min_time=0.5):
+    results = {}
+    for size in sizes:
+        author = synthetic_author(SIZES[size])
+        for name in cases:
+            key = f"{name}/{size}"
+            results[key] = measure(name, author, min_time=min_time)
+            r = results[key]
+            print(f"{key:<36}{r['ops_per_sec'] or 0:>14,.0f} ops/s{r['rpcs']:>8} rpcs{r['writes']:>8} writes"
+                  f"{r['reads']:>8} reads{r['peak_memory_kb']:>12,.0f} KB peak")
+    return {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(), "created": time.time()},
+        "cases": results,
+    }
+
+
+# Cases that got slower or heavier than the baseline allows
+def compare(results, baseline, threshold=0.25, rpc_threshold=0.0):
+    regressions = []
+    for key, current in results["cases"].items():
+        base = baseline.get("cases", {}).get(key)
+        if not base:
+            continue
+        if base.get("ops_per_sec") and current["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            regressions.append(f"{key}: {current['ops_per_sec']:,.0f} ops/s vs {base['ops_per_sec']:,.0f} baseline")
+        for counter in ("rpcs", "reads", "writes"):
+            if current[counter] > base[counter] * (1 + rpc_threshold):
+                regressions.append(f"{key}: {current[counter]} {counter} vs {base[counter]} baseline")
+        if current["peak_memory_kb"] > base["peak_memory_kb"] * (1 + threshold) + 64:
+            regressions.append(f"{key}: {current['peak_memory_kb']:,.0f} KB peak vs {base['peak_memory_kb']:,.0f} KB baseline")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Storage and retrieval micro-benchmarks against an in-memory Firestore")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds to keep repeating each case")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown / memory growth (0.25 = 25%%)")
+    parser.add_argument("--rpc-threshold", type=float, default=0.0, help="allowed growth in RPC/read/write counts")
+    parser.add_argument("--output", help="also write this run's results to a JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the new baseline")
+    args = parser.parse_args()
+
+    results = run_suite(args.cases, args.sizes, min_time=args.min_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        if os.path.exists(args.baseline):
+            # Keep baseline entries for cases/sizes that weren't run this time
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            results["cases"] = dict(previous.get("cases", {}), **results["cases"])
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, threshold=args.threshold, rpc_threshold=args.rpc_threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions against {args.baseline}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,280 @@
+import json
+import logging
+import argparse
+from datetime import datetime, timezone
+import numpy as np
+from database.rollups import ANALYTICS_COLLECTION, to_int
+from database.bulk_writer import ParallelBatchWriter
+
+# Citation metrics computed from the stored publications instead of taken
+# from Scholar's profile header, so they can be computed for any citation
+# window, for whole departments and over deduplicated papers only.
+#
+# Publications are loaded into flat arrays (one entry per publication, plus a
+# sparse list of (publication, year, citations) entries from cites_per_year)
+# and every metric is computed for all groups at once: sort by (group,
+# citations desc), number the papers within each group, and count or reduce
+# per group with bincount / reduceat. There are no per-author loops.
+#
+# Computed values are compared with the scraped hindex / i10index / citedby
+# (and their 5-year variants); large disagreements usually mean a profile
+# whose publications were only partly scraped.
+BIBLIOMETRICS_DOC = "bibliometrics"
+
+FACULTY_FIELDS = ["hindex", "hindex5y", "i10index", "i10index5y", "citedby", "citedby5y"]
+PUBLICATION_FIELDS = ["num_citations", "cites_per_year", "canonical_id"]
+
+# Scraped metric -> computed metric it is checked against
+COMPARED = {
+    "hindex": "h_index",
+    "i10index": "i10_index",
+    "citedby": "citations",
+    "hindex5y": "h_index_recent",
+    "i10index5y": "i10_index_recent",
+    "citedby5y": "citations_recent",
+}
+
+
+class PublicationArrays:
+    def __init__(self):
+        self.scholar_ids = []
+        self.colleges = []
+        self.departments = []
+        self.scraped = {}               # scraped field -> int array per faculty member
+        self.owner = None               # faculty index per publication
+        self.citations = None           # num_citations per publication
+        self.canonical = None           # canonical id code per publication (unique code when untagged)
+        self.year_pub = None            # sparse cites_per_year: publication index,
+        self.year = None                #   year,
+        self.year_count = None          #   citations that year
+
+    def __len__(self):
+        return len(self.scholar_ids)
+
+    # Department index per faculty member and the (college, department) names
+    def department_groups(self):
+        keys = list(zip(self.colleges, self.departments))
+        names = list(dict.fromkeys(keys))
+        codes = {key: i for i, key in enumerate(names)}
+        return np.array([codes[key] for key in keys], dtype=np.int64), names
+
+
+# Read every faculty member and publication (optionally of one college) with
+# two projected collection-group queries
+def load_publication_arrays(db, college_id=None):
+    arrays = PublicationArrays()
+    index = {}
+    scraped = {field: [] for field in FACULTY_FIELDS}
+    for doc in db.collection_group("faculty_members").select(FACULTY_FIELDS).stream():
+        department_ref = doc.reference.parent.parent
+        college = department_ref.parent.parent.id
+        if college_id and college != college_id:
+            continue
+        faculty = doc.to_dict() or {}
+        index[doc.reference.path] = len(arrays.scholar_ids)
+        arrays.scholar_ids.append(doc.id)
+        arrays.colleges.append(college)
+        arrays.departments.append(department_ref.id)
+        for field in FACULTY_FIELDS:
+            scraped[field].append(to_int(faculty.get(field)))
+    arrays.scraped = {field: np.array(values, dtype=np.int64) for field, values in scraped.items()}
+
+    owner, citations, canonical = [], [], []
+    canonical_codes = {}
+    year_pub, years, year_counts = [], [], []
+    for doc in db.collection_group("publications").select(PUBLICATION_FIELDS).stream():
+        parent = doc.reference.parent.parent
+        # Skips the college-level canonical collection and other colleges
+        faculty = index.get(parent.path) if parent is not None else None
+        if faculty is None:
+            continue
+        pub = doc.to_dict() or {}
+        i = len(owner)
+        owner.append(faculty)
+        citations.append(to_int(pub.get("num_citations")))
+        key = pub.get("canonical_id") or doc.reference.path
+        canonical.append(canonical_codes.setdefault(key, len(canonical_codes)))
+        for year, count in (pub.get("cites_per_year") or {}).items():
+            try:
+                years.append(int(year))
+            except (TypeError, ValueError):
+                continue
+            year_pub.append(i)
+            year_counts.append(to_int(count))
+
+    arrays.owner = np.array(owner, dtype=np.int64)
+    arrays.citations = np.array(citations, dtype=np.int64)
+    arrays.canonical = np.array(canonical, dtype=np.int64)
+    arrays.year_pub = np.array(year_pub, dtype=np.int64)
+    arrays.year = np.array(years, dtype=np.int64)
+    arrays.year_count = np.array(year_counts, dtype=np.int64)
+    logging.info(f"Loaded {len(owner)} publications for {len(arrays)} faculty members "
+                 f"({len(year_pub)} citation-year entries)")
+    return arrays
+
+
+# Citations each publication received in [since, until] (inclusive years)
+def windowed_citations(arrays, since=None, until=None):
+    mask = np.ones(len(arrays.year), dtype=bool)
+    if since is not None:
+        mask &= arrays.year >= since
+    if until is not None:
+        mask &= arrays.year <= until
+    return np.bincount(arrays.year_pub[mask], weights=arrays.year_count[mask],
+                       minlength=len(arrays.citations)).astype(np.int64)
+
+
+# Keep one entry per (group, key), with the largest value: a paper shared by
+# colleagues counts once for their department
+def dedupe(groups, keys, values):
+    pairs, inverse = np.unique(np.stack([groups, keys]), axis=1, return_inverse=True)
+    best = np.zeros(pairs.shape[1], dtype=values.dtype)
+    np.maximum.at(best, inverse.ravel(), values)
+    return pairs[0], best
+
+
+# h-index, g-index, i10-index, paper and citation totals for every group in
+# one pass. groups: group index per paper; values: citations per paper.
+def grouped_metrics(groups, values, n_groups):
+    papers = np.bincount(groups, minlength=n_groups)
+    total = np.bincount(groups, weights=values, minlength=n_groups).astype(np.int64)
+    i10 = np.bincount(groups, weights=values >= 10, minlength=n_groups).astype(np.int64)
+
+    order = np.lexsort((-values, groups))
+    groups, values = groups[order], values[order]
+    starts = np.concatenate([[0], np.cumsum(papers)[:-1]])
+    rank = np.arange(len(values)) - starts[groups] + 1
+
+    # Papers are sorted by citations, so the h-index is the number of papers
+    # whose citations are at least their rank
+    h = np.bincount(groups, weights=values >= rank, minlength=n_groups).astype(np.int64)
+
+    # g-index: largest rank whose top-g papers have at least g^2 citations
+    # (capped at the number of papers)
+    running = np.cumsum(values)
+    running -= np.concatenate([[0], running])[starts][groups]
+    qualifies = np.where(running >= rank * rank, rank, 0)
+    g = np.zeros(n_groups, dtype=np.int64)
+    np.maximum.at(g, groups, qualifies)
+
+    return {"papers": papers, "citations": total, "h_index": h, "g_index": g, "i10_index": i10}
+
+
+# Metrics per group over all-time citations and citations since `since`
+def compute_metrics(arrays, groups, n_groups, since, dedupe_keys=None):
+    recent = windowed_citations(arrays, since=since)
+    values, recent_values, group_of = arrays.citations, recent, groups
+    if dedupe_keys is not None:
+        group_of, values = dedupe(groups, dedupe_keys, arrays.citations)
+        _, recent_values = dedupe(groups, dedupe_keys, recent)
+    metrics = grouped_metrics(group_of, values, n_groups)
+    recent_metrics = grouped_metrics(group_of, recent_values, n_groups)
+    for name in ("citations", "h_index", "g_index", "i10_index"):
+        metrics[f"{name}_recent"] = recent_metrics[name]
+    return metrics
+
+
+def author_metrics(arrays, since=None, deduplicate=False):
+    since = since or default_since()
+    keys = arrays.canonical if deduplicate else None
+    return compute_metrics(arrays, arrays.owner, len(arrays), since, keys)
+
+
+# Department metrics over the department's deduplicated papers
+def department_metrics(arrays, since=None):
+    since = since or default_since()
+    member_department, names = arrays.department_groups()
+    metrics = compute_metrics(arrays, member_department[arrays.owner], len(names), since, arrays.canonical)
+    metrics["faculty_count"] = np.bincount(member_department, minlength=len(names))
+    return metrics, names
+
+
+# Scholar's 5-year metrics count citations since the start of the year five
+# years ago ("Since 2021" in 2026)
+def default_since():
+    return datetime.now(timezone.utc).year - 5
+
+
+# Faculty members whose computed metrics differ from the scraped ones by more
+# than `tolerance` (relative) and `minimum` (absolute). Profiles with no
+# stored publications are left out.
+def flag_disagreements(arrays, metrics, tolerance=0.1, minimum=2):
+    flagged = {}
+    has_papers = metrics["papers"] > 0
+    for scraped_field, computed_field in COMPARED.items():
+        scraped = arrays.scraped[scraped_field]
+        computed = metrics[computed_field]
+        difference = computed - scraped
+        bad = has_papers & (np.abs(difference) > np.maximum(minimum, tolerance * scraped))
+        for i in np.flatnonzero(bad):
+            flagged.setdefault(arrays.scholar_ids[i], {})[scraped_field] = {
+                "scraped": int(scraped[i]), "computed": int(computed[i])}
+    return flagged
+
+
+def metrics_row(metrics, i):
+    return {name: int(values[i]) for name, values in metrics.items()}
+
+
+def faculty_ref(db, college_id, department_id, scholar_id):
+    return db.collection("colleges").document(college_id).collection("departments").document(department_id) \
+        .collection("faculty_members").document(scholar_id)
+
+
+def department_metrics_ref(db, college_id, department_id):
+    return db.collection("colleges").document(college_id).collection("departments").document(department_id) \
+        .collection(ANALYTICS_COLLECTION).document(BIBLIOMETRICS_DOC)
+
+
+# Write computed_metrics (and metric_flags) on faculty documents and one
+# bibliometrics document per department
+def store_metrics(db, arrays, metrics, flagged, departments, department_names, since, max_in_flight=8):
+    with ParallelBatchWriter(db, max_in_flight=max_in_flight) as writer:
+        for i, scholar_id in enumerate(arrays.scholar_ids):
+            writer.set(faculty_ref(db, arrays.colleges[i], arrays.departments[i], scholar_id), {
+                "computed_metrics": dict(metrics_row(metrics, i), since=since),
+                "metric_flags": flagged.get(scholar_id, {}),
+            }, merge=True)
+        for i, (college_id, department_id) in enumerate(department_names):
+            writer.set(department_metrics_ref(db, college_id, department_id),
+                       dict(metrics_row(departments, i), since=since))
+    return writer.stats()
+
+
+def run(db, college_id=None, since=None, deduplicate=False, store=False, tolerance=0.1):
+    since = since or default_since()
+    arrays = load_publication_arrays(db, college_id)
+    metrics = author_metrics(arrays, since, deduplicate)
+    flagged = flag_disagreements(arrays, metrics, tolerance)
+    departments, department_names = department_metrics(arrays, since)
+    logging.info(f"Computed metrics for {len(arrays)} faculty members and {len(department_names)} departments; "
+                 f"{len(flagged)} disagree with Scholar")
+    if store:
+        store_metrics(db, arrays, metrics, flagged, departments, department_names, since)
+    return {
+        "since": since,
+        "faculty": {scholar_id: metrics_row(metrics, i) for i, scholar_id in enumerate(arrays.scholar_ids)},
+        "departments": {f"{college}/{department}": metrics_row(departments, i)
+                        for i, (college, department) in enumerate(department_names)},
+        "flagged": flagged,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compute citation metrics from stored publications")
+    parser.add_argument("--college", help="only this college")
+    parser.add_argument("--since", type=int, help="first year of the recent-citations window (default: 5 years ago)")
+    parser.add_argument("--dedupe", action="store_true", help="count each canonical paper once per author")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative difference that gets flagged")
+    parser.add_argument("--store", action="store_true", help="write the metrics back to Firestore")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    from database.client import db
+    report = run(db, args.college, args.since, args.dedupe, args.store, args.tolerance)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report["flagged"], indent=2))
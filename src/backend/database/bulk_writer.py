@@ -0,0 +1,118 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from metrics import RETRIES
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 500
+
+
+# Groups writes into batches and commits them on a thread pool, with at most
+# `max_in_flight` commits outstanding at once. set()/delete() block when that
+# limit is reached, so memory stays bounded however many writes are queued.
+# With dry_run=True nothing is committed but all counters still update.
+class ParallelBatchWriter:
+    def __init__(self, db, max_in_flight=8, batch_size=BATCH_SIZE, dry_run=False, retries=3):
+        self.db = db
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self.slots = threading.Semaphore(max_in_flight)
+        self.lock = threading.Lock()
+        self.ops = []
+        self.futures = []
+        self.written = 0
+        self.deleted = 0
+        self.commits = 0
+        self.errors = 0
+        self.started = time.monotonic()
+
+    def set(self, ref, data, merge=False):
+        self._add(("set", ref, data, merge))
+
+    def delete(self, ref):
+        self._add(("delete", ref, None, False))
+
+    def _add(self, op):
+        with self.lock:
+            self.ops.append(op)
+            if len(self.ops) < self.batch_size:
+                return
+            ops, self.ops = self.ops, []
+        self._submit(ops)
+
+    def _submit(self, ops):
+        self.slots.acquire()
+        future = self.executor.submit(self._commit, ops)
+        with self.lock:
+            self.futures = [f for f in self.futures if not f.done()]
+            self.futures.append(future)
+
+    def _commit(self, ops):
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    if not self.dry_run:
+                        batch = self.db.batch()
+                        for kind, ref, data, merge in ops:
+                            if kind == "set":
+                                batch.set(ref, data, merge=merge)
+                            else:
+                                batch.delete(ref)
+                        batch.commit()
+                    break
+                except Exception as e:
+                    if attempt == self.retries:
+                        with self.lock:
+                            self.errors += len(ops)
+                        logging.error(f"Batch commit of {len(ops)} writes failed: {e}")
+                        return
+                    RETRIES.inc(operation="firestore_batch")
+                    time.sleep(min(30, 2 ** attempt))
+            with self.lock:
+                self.commits += 1
+                for kind, _, _, _ in ops:
+                    if kind == "set":
+                        self.written += 1
+                    else:
+                        self.deleted += 1
+        finally:
+            self.slots.release()
+
+    # Commit whatever is queued and wait for all in-flight commits
+    def flush(self):
+        with self.lock:
+            ops, self.ops = self.ops, []
+        if ops:
+            self._submit(ops)
+        with self.lock:
+            futures = list(self.futures)
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self.flush()
+        self.executor.shutdown(wait=True)
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            done = self.written + self.deleted
+            return {
+                "written": self.written,
+                "deleted": self.deleted,
+                "commits": self.commits,
+                "errors": self.errors,
+                "elapsed_seconds": elapsed,
+                "docs_per_second": done / elapsed if elapsed > 0 else 0.0,
+                "dry_run": self.dry_run,
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,97 @@
+import os
+import time
+import logging
+import threading
+from metrics import FIRESTORE_SECONDS, FIRESTORE_ERRORS, FIRESTORE_COMMIT_WRITES
+
+# Shared Firestore client, created on first use instead of at import time.
+# Credentials come from FIREBASE_CREDENTIALS (path to a service-account JSON
+# file); without it Application Default Credentials are used, which is what
+# Cloud Functions / Cloud Run provide.
+_client = None
+_lock = threading.Lock()
+
+
+def get_db():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                import firebase_admin
+                from firebase_admin import credentials, firestore
+
+                try:
+                    firebase_app = firebase_admin.get_app()
+                except ValueError:
+                    path = os.environ.get("FIREBASE_CREDENTIALS")
+                    firebase_app = firebase_admin.initialize_app(credentials.Certificate(path) if path else None)
+                    logging.info(f"Initialized Firebase ({'service account' if path else 'default credentials'})")
+                _client = firestore.client(firebase_app)
+                instrument_client(_client)
+    return _client
+
+
+# RPCs on the generated API client that every document, query, batch and
+# transaction call goes through. The first two are server streams.
+STREAMING_RPCS = ("batch_get_documents", "run_query")
+UNARY_RPCS = ("commit", "begin_transaction", "rollback", "batch_write",
+              "list_documents", "list_collection_ids", "run_aggregation_query")
+
+
+def _observe_stream(rpc, started, stream):
+    pending = True
+    try:
+        for item in stream:
+            if pending:
+                FIRESTORE_SECONDS.observe(time.perf_counter() - started, rpc=rpc)
+                pending = False
+            yield item
+    except Exception:
+        FIRESTORE_ERRORS.inc(rpc=rpc)
+        raise
+    finally:
+        if pending:
+            FIRESTORE_SECONDS.observe(time.perf_counter() - started, rpc=rpc)
+
+
+def _timed_rpc(rpc, call):
+    def timed(*args, **kwargs):
+        if rpc == "commit":
+            request = kwargs.get("request") or (args[0] if args else None)
+            writes = request.get("writes") if isinstance(request, dict) else getattr(request, "writes", None)
+            FIRESTORE_COMMIT_WRITES.observe(len(writes or ()))
+        started = time.perf_counter()
+        try:
+            result = call(*args, **kwargs)
+        except Exception:
+            FIRESTORE_ERRORS.inc(rpc=rpc)
+            FIRESTORE_SECONDS.observe(time.perf_counter() - started, rpc=rpc)
+            raise
+        if rpc in STREAMING_RPCS:
+            return _observe_stream(rpc, started, result)
+        FIRESTORE_SECONDS.observe(time.perf_counter() - started, rpc=rpc)
+        return result
+    return timed
+
+
+# Time every Firestore RPC for /metrics. This wraps the client's internal
+# API object, so it is skipped (with a warning) if that ever changes.
+def instrument_client(client):
+    try:
+        api = client._firestore_api
+        for rpc in STREAMING_RPCS + UNARY_RPCS:
+            call = getattr(api, rpc, None)
+            if call is not None:
+                setattr(api, rpc, _timed_rpc(rpc, call))
+    except Exception as e:
+        logging.warning(f"Firestore metrics disabled: {e}")
+
+
+# Stand-in for the client that modules can hold at import time; the real
+# client (and firebase_admin itself) is only loaded on the first attribute access
+class LazyClient:
+    def __getattr__(self, name):
+        return getattr(get_db(), name)
+
+
+db = LazyClient()
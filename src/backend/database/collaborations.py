@@ -0,0 +1,315 @@
+import re
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from collections import Counter
+from firebase_admin import firestore
+from database.bulk_writer import ParallelBatchWriter
+
+# Collaboration recommendations for a college, computed offline from a sparse
+# co-authorship graph. One document per faculty member in each of:
+#   colleges/{college}/analytics/collaboration_graph/faculty/{scholar_id}   compact graph inputs
+#   colleges/{college}/analytics/collaborations/faculty/{scholar_id}        ranked suggestions
+# A scrape only replaces that faculty member's inputs document and marks the
+# college's graph stale (two writes, no reads). update_stale_collaborations
+# (hourly, see functions/main.py, or python -m database.collaborations)
+# recomputes the (small) matrices of stale colleges from their inputs
+# documents and rewrites only the suggestions that changed, tracked by a
+# digest per member on the graph document. No publications are re-read, and
+# no document grows with the size of the college beyond those digests.
+GRAPH_DOC = "collaboration_graph"
+RECOMMENDATIONS_DOC = "collaborations"
+MEMBERS_COLLECTION = "faculty"
+
+WEIGHTS = {"interests": 0.5, "common_coauthors": 0.3, "two_hop": 0.2}
+TOP_N = 10
+
+
+# "Abdullah Saeed Alghamdi" and "AS Alghamdi" both become "a alghamdi"
+def name_key(name):
+    tokens = re.findall(r"[a-z]+", (name or "").lower())
+    if not tokens:
+        return None
+    return f"{tokens[0][0]} {tokens[-1]}"
+
+
+def split_authors(authors):
+    if isinstance(authors, list):
+        return authors
+    return [a.strip() for a in re.split(r"\s+and\s+|,|;", authors or "") if a.strip()]
+
+
+# Compact graph inputs for one faculty member. author_keys counts the papers
+# each name key appears on; the member's own name is taken out once per paper,
+# so a co-author who shares their key still counts.
+def graph_inputs(faculty, publications, department_id):
+    own_key = name_key(faculty.get("name"))
+    author_keys = Counter()
+    for pub in publications:
+        authors = pub.get("authors") or pub.get("bib", {}).get("author", "")
+        keys = Counter(name_key(a) for a in split_authors(authors))
+        keys.pop(None, None)
+        if keys[own_key]:
+            keys[own_key] -= 1
+        author_keys.update(key for key, count in keys.items() if count > 0)
+
+    coauthor_ids = [c.get("scholar_id") for c in faculty.get("coauthors", []) if isinstance(c, dict) and c.get("scholar_id")]
+    return {
+        "name": faculty.get("name", ""),
+        "department_id": department_id,
+        "name_key": own_key,
+        "interests": sorted({i.strip().lower() for i in faculty.get("interests", []) if i and i.strip()}),
+        "author_keys": dict(author_keys),
+        "coauthor_ids": coauthor_ids,
+    }
+
+
+def _row_normalize(matrix):
+    import numpy as np
+    from scipy import sparse
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+# Compute ranked suggestions for every faculty member from their inputs
+# numpy/scipy are imported here so the API process doesn't load them at startup
+def compute_recommendations(inputs, top_n=TOP_N):
+    import numpy as np
+    from scipy import sparse
+
+    ids = sorted(inputs)
+    n = len(ids)
+    if n < 2:
+        return {scholar_id: [] for scholar_id in ids}
+    position = {scholar_id: i for i, scholar_id in enumerate(ids)}
+    # "First initial + last name" is shared by several faculty often enough
+    # that a key can have more than one owner
+    key_owners = {}
+    for s in ids:
+        if inputs[s]["name_key"]:
+            key_owners.setdefault(inputs[s]["name_key"], []).append(position[s])
+
+    # Direct co-authorship between faculty (papers in common + profile coauthors)
+    rows, cols, vals = [], [], []
+    # Faculty -> external coauthor incidence
+    ext_index = {}
+    ext_rows, ext_cols = [], []
+    # Faculty -> interest incidence
+    interest_index = {}
+    int_rows, int_cols = [], []
+
+    for scholar_id in ids:
+        i = position[scholar_id]
+        data = inputs[scholar_id]
+        profile_coauthors = {position[c] for c in data["coauthor_ids"] if c in position}
+        for key, count in data["author_keys"].items():
+            owners = [j for j in key_owners.get(key, []) if j != i]
+            # Profile coauthors (matched by scholar_id) settle a shared key
+            if len(owners) > 1:
+                owners = [j for j in owners if j in profile_coauthors]
+            if len(owners) == 1:
+                rows.append(i)
+                cols.append(owners[0])
+                vals.append(count)
+            elif not key_owners.get(key):
+                ext_rows.append(i)
+                ext_cols.append(ext_index.setdefault(key, len(ext_index)))
+            # Otherwise the key is ambiguous (or only the member's own) and is
+            # left out rather than guessed
+        for coauthor_id in data["coauthor_ids"]:
+            j = position.get(coauthor_id)
+            if j is not None and j != i:
+                rows.append(i)
+                cols.append(j)
+                vals.append(1)
+            else:
+                ext_rows.append(i)
+                ext_cols.append(ext_index.setdefault(f"id:{coauthor_id}", len(ext_index)))
+        for interest in data["interests"]:
+            int_rows.append(i)
+            int_cols.append(interest_index.setdefault(interest, len(interest_index)))
+
+    direct = sparse.csr_matrix((vals, (rows, cols)), shape=(n, n), dtype=np.float32)
+    direct = direct + direct.T
+    linked = (direct > 0).astype(np.float32)
+
+    external = sparse.csr_matrix((np.ones(len(ext_rows), dtype=np.float32), (ext_rows, ext_cols)),
+                                 shape=(n, max(1, len(ext_index))))
+    external.data[:] = 1.0  # duplicates were summed; keep incidence binary
+    interests = sparse.csr_matrix((np.ones(len(int_rows), dtype=np.float32), (int_rows, int_cols)),
+                                  shape=(n, max(1, len(interest_index))))
+    interests.data[:] = 1.0
+
+    interest_sim = (_row_normalize(interests) @ _row_normalize(interests).T).toarray()
+    common = (external @ external.T).toarray()
+    two_hop = (linked @ linked).toarray()
+
+    common_norm = _row_normalize(external)
+    common_sim = (common_norm @ common_norm.T).toarray()
+    two_hop_sim = two_hop / two_hop.max() if two_hop.max() > 0 else two_hop
+
+    scores = (WEIGHTS["interests"] * interest_sim + WEIGHTS["common_coauthors"] * common_sim
+              + WEIGHTS["two_hop"] * two_hop_sim)
+    # Only suggest people who aren't already collaborators
+    scores[linked.toarray() > 0] = 0
+    np.fill_diagonal(scores, 0)
+
+    recommendations = {}
+    for scholar_id in ids:
+        i = position[scholar_id]
+        order = np.argsort(-scores[i])[:top_n]
+        suggestions = []
+        for j in order:
+            if scores[i, j] <= 0:
+                break
+            other = inputs[ids[j]]
+            suggestions.append({
+                "scholar_id": ids[j],
+                "name": other["name"],
+                "department_id": other["department_id"],
+                "score": round(float(scores[i, j]), 4),
+                "shared_interests": sorted(set(inputs[scholar_id]["interests"]) & set(other["interests"])),
+                "common_coauthors": int(common[i, j]),
+                "two_hop_paths": int(two_hop[i, j]),
+            })
+        recommendations[scholar_id] = suggestions
+    return recommendations
+
+
+def graph_ref(db, college_id):
+    return db.collection("colleges").document(college_id).collection("analytics").document(GRAPH_DOC)
+
+
+def recommendations_ref(db, college_id):
+    return db.collection("colleges").document(college_id).collection("analytics").document(RECOMMENDATIONS_DOC)
+
+
+def load_inputs(db, college_id):
+    return {doc.id: doc.to_dict() for doc in graph_ref(db, college_id).collection(MEMBERS_COLLECTION).stream()}
+
+
+def suggestions_digest(suggestions):
+    return hashlib.sha1(json.dumps(suggestions, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+# Write the suggestions whose digest differs from the stored one
+def store_recommendations(db, college_id, recommendations, digests=None):
+    digests = digests or {}
+    changed = {}
+    with ParallelBatchWriter(db) as writer:
+        for scholar_id, suggestions in recommendations.items():
+            digest = suggestions_digest(suggestions)
+            if digests.get(scholar_id) == digest:
+                continue
+            writer.set(recommendations_ref(db, college_id).collection(MEMBERS_COLLECTION).document(scholar_id),
+                       {"suggestions": suggestions, "updated": firestore.SERVER_TIMESTAMP})
+            changed[scholar_id] = digest
+    if changed and writer.stats()["errors"] == 0:
+        graph_ref(db, college_id).set({"digests": changed}, merge=True)
+    return changed
+
+
+# Replace one faculty member's inputs; the college's suggestions are
+# recomputed by the next update_stale_collaborations run
+def refresh_collaborations(db, college_id, department_id, faculty, publications):
+    scholar_id = faculty.get("scholar_id")
+    if not scholar_id:
+        return
+    try:
+        inputs_ref = graph_ref(db, college_id).collection(MEMBERS_COLLECTION).document(scholar_id)
+        inputs_ref.set(graph_inputs(faculty, list(publications), department_id))
+        graph_ref(db, college_id).set({"stale": True}, merge=True)
+    except Exception as e:
+        logging.error(f"Error refreshing collaboration graph for {scholar_id}: {e}")
+
+
+# Drop a deleted faculty member's inputs and suggestions; the others'
+# suggestions lose them at the next recompute
+def remove_collaborator(db, college_id, scholar_id):
+    try:
+        graph_ref(db, college_id).collection(MEMBERS_COLLECTION).document(scholar_id).delete()
+        recommendations_ref(db, college_id).collection(MEMBERS_COLLECTION).document(scholar_id).delete()
+        graph_ref(db, college_id).set({"stale": True, "digests": {scholar_id: firestore.DELETE_FIELD}}, merge=True)
+    except Exception as e:
+        logging.error(f"Error removing {scholar_id} from the collaboration graph: {e}")
+
+
+# Recompute a college's suggestions from the stored inputs
+def recompute_collaborations(db, college_id):
+    doc = graph_ref(db, college_id).get()
+    digests = (doc.to_dict() or {}).get("digests", {}) if doc.exists else {}
+    # Cleared before reading, so inputs written meanwhile mark it stale again
+    graph_ref(db, college_id).set({"stale": False, "computed": firestore.SERVER_TIMESTAMP}, merge=True)
+    inputs = load_inputs(db, college_id)
+    recommendations = compute_recommendations(inputs)
+    changed = store_recommendations(db, college_id, recommendations, digests)
+    logging.info(f"Collaboration suggestions for {college_id}: {len(inputs)} faculty members, {len(changed)} changed")
+    return recommendations
+
+
+def update_stale_collaborations(db):
+    updated = []
+    # College documents may only exist as parents of their subcollections
+    for college in db.collection("colleges").list_documents():
+        doc = graph_ref(db, college.id).get()
+        if doc.exists and (doc.to_dict() or {}).get("stale"):
+            recompute_collaborations(db, college.id)
+            updated.append(college.id)
+    return updated
+
+
+# Build the graph for a whole college from Firestore (offline backfill)
+def rebuild_collaborations(db, college_id):
+    inputs = {}
+    for dept in db.collection("colleges").document(college_id).collection("departments").stream():
+        for doc in dept.reference.collection("faculty_members").stream():
+            faculty = doc.to_dict()
+            faculty.setdefault("scholar_id", doc.id)
+            publications = [pub.to_dict() for pub in doc.reference.collection("publications").stream()]
+            inputs[doc.id] = graph_inputs(faculty, publications or faculty.get("publications", []), dept.id)
+    with ParallelBatchWriter(db) as writer:
+        for scholar_id, data in inputs.items():
+            writer.set(graph_ref(db, college_id).collection(MEMBERS_COLLECTION).document(scholar_id), data)
+        # Inputs and suggestions used to be single per-college maps
+        writer.set(graph_ref(db, college_id), {"faculty": firestore.DELETE_FIELD}, merge=True)
+        writer.set(recommendations_ref(db, college_id), {"recommendations": firestore.DELETE_FIELD}, merge=True)
+    logging.info(f"Built collaboration graph for {college_id}: {len(inputs)} faculty members")
+    return recompute_collaborations(db, college_id)
+
+
+# Serves suggestions from memory; a researcher's document is re-read at most
+# once per `ttl` seconds, so a repeated lookup is a dict access
+class CollaborationRecommender:
+    def __init__(self, db, ttl=300):
+        self.db = db
+        self.ttl = ttl
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def recommend(self, college_id, scholar_id):
+        with self.lock:
+            entry = self.cache.get((college_id, scholar_id))
+            if entry is None or entry[0] < time.time():
+                doc = recommendations_ref(self.db, college_id).collection(MEMBERS_COLLECTION).document(scholar_id).get()
+                suggestions = (doc.to_dict() or {}).get("suggestions") if doc.exists else None
+                entry = (time.time() + self.ttl, suggestions)
+                self.cache[(college_id, scholar_id)] = entry
+        return entry[1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Recompute collaboration suggestions")
+    parser.add_argument("--rebuild", metavar="COLLEGE", help="rebuild this college's graph from its publications")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    from database.client import db
+    if args.rebuild:
+        rebuild_collaborations(db, args.rebuild)
+    else:
+        print(update_stale_collaborations(db))
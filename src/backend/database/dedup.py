@@ -0,0 +1,234 @@
+import re
+import time
+import zlib
+import hashlib
+import logging
+import threading
+import unicodedata
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from firebase_admin import firestore
+from scraping.scraped_and_stored.records import extract_doi
+
+# Cross-faculty publication deduplication. Every publication gets a
+# canonical_id: "doi_..." when a DOI can be extracted, otherwise the id of the
+# first publication whose normalized title (MinHash/LSH, verified by exact
+# Jaccard) and year match. Canonical copies live once per college:
+#   colleges/{college}/publications/{canonical_id}
+# with faculty_refs / department_ids pointing back at the per-faculty docs.
+# Each process keeps an index per college and every REFRESH_SECONDS adds the
+# canonical copies other processes wrote since its last load.
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 3
+SIMILARITY = 0.85
+MERSENNE = (1 << 61) - 1
+
+REFRESH_SECONDS = 60
+# Overlap between successive loads, for clock skew against server timestamps
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+
+def normalize_title(title):
+    title = unicodedata.normalize("NFKD", title or "")
+    title = "".join(c for c in title if not unicodedata.combining(c)).lower()
+    return " ".join(re.sub(r"[^\w\s]", " ", title).split())
+
+
+def shingles(text):
+    text = text.replace(" ", "")
+    if len(text) <= SHINGLE:
+        return {text} if text else set()
+    return {text[i:i + SHINGLE] for i in range(len(text) - SHINGLE + 1)}
+
+
+def minhash(shingle_set):
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+    # (a * x + b) mod p for every permutation at once; crc32 values and the
+    # coefficients are < 2**32 and 2**31 so the product fits in 64 bits
+    values = (np.outer(hashes, _A) + _B) % np.uint64(MERSENNE)
+    return values.min(axis=0)
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def normalize_year(year):
+    match = re.search(r"\d{4}", str(year or ""))
+    return match.group(0) if match else ""
+
+
+def doi_id(doi):
+    return "doi_" + re.sub(r"[^\w.-]", "_", doi.lower())
+
+
+# In-memory LSH index for one college, loaded from the canonical store and
+# topped up with the canonical copies written since
+class DedupIndex:
+    def __init__(self):
+        self.buckets = {}
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.checked = 0.0
+
+    def _add(self, canonical_id, title_shingles, year, signature):
+        self.entries[canonical_id] = (title_shingles, year)
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS:(band + 1) * ROWS].tobytes())
+            self.buckets.setdefault(key, set()).add(canonical_id)
+
+    # Return the canonical id for a publication record, registering it if new
+    def assign(self, record):
+        doi = extract_doi(record.get("pub_url", ""))
+        if doi:
+            return doi_id(doi)
+
+        title = normalize_title(record.get("title"))
+        if not title:
+            return None
+        year = normalize_year(record.get("pub_year"))
+        title_shingles = shingles(title)
+        signature = minhash(title_shingles)
+
+        with self.lock:
+            candidates = set()
+            for band in range(BANDS):
+                candidates |= self.buckets.get((band, signature[band * ROWS:(band + 1) * ROWS].tobytes()), set())
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                other_shingles, other_year = self.entries[candidate]
+                if year and other_year and year != other_year:
+                    continue
+                score = jaccard(title_shingles, other_shingles)
+                if score >= SIMILARITY and score > best_score:
+                    best, best_score = candidate, score
+            if best:
+                return best
+
+            canonical_id = "t_" + hashlib.sha1(f"{title}|{year}".encode("utf-8")).hexdigest()[:20]
+            self._add(canonical_id, title_shingles, year, signature)
+            return canonical_id
+
+    # Load every canonical title, or with `since` only those updated after it
+    def load(self, db, college_id, since=None):
+        started = datetime.now(timezone.utc)
+        query = canonical_ref(db, college_id).select(["title", "pub_year"])
+        if since is not None:
+            query = query.where(filter=firestore.FieldFilter("updated", ">=", since))
+        count = 0
+        for doc in query.stream():
+            if doc.id.startswith("doi_") or doc.id in self.entries:
+                continue
+            data = doc.to_dict()
+            title_shingles = shingles(normalize_title(data.get("title")))
+            if title_shingles:
+                signature = minhash(title_shingles)
+                with self.lock:
+                    self._add(doc.id, title_shingles, normalize_year(data.get("pub_year")), signature)
+                count += 1
+        self.loaded_at = started
+        self.checked = time.monotonic()
+        logging.info(f"Loaded {count} {'new ' if since else ''}canonical titles for {college_id}")
+        return self
+
+    # Pick up canonical copies written by other processes since the last load
+    def refresh(self, db, college_id):
+        return self.load(db, college_id, since=self.loaded_at - REFRESH_OVERLAP)
+
+
+def canonical_ref(db, college_id):
+    return db.collection("colleges").document(college_id).collection("publications")
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+# One index per college per process, loaded on first use and refreshed at
+# most every REFRESH_SECONDS
+def get_dedup_index(db, college_id):
+    with _indexes_lock:
+        if college_id not in _indexes:
+            _indexes[college_id] = DedupIndex().load(db, college_id)
+        elif time.monotonic() - _indexes[college_id].checked > REFRESH_SECONDS:
+            try:
+                _indexes[college_id].refresh(db, college_id)
+            except Exception as e:
+                logging.error(f"Error refreshing the dedup index for {college_id}: {e}")
+                _indexes[college_id].checked = time.monotonic()
+        return _indexes[college_id]
+
+
+# Tag each record with its canonical_id (call before the records are written)
+def assign_canonical_ids(db, college_id, records):
+    index = get_dedup_index(db, college_id)
+    for record in records.values():
+        record["canonical_id"] = index.assign(record)
+
+
+# (document ref, merge data) of a record's canonical copy, or None if it has no canonical_id
+def canonical_document(db, college_id, department_id, scholar_id, pub_id, record):
+    canonical_id = record.get("canonical_id")
+    if not canonical_id:
+        return None
+    data = {k: v for k, v in record.items() if k != "canonical_id"}
+    data["faculty_refs"] = firestore.ArrayUnion([{"scholar_id": scholar_id, "department_id": department_id, "pub_id": pub_id}])
+    data["department_ids"] = firestore.ArrayUnion([department_id])
+    data["updated"] = firestore.SERVER_TIMESTAMP
+    return canonical_ref(db, college_id).document(canonical_id), data
+
+
+# Upsert the canonical copies of records that were just written for a faculty member
+def store_canonical(db, college_id, department_id, scholar_id, records, batch_size=250):
+    batch = db.batch()
+    ops = 0
+    for pub_id, record in records.items():
+        canonical = canonical_document(db, college_id, department_id, scholar_id, pub_id, record)
+        if canonical is None:
+            continue
+        batch.set(canonical[0], canonical[1], merge=True)
+        ops += 1
+        if ops % batch_size == 0:
+            batch.commit()
+            batch = db.batch()
+    if ops % batch_size != 0:
+        batch.commit()
+    return ops
+
+
+@firestore.transactional
+def _remove_ref(transaction, doc_ref, ref):
+    doc = doc_ref.get(transaction=transaction)
+    if not doc.exists:
+        return
+    refs = [r for r in (doc.to_dict() or {}).get("faculty_refs", []) if r != ref]
+    if not refs:
+        transaction.delete(doc_ref)
+        return
+    data = {"faculty_refs": firestore.ArrayRemove([ref])}
+    if all(r.get("department_id") != ref["department_id"] for r in refs):
+        data["department_ids"] = firestore.ArrayRemove([ref["department_id"]])
+    transaction.update(doc_ref, data)
+
+
+# Take publications a faculty member no longer has out of their canonical
+# copies; a canonical copy with no faculty_refs left is deleted
+def remove_canonical_refs(db, college_id, department_id, scholar_id, pub_ids):
+    removed = 0
+    for pub_id in pub_ids:
+        ref = {"scholar_id": scholar_id, "department_id": department_id, "pub_id": pub_id}
+        query = canonical_ref(db, college_id).where(filter=firestore.FieldFilter("faculty_refs", "array_contains", ref))
+        for doc in query.stream():
+            _remove_ref(db.transaction(), doc.reference, ref)
+            removed += 1
+    return removed
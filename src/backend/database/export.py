@@ -0,0 +1,223 @@
+import csv
+import io
+import sys
+import json
+import zlib
+import base64
+import logging
+import argparse
+
+# Streams a department's faculty members or publications as NDJSON or CSV.
+# Everything is a generator: faculty documents are read a page at a time, each
+# member's publications a page at a time, and rows are encoded (and optionally
+# gzip-compressed) in fixed-size chunks, so memory stays flat however large
+# the department is.
+#
+# Every row carries an opaque `cursor`. Passing the cursor of the last row
+# received restarts the export right after it.
+
+PAGE_SIZE = 200
+CHUNK_SIZE = 64 * 1024
+
+FACULTY = "faculty"
+PUBLICATIONS = "publications"
+
+# CSV columns; NDJSON rows keep every stored field
+FACULTY_COLUMNS = ["scholar_id", "name", "affiliation", "email_domain", "homepage", "interests",
+                   "hindex", "hindex5y", "i10index", "i10index5y", "citedby", "citedby5y",
+                   "pub_count", "url_picture"]
+PUBLICATION_COLUMNS = ["scholar_id", "faculty_name", "id", "title", "authors", "pub_year", "journal",
+                       "volume", "number", "pages", "publisher", "num_citations", "pub_url", "canonical_id"]
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_cursor(scholar_id, pub_id=None):
+    return base64.urlsafe_b64encode(json.dumps([scholar_id, pub_id]).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        scholar_id, pub_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return scholar_id, pub_id
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def members_ref(db, college_id, department_id):
+    return db.collection("colleges").document(college_id).collection("departments") \
+        .document(department_id).collection("faculty_members")
+
+
+# Documents of a collection in id order, one page per query, starting after
+# (or at) the document `start_id`
+def paged(collection, page_size=PAGE_SIZE, start_id=None, inclusive=False):
+    last = None
+    if start_id is not None:
+        snapshot = collection.document(start_id).get()
+        if inclusive and snapshot.exists:
+            yield snapshot
+        last = snapshot
+    while True:
+        query = collection.order_by("__name__").limit(page_size)
+        if last is not None:
+            query = query.start_after(last)
+        docs = list(query.stream())
+        yield from docs
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def publication_row(scholar_id, faculty_name, pub_id, publication):
+    row = dict(publication, scholar_id=scholar_id, faculty_name=faculty_name, id=pub_id)
+    bib = row.pop("bib", None) or {}
+    for field in ("title", "pub_year", "journal", "volume", "number", "pages", "publisher"):
+        row.setdefault(field, bib.get(field, ""))
+    row.setdefault("authors", bib.get("author", ""))
+    return row
+
+
+# (cursor, row) pairs for a department, resuming after `cursor`
+def iter_rows(db, college_id, department_id, kind=PUBLICATIONS, page_size=PAGE_SIZE, cursor=None):
+    after_scholar, after_pub = decode_cursor(cursor) if cursor else (None, None)
+    # A publication cursor resumes inside that member's publications
+    resume_inside = kind == PUBLICATIONS and after_pub is not None
+    for doc in paged(members_ref(db, college_id, department_id), page_size, after_scholar, inclusive=resume_inside):
+        faculty = doc.to_dict() or {}
+        faculty.setdefault("scholar_id", doc.id)
+        inline = faculty.pop("publications", None)
+        if kind == FACULTY:
+            yield encode_cursor(doc.id), faculty
+            continue
+
+        start = after_pub if resume_inside and doc.id == after_scholar else None
+        found = False
+        for pub in paged(doc.reference.collection("publications"), page_size, start):
+            found = True
+            yield encode_cursor(doc.id, pub.id), publication_row(doc.id, faculty.get("name", ""), pub.id, pub.to_dict())
+        # Documents not yet moved to the slim schema keep their publications inline
+        if not found and inline:
+            skip = int(start) + 1 if start is not None and start.isdigit() else 0
+            for i, publication in enumerate(inline[skip:], skip):
+                yield encode_cursor(doc.id, str(i)), publication_row(doc.id, faculty.get("name", ""), str(i), publication)
+
+
+# The encoders yield (cursor, text) so the cursor of the last row in every
+# chunk is known (see export_chunks)
+def ndjson_lines(rows):
+    for cursor, row in rows:
+        yield cursor, json.dumps(dict(row, cursor=cursor), default=str, ensure_ascii=False) + "\n"
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return "; ".join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, default=str, ensure_ascii=False)
+    return "" if value is None else value
+
+
+def csv_lines(rows, columns, header=True, cursor=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(columns + ["cursor"])
+    for cursor, row in rows:
+        writer.writerow([csv_value(row.get(column)) for column in columns] + [cursor])
+        yield cursor, buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.getvalue():
+        yield cursor, buffer.getvalue()
+
+
+# Group lines into ~chunk_size byte chunks: (bytes, cursor of the last row)
+def chunked(lines, chunk_size=CHUNK_SIZE):
+    parts, size, last = [], 0, None
+    for cursor, line in lines:
+        data = line.encode("utf-8")
+        parts.append(data)
+        size += len(data)
+        last = cursor
+        if size >= chunk_size:
+            yield b"".join(parts), last
+            parts, size = [], 0
+    if parts:
+        yield b"".join(parts), last
+
+
+# Each chunk is sync-flushed, so everything received so far can be
+# decompressed even if the stream is cut off
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    last = None
+    for chunk, last in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), last
+    yield compressor.flush(), last
+
+
+# (bytes, cursor) chunks of a department export
+def export_chunks(db, college_id, department_id, kind=PUBLICATIONS, fmt="ndjson", compress=False,
+                  cursor=None, page_size=PAGE_SIZE):
+    if kind not in (FACULTY, PUBLICATIONS):
+        raise ValueError(f"Unknown export kind: {kind}")
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if cursor:
+        decode_cursor(cursor)
+    rows = iter_rows(db, college_id, department_id, kind, page_size, cursor)
+    if fmt == "csv":
+        columns = FACULTY_COLUMNS if kind == FACULTY else PUBLICATION_COLUMNS
+        # A resumed export continues an earlier file, so no second header
+        lines = csv_lines(rows, columns, header=cursor is None, cursor=cursor)
+    else:
+        lines = ndjson_lines(rows)
+    chunks = chunked(lines)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+# Byte chunks of a department export (for streaming responses)
+def export_department(db, college_id, department_id, kind=PUBLICATIONS, fmt="ndjson", compress=False,
+                      cursor=None, page_size=PAGE_SIZE):
+    chunks = export_chunks(db, college_id, department_id, kind, fmt, compress, cursor, page_size)
+    return (chunk for chunk, _ in chunks)
+
+
+def export_filename(college_id, department_id, kind, fmt, compress):
+    return f"{college_id}_{department_id}_{kind}.{fmt}" + (".gz" if compress else "")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export a department's faculty members or publications")
+    parser.add_argument("college")
+    parser.add_argument("department")
+    parser.add_argument("--kind", choices=[FACULTY, PUBLICATIONS], default=PUBLICATIONS)
+    parser.add_argument("--format", choices=sorted(CONTENT_TYPES), default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("--cursor", help="resume after the row with this cursor")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="documents read per query")
+    parser.add_argument("--output", help="output file (default: stdout); appended to when resuming")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    from database.client import db
+
+    # A cut-off gzip stream can't be appended to, so a resumed gzip export
+    # should go to a new file; plain outputs are appended to
+    out = open(args.output, "ab" if args.cursor and not args.gzip else "wb") if args.output else sys.stdout.buffer
+    last = args.cursor
+    try:
+        chunks = export_chunks(db, args.college, args.department, args.kind, args.format, args.gzip,
+                               args.cursor, args.page_size)
+        for chunk, cursor in chunks:
+            out.write(chunk)
+            out.flush()
+            last = cursor
+        logging.info("Export finished")
+    except (KeyboardInterrupt, Exception) as e:
+        logging.error(f"Export interrupted ({type(e).__name__}); resume with --cursor {last}")
+        raise
+    finally:
+        if args.output:
+            out.close()
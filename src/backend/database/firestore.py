@@ -1,12 +1,7 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
-# Initialize Firebase with your service account credentials
-cred = credentials.Certificate('/Users/majds./Downloads/litrix-698fe-firebase-adminsdk-9d1cb-e0f2bf25bd.json')
-firebase_admin.initialize_app(cred)
-
-# Initialize Firestore
-db = firestore.client()
+from database.manifest import sync_publications
+# Shared Firestore client (FIREBASE_CREDENTIALS or default credentials)
+from database.client import db
 
 
 def create_colleges():
@@ -23,9 +18,6 @@ def create_colleges():
         })
         print(f"Added {college['name']} with ID: {college['college_id']}")
 
-# Create the colleges
-create_colleges()
-
 def add_departments_to_college(college_id, departments):
     for dept in departments:
         db.collection("colleges").document(college_id).collection("departments").document(dept['department_id']).set({
@@ -48,29 +40,20 @@ def store_faculty_profile(college_id, department_id, faculty):
         return None
 
 
-# Store publications in batches to Firestore using the title as document ID
+# Store new or changed publications in batches using the title as document ID.
+# The per-faculty manifest replaces streaming the whole subcollection on every run.
 def store_publications(faculty_ref, publications):
     try:
-        stored_publications = faculty_ref.collection("publications").stream()
-        stored_titles = {pub.to_dict().get('title', '') for pub in stored_publications}
-
-        batch = db.batch()
-        new_publications = []
-        BATCH_SIZE = 500
-        for i, pub in enumerate(publications):
-            if pub['title'] not in stored_titles:
-                doc_id = pub['title'].replace(" ", "_").replace("/", "_")
-                doc_ref = faculty_ref.collection("publications").document(doc_id)
-                batch.set(doc_ref, pub)
-                new_publications.append(pub['title'])
-
-            if (i + 1) % BATCH_SIZE == 0:
-                batch.commit()
-                batch = db.batch()
-
-        batch.commit()
-        print(f"Stored {len(new_publications)} new publications.")
-        return len(new_publications)
+        records = {}
+        for pub in publications:
+            doc_id = pub['title'].replace(" ", "_").replace("/", "_")
+            records[doc_id] = pub
+
+        stats = sync_publications(db, faculty_ref, records)
+        written = stats['new'] + stats['changed']
+        print(f"Stored {written} new or changed publications, deleted {stats['deleted']}, "
+              f"skipped {stats['writes_avoided']} unchanged.")
+        return written
     except Exception as e:
         print(f"Error storing publications: {e}")
         return 0
@@ -104,8 +87,13 @@ departments_computing = [
     }
 ]
 
-# Add departments to the Faculty of Computing and Information
-add_departments_to_college('faculty_computing', departments_computing)
+# Seeding only runs as a script, so importing store_publications doesn't write
+if __name__ == '__main__':
+    # Create the colleges
+    create_colleges()
+
+    # Add departments to the Faculty of Computing and Information
+    add_departments_to_college('faculty_computing', departments_computing)
 
 
 
@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import logging
+
+# Firestore allows at most 500 writes per batch
+BATCH_SIZE = 500
+
+# The manifest lives in a single document next to the faculty member:
+# colleges/{college}/departments/{dept}/faculty_members/{scholar_id}/manifest/publications
+MANIFEST_COLLECTION = "manifest"
+MANIFEST_DOC = "publications"
+
+
+# Stable content hash for a publication record
+def publication_hash(publication):
+    payload = json.dumps(publication, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def manifest_ref(faculty_ref):
+    return faculty_ref.collection(MANIFEST_COLLECTION).document(MANIFEST_DOC)
+
+
+# Load the manifest {pub_id: {"hash": ..., "num_citations": ...}}.
+# Returns None when no manifest has been written yet.
+def load_manifest(faculty_ref, manifest_path=None):
+    if manifest_path:
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+
+    doc = manifest_ref(faculty_ref).get()
+    if doc.exists:
+        return doc.to_dict().get("entries", {})
+    return None
+
+
+def save_manifest(faculty_ref, entries, manifest_path=None):
+    if manifest_path:
+        with open(manifest_path, 'w') as f:
+            json.dump(entries, f)
+        return
+    manifest_ref(faculty_ref).set({"entries": entries})
+
+
+# Write only new or changed publications and delete the ones that disappeared.
+# `publications` maps pub_id -> publication record. Returns a stats dict with
+# how many writes were issued and how many were avoided by the manifest.
+def sync_publications(db, faculty_ref, publications, delete_removed=True, merge=False, manifest_path=None):
+    previous = load_manifest(faculty_ref, manifest_path)
+    bootstrap = previous is None
+    previous = previous or {}
+
+    entries = {}
+    to_write = []
+    for pub_id, publication in publications.items():
+        entry = {"hash": publication_hash(publication), "num_citations": publication.get("num_citations", 0)}
+        entries[pub_id] = entry
+        if previous.get(pub_id) != entry:
+            to_write.append(pub_id)
+
+    # Without a manifest we don't know what is stored, so nothing is deleted
+    removed = [] if bootstrap or not delete_removed else [pub_id for pub_id in previous if pub_id not in entries]
+
+    publications_ref = faculty_ref.collection("publications")
+    batch = db.batch()
+    ops = 0
+    for pub_id in to_write:
+        if merge:
+            batch.set(publications_ref.document(pub_id), publications[pub_id], merge=True)
+        else:
+            batch.set(publications_ref.document(pub_id), publications[pub_id])
+        ops += 1
+        if ops % BATCH_SIZE == 0:
+            batch.commit()
+            batch = db.batch()
+    for pub_id in removed:
+        batch.delete(publications_ref.document(pub_id))
+        ops += 1
+        if ops % BATCH_SIZE == 0:
+            batch.commit()
+            batch = db.batch()
+    if ops % BATCH_SIZE != 0:
+        batch.commit()
+
+    if to_write or removed or bootstrap:
+        save_manifest(faculty_ref, entries, manifest_path)
+
+    stats = {
+        "new": sum(1 for pub_id in to_write if pub_id not in previous),
+        "changed": sum(1 for pub_id in to_write if pub_id in previous),
+        "deleted": len(removed),
+        "unchanged": len(entries) - len(to_write),
+        "writes_avoided": len(entries) - len(to_write),
+        "written_ids": to_write,
+        "removed_ids": removed,
+    }
+    logging.info(f"Publication sync for {faculty_ref.id}: {stats['new']} new, {stats['changed']} changed, "
+                 f"{stats['deleted']} deleted, {stats['writes_avoided']} writes avoided")
+    return stats
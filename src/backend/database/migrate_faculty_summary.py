@@ -0,0 +1,118 @@
+import json
+import time
+import logging
+import argparse
+from firebase_admin import firestore
+from database.bulk_writer import ParallelBatchWriter
+from scraping.scraped_and_stored.records import publication_id, publication_record, publication_summary
+
+# Rewrites faculty documents to the slim schema. Publications kept inline in
+# a `publications` array are copied to the publications subcollection, and
+# the array is replaced by pub_count and recent_titles.
+#
+# Only publications the subcollection doesn't have yet are copied, so richer
+# stored records are never overwritten. Faculty documents are read a page at
+# a time. A page's publication writes are committed before any of its faculty
+# documents lose their array, so an interrupted run never drops data.
+# Documents that are already slim are skipped, so the migration can simply be
+# run again.
+
+PAGE_SIZE = 50
+SUMMARY_FIELDS = ["title", "pub_year"]
+
+
+def members_query(db, college_id=None, department_id=None):
+    if college_id and department_id:
+        return db.collection("colleges").document(college_id).collection("departments") \
+            .document(department_id).collection("faculty_members")
+    return db.collection_group("faculty_members")
+
+
+def iter_pages(query, page_size):
+    last = None
+    while True:
+        page = query.order_by("__name__").limit(page_size)
+        if last is not None:
+            page = page.start_after(last)
+        docs = list(page.stream())
+        if docs:
+            yield docs
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+# Queue the subcollection writes for one faculty document and return its new
+# summary, or None when it is already slim
+def plan_faculty(writer, doc, stats):
+    faculty = doc.to_dict() or {}
+    inline = faculty.get("publications")
+    if inline is None and "pub_count" in faculty:
+        stats["already_slim"] += 1
+        return None
+
+    pubs_ref = doc.reference.collection("publications")
+    stored = {pub.id: pub.to_dict() for pub in pubs_ref.select(SUMMARY_FIELDS).stream()}
+    for publication in inline or []:
+        pub_id = publication_id(publication)
+        if not pub_id:
+            stats["skipped_without_id"] += 1
+            continue
+        if pub_id in stored:
+            continue
+        record = publication_record(publication) if "bib" in publication else publication
+        writer.set(pubs_ref.document(pub_id), record)
+        stored[pub_id] = record
+        stats["publications_copied"] += 1
+
+    if inline:
+        stats["bytes_removed"] += len(json.dumps(inline, default=str))
+    return dict(publication_summary(stored.values()), publications=firestore.DELETE_FIELD)
+
+
+def migrate_faculty_summaries(db, college_id=None, department_id=None, page_size=PAGE_SIZE,
+                              max_in_flight=8, dry_run=False):
+    stats = {"faculty": 0, "migrated": 0, "already_slim": 0, "publications_copied": 0,
+             "skipped_without_id": 0, "bytes_removed": 0, "failed_pages": 0}
+    started = time.monotonic()
+    with ParallelBatchWriter(db, max_in_flight=max_in_flight, dry_run=dry_run) as writer:
+        for docs in iter_pages(members_query(db, college_id, department_id), page_size):
+            summaries = []
+            errors = writer.stats()["errors"]
+            for doc in docs:
+                stats["faculty"] += 1
+                summary = plan_faculty(writer, doc, stats)
+                if summary is not None:
+                    summaries.append((doc.reference, summary))
+            # Publications first: a faculty array is only dropped once its copies are committed
+            writer.flush()
+            if writer.stats()["errors"] > errors:
+                logging.error(f"Publication copies failed; leaving {len(summaries)} faculty documents unmigrated")
+                stats["failed_pages"] += 1
+                continue
+            for faculty_ref, summary in summaries:
+                writer.set(faculty_ref, summary, merge=True)
+            writer.flush()
+            stats["migrated"] += len(summaries)
+            logging.info(f"Migrated {stats['migrated']} of {stats['faculty']} faculty documents "
+                         f"({stats['publications_copied']} publications copied)")
+
+    stats["elapsed_seconds"] = time.monotonic() - started
+    prefix = "[dry run] " if dry_run else ""
+    logging.info(f"{prefix}Faculty summary migration finished: {stats}")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move inline publication arrays out of faculty documents")
+    parser.add_argument("--college", help="only this college (with --department)")
+    parser.add_argument("--department", help="only this department (with --college)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE, help="faculty documents read per page")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="concurrent batch commits")
+    parser.add_argument("--dry-run", action="store_true", help="count the changes without committing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    from database.client import db
+    migrate_faculty_summaries(db, args.college, args.department, page_size=args.page_size,
+                              max_in_flight=args.max_in_flight, dry_run=args.dry_run)
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import logging
+from database.bulk_writer import ParallelBatchWriter
+from database.rollups import update_faculty_rollup
+from database.dedup import remove_canonical_refs
+from database.collaborations import remove_collaborator
+from database.topics import remove_member_topics
+
+PAGE_SIZE = 500
+
+
+def load_checkpoint(checkpoint_path):
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        with open(checkpoint_path, 'r') as f:
+            return set(json.load(f).get("done", []))
+    return set()
+
+
+def save_checkpoint(checkpoint_path, done):
+    if not checkpoint_path:
+        return
+    tmp = checkpoint_path + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"done": sorted(done)}, f)
+    os.replace(tmp, checkpoint_path)
+
+
+# Queue deletes for every document in a collection, paging through it by
+# document name and fetching ids only. With deep=True, subcollections of each
+# document are deleted too (one extra listing call per document). Ids of the
+# deleted documents are appended to `deleted` when it is given.
+def delete_collection(writer, collection_ref, page_size=PAGE_SIZE, deep=False, progress=None, deleted=None):
+    last = None
+    while True:
+        query = collection_ref.select([]).order_by("__name__").limit(page_size)
+        if last is not None:
+            query = query.start_after(last)
+        docs = list(query.stream())
+        for doc in docs:
+            if deep:
+                for sub in doc.reference.collections():
+                    delete_collection(writer, sub, page_size, deep, progress)
+            writer.delete(doc.reference)
+            if deleted is not None:
+                deleted.append(doc.id)
+            if progress:
+                progress()
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+# Everything derived from a faculty member that lives outside their subtree
+def remove_member(db, college_id, department_id, scholar_id, pub_ids):
+    update_faculty_rollup(db, college_id, department_id, {"scholar_id": scholar_id}, publications=None)
+    try:
+        remove_canonical_refs(db, college_id, department_id, scholar_id, pub_ids)
+    except Exception as e:
+        logging.error(f"Error removing canonical publication refs of {scholar_id}: {e}")
+    remove_collaborator(db, college_id, scholar_id)
+    remove_member_topics(db, college_id, scholar_id)
+
+
+# Delete faculty members and everything under them (publications, manifest,
+# ...). Faculty docs are addressed directly by id, subcollections are deleted
+# in parallel batched commits, and finished scholar_ids are recorded in
+# `checkpoint_path` so an interrupted run can be started again. Members whose
+# deletes did not all commit are left out of the checkpoint (and keep their
+# place in the analytics rollups), so the next run retries them. Deleted
+# members are also taken out of the rollups, the canonical publications, the
+# collaboration graph and the topic index.
+def delete_faculty_subtrees(db, college_id, department_id, scholar_ids, checkpoint_path=None,
+                            max_in_flight=8, page_size=PAGE_SIZE, deep=False, dry_run=False):
+    members_ref = db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members")
+    done = load_checkpoint(checkpoint_path)
+    remaining = [scholar_id for scholar_id in scholar_ids if scholar_id not in done]
+    if len(remaining) < len(scholar_ids):
+        logging.info(f"Resuming: {len(scholar_ids) - len(remaining)} faculty members already deleted")
+
+    queued = [0]
+    failed = []
+    started = time.monotonic()
+
+    def progress():
+        queued[0] += 1
+        if queued[0] % 1000 == 0:
+            rate = queued[0] / (time.monotonic() - started)
+            logging.info(f"Queued {queued[0]} deletes ({rate:.0f}/sec)")
+
+    with ParallelBatchWriter(db, max_in_flight=max_in_flight, dry_run=dry_run) as writer:
+        for i, scholar_id in enumerate(remaining, 1):
+            faculty_ref = members_ref.document(scholar_id)
+            errors = writer.stats()["errors"]
+            pub_ids = []
+            for sub in faculty_ref.collections():
+                delete_collection(writer, sub, page_size, deep, progress,
+                                  deleted=pub_ids if sub.id == "publications" else None)
+            writer.delete(faculty_ref)
+            progress()
+            # The checkpoint only advances once this faculty's deletes are committed
+            writer.flush()
+            if writer.stats()["errors"] > errors:
+                logging.error(f"Some deletes for faculty member {scholar_id} failed; it will be retried")
+                failed.append(scholar_id)
+                continue
+            if not dry_run:
+                remove_member(db, college_id, department_id, scholar_id, pub_ids)
+                done.add(scholar_id)
+                save_checkpoint(checkpoint_path, done)
+            logging.info(f"Deleted faculty member {scholar_id} ({i}/{len(remaining)})")
+
+    stats = writer.stats()
+    stats["faculty_deleted"] = len(remaining) - len(failed)
+    stats["failed"] = failed
+    logging.info(f"Deleted {stats['faculty_deleted']} faculty members and {stats['deleted'] - stats['faculty_deleted']} "
+                 f"subcollection documents in {stats['elapsed_seconds']:.1f}s ({stats['commits']} commits)")
+    return stats
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+from collections import Counter
+from firebase_admin import firestore
+
+# Pre-aggregated analytics, one document per department and per college:
+#   colleges/{college}/departments/{dept}/analytics/rollup
+#   colleges/{college}/analytics/rollup
+# The department rollup keeps each member's contribution, so storing one
+# faculty member only replaces that entry and re-sums the (small) map
+# instead of re-reading every publication in the department.
+ANALYTICS_COLLECTION = "analytics"
+ROLLUP_DOC = "rollup"
+
+# Buckets for the h-index distribution
+H_INDEX_BUCKETS = [(0, 4), (5, 9), (10, 14), (15, 19), (20, 29), (30, None)]
+
+
+def bucket_label(low, high):
+    return f"{low}+" if high is None else f"{low}-{high}"
+
+
+def h_index_bucket(hindex):
+    for low, high in H_INDEX_BUCKETS:
+        if high is None or hindex <= high:
+            return bucket_label(low, high)
+
+
+def normalize_year(year):
+    try:
+        return str(int(str(year).strip()[:4]))
+    except (TypeError, ValueError):
+        return None
+
+
+def to_int(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+# A member's canonical ids ({canonical_id: year}) as two packed arrays: a
+# 64-bit hash per id and its year (uint16, 0 when unknown). That is one field
+# and ~10 bytes per publication in the department document instead of a map
+# entry per publication. numpy is imported here so the API process doesn't
+# load it at startup.
+def pack_canonical(canonical):
+    import numpy as np
+
+    ids = sorted(canonical)
+    hashes = np.array([int.from_bytes(hashlib.blake2b(c.encode("utf-8"), digest_size=8).digest(), "little")
+                       for c in ids], dtype=np.uint64)
+    years = np.array([to_int(canonical[c]) for c in ids], dtype=np.uint16)
+    return hashes.tobytes(), years.tobytes()
+
+
+def unpack_canonical(member):
+    import numpy as np
+
+    # Contributions written before the packed format kept the map itself
+    if "canonical" in member:
+        hashes, years = pack_canonical(member["canonical"])
+    else:
+        hashes, years = member.get("canonical_hashes", b""), member.get("canonical_years", b"")
+    return np.frombuffer(hashes, dtype=np.uint64), np.frombuffer(years, dtype=np.uint16)
+
+
+# One faculty member's contribution to the rollups
+def faculty_contribution(faculty, publications):
+    pubs_by_year = Counter()
+    pub_citations = 0
+    canonical = {}
+    for pub in publications:
+        bib = pub.get("bib", {})
+        year = normalize_year(pub.get("pub_year") or bib.get("pub_year"))
+        if year:
+            pubs_by_year[year] += 1
+        pub_citations += to_int(pub.get("num_citations"))
+        # Set by database/dedup.py; lets shared papers be counted once per department
+        if pub.get("canonical_id"):
+            canonical[pub["canonical_id"]] = year or ""
+
+    cites_by_year = {str(year): to_int(count) for year, count in (faculty.get("cites_per_year") or {}).items()}
+    canonical_hashes, canonical_years = pack_canonical(canonical)
+    return {
+        "name": faculty.get("name", ""),
+        "hindex": to_int(faculty.get("hindex")),
+        "i10index": to_int(faculty.get("i10index")),
+        "citedby": to_int(faculty.get("citedby")) or pub_citations,
+        "publications": len(publications),
+        "pubs_by_year": dict(pubs_by_year),
+        "cites_by_year": cites_by_year,
+        "canonical_count": len(canonical),
+        "canonical_hashes": canonical_hashes,
+        "canonical_years": canonical_years,
+    }
+
+
+# Sum member contributions into the served aggregates
+def aggregate(members):
+    import numpy as np
+
+    by_year = {}
+    distribution = Counter()
+    total_pubs = 0
+    total_cites = 0
+    h_values = []
+    hashes, years = [np.zeros(0, dtype=np.uint64)], [np.zeros(0, dtype=np.uint16)]
+    untagged = 0
+    for member in members.values():
+        member_hashes, member_years = unpack_canonical(member)
+        hashes.append(member_hashes)
+        years.append(member_years)
+        untagged += member["publications"] - len(member_hashes)
+        total_pubs += member["publications"]
+        total_cites += member["citedby"]
+        h_values.append(member["hindex"])
+        distribution[h_index_bucket(member["hindex"])] += 1
+        for year, count in member["pubs_by_year"].items():
+            by_year.setdefault(year, {"publications": 0, "citations": 0})["publications"] += count
+        for year, count in member["cites_by_year"].items():
+            by_year.setdefault(year, {"publications": 0, "citations": 0})["citations"] += count
+
+    # Papers shared by colleagues have the same canonical hash; count each once
+    unique, first = np.unique(np.concatenate(hashes), return_index=True)
+    unique_by_year = Counter(str(year) for year in np.concatenate(years)[first] if year)
+    for year, count in unique_by_year.items():
+        by_year.setdefault(year, {"publications": 0, "citations": 0})["unique_publications"] = count
+
+    h_values.sort()
+    return {
+        "faculty_count": len(members),
+        "publications": total_pubs,
+        "unique_publications": len(unique) + untagged,
+        "citations": total_cites,
+        "h_index_distribution": {bucket_label(low, high): distribution.get(bucket_label(low, high), 0) for low, high in H_INDEX_BUCKETS},
+        "h_index_median": h_values[len(h_values) // 2] if h_values else 0,
+        "h_index_max": h_values[-1] if h_values else 0,
+        "by_year": dict(sorted(by_year.items())),
+    }
+
+
+def department_rollup_ref(db, college_id, department_id):
+    return db.collection("colleges").document(college_id).collection("departments").document(department_id) \
+        .collection(ANALYTICS_COLLECTION).document(ROLLUP_DOC)
+
+
+def college_rollup_ref(db, college_id):
+    return db.collection("colleges").document(college_id).collection(ANALYTICS_COLLECTION).document(ROLLUP_DOC)
+
+
+# Replace (or, for None, drop) members' contributions: {scholar_id: contribution}
+@firestore.transactional
+def _apply_members(transaction, dept_ref, college_ref, department_id, contributions):
+    dept_doc = dept_ref.get(transaction=transaction)
+    college_doc = college_ref.get(transaction=transaction)
+
+    members = (dept_doc.to_dict() or {}).get("members", {}) if dept_doc.exists else {}
+    for scholar_id, contribution in contributions.items():
+        if contribution is None:
+            members.pop(scholar_id, None)
+        else:
+            members[scholar_id] = contribution
+    dept_rollup = dict(aggregate(members), members=members, updated=firestore.SERVER_TIMESTAMP)
+
+    departments = (college_doc.to_dict() or {}).get("departments", {}) if college_doc.exists else {}
+    departments[department_id] = {k: v for k, v in dept_rollup.items() if k not in ("members", "updated")}
+    college_rollup = dict(aggregate_departments(departments), departments=departments, updated=firestore.SERVER_TIMESTAMP)
+
+    transaction.set(dept_ref, dept_rollup)
+    transaction.set(college_ref, college_rollup)
+
+
+# Combine department aggregates into the college aggregate
+def aggregate_departments(departments):
+    by_year = {}
+    distribution = Counter()
+    for dept in departments.values():
+        distribution.update(dept["h_index_distribution"])
+        for year, values in dept["by_year"].items():
+            entry = by_year.setdefault(year, {"publications": 0, "citations": 0})
+            entry["publications"] += values["publications"]
+            entry["citations"] += values["citations"]
+    return {
+        "faculty_count": sum(d["faculty_count"] for d in departments.values()),
+        "publications": sum(d["publications"] for d in departments.values()),
+        # Papers shared across departments are still counted once per department
+        "unique_publications": sum(d.get("unique_publications", d["publications"]) for d in departments.values()),
+        "citations": sum(d["citations"] for d in departments.values()),
+        "h_index_distribution": {bucket_label(low, high): distribution.get(bucket_label(low, high), 0) for low, high in H_INDEX_BUCKETS},
+        "h_index_max": max((d["h_index_max"] for d in departments.values()), default=0),
+        "by_year": dict(sorted(by_year.items())),
+    }
+
+
+# Update the department and college rollups after one faculty member is
+# stored. Pass publications=None to drop the member (e.g. after a delete).
+def update_faculty_rollup(db, college_id, department_id, faculty, publications=()):
+    scholar_id = faculty.get("scholar_id")
+    if not scholar_id:
+        return
+    contribution = None if publications is None else faculty_contribution(faculty, list(publications))
+    update_department_rollup(db, college_id, department_id, {scholar_id: contribution})
+
+
+# Apply many members' contributions in one transaction (bulk ingest)
+def update_department_rollup(db, college_id, department_id, contributions):
+    if not contributions:
+        return
+    try:
+        _apply_members(db.transaction(), department_rollup_ref(db, college_id, department_id),
+                       college_rollup_ref(db, college_id), department_id, contributions)
+    except Exception as e:
+        logging.error(f"Error updating analytics rollup for {department_id} ({len(contributions)} members): {e}")
+
+
+# Recompute a department's rollup from scratch (backfill or repair)
+def rebuild_department_rollup(db, college_id, department_id):
+    members_ref = db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members")
+    for doc in members_ref.stream():
+        faculty = doc.to_dict()
+        faculty.setdefault("scholar_id", doc.id)
+        publications = [pub.to_dict() for pub in doc.reference.collection("publications").stream()]
+        update_faculty_rollup(db, college_id, department_id, faculty, publications or faculty.get("publications", []))
+
+
+# Read the served rollup: one document for a department or for the college
+def get_rollup(db, college_id, department_id=None, include_members=False):
+    ref = department_rollup_ref(db, college_id, department_id) if department_id else college_rollup_ref(db, college_id)
+    doc = ref.get()
+    if not doc.exists:
+        return None
+    rollup = doc.to_dict()
+    if not include_members:
+        rollup.pop("members", None)
+    return rollup
@@ -0,0 +1,398 @@
+import os
+import re
+import time
+import uuid
+import logging
+import argparse
+import threading
+from collections import defaultdict
+from firebase_admin import firestore
+from database.bulk_writer import ParallelBatchWriter
+
+# Topic tags for publications and a topic -> faculty index per college, so
+# "who works on AI?" is one document read instead of a scan of every
+# publication.
+#
+# A TF-IDF + NMF model is fitted in batch on the titles and abstracts of all
+# stored publications (python -m database.topics). Each publication gets its
+# strongest topics and top TF-IDF keywords; each college gets
+#   colleges/{college}/analytics/topics
+#     {"topics":  {topic_id: {"label", "terms", "faculty": {scholar_id: {"publications", "weight"}}}},
+#      "faculty": {scholar_id: {"name", "department_id"}}}
+# After that, store_faculty_data only tags the publications that were just
+# written and replaces that member's entries in the index.
+#
+# The fitted model is kept on disk (TOPIC_MODEL_DIR) with joblib. Only the
+# sklearn parts are pickled, so a model saved by the CLI loads in any
+# process. With TOPIC_MODEL_BUCKET set it is also uploaded to that GCS bucket,
+# and other hosts download it from there (checked every MODEL_CHECK_SECONDS).
+TOPICS_DOC = "topics"
+MODEL_FILE = "topics.joblib"
+MODEL_BLOB = "topic_model/" + MODEL_FILE
+MODEL_CHECK_SECONDS = 300
+
+N_TOPICS = 30
+TOP_TERMS = 10
+MAX_TOPICS_PER_PUBLICATION = 3
+# Share of a publication's topic weight a topic needs to be tagged
+MIN_TOPIC_SHARE = 0.2
+KEYWORDS_PER_PUBLICATION = 5
+
+PUBLICATION_FIELDS = ["title", "abstract", "topic_model"]
+
+
+def model_dir():
+    return os.environ.get("TOPIC_MODEL_DIR", "topic_model")
+
+
+# The shared copy of the model, or None when TOPIC_MODEL_BUCKET isn't set
+def model_blob():
+    bucket = os.environ.get("TOPIC_MODEL_BUCKET")
+    if not bucket:
+        return None
+    from google.cloud import storage
+    return storage.Client().bucket(bucket).blob(MODEL_BLOB)
+
+
+def publication_text(publication):
+    bib = publication.get("bib", {})
+    title = publication.get("title") or bib.get("title") or ""
+    abstract = publication.get("abstract") or bib.get("abstract") or ""
+    return f"{title}. {abstract}"
+
+
+class TopicModel:
+    def __init__(self, vectorizer, nmf, version=None):
+        self.vectorizer = vectorizer
+        self.nmf = nmf
+        self.version = version or uuid.uuid4().hex[:8]
+        terms = vectorizer.get_feature_names_out()
+        self.terms = [[terms[i] for i in component.argsort()[::-1][:TOP_TERMS]] for component in nmf.components_]
+        self.labels = [", ".join(topic_terms[:3]) for topic_terms in self.terms]
+        self.ids = [f"t{i:02d}" for i in range(len(self.terms))]
+        self.feature_names = terms
+
+    # sklearn is imported here so the API process doesn't load it at startup
+    @classmethod
+    def fit(cls, texts, n_topics=N_TOPICS):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.decomposition import NMF
+
+        vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True, ngram_range=(1, 2),
+                                     min_df=2, max_df=0.5, max_features=20000,
+                                     token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z-]+\b")
+        matrix = vectorizer.fit_transform(texts)
+        n_topics = max(2, min(n_topics, matrix.shape[0] // 10, matrix.shape[1]))
+        nmf = NMF(n_components=n_topics, init="nndsvd", max_iter=400, random_state=0)
+        nmf.fit(matrix)
+        return cls(vectorizer, nmf)
+
+    # (topic ids, topic weights, keywords) for each text
+    def tag(self, texts):
+        matrix = self.vectorizer.transform(texts)
+        weights = self.nmf.transform(matrix)
+        tags = []
+        for row, doc_weights in enumerate(weights):
+            total = doc_weights.sum()
+            order = doc_weights.argsort()[::-1][:MAX_TOPICS_PER_PUBLICATION]
+            topics = [int(i) for i in order if total > 0 and doc_weights[i] / total >= MIN_TOPIC_SHARE]
+            terms = matrix.getrow(row)
+            top = terms.indices[terms.data.argsort()[::-1][:KEYWORDS_PER_PUBLICATION]]
+            tags.append(([self.ids[i] for i in topics],
+                         [round(float(doc_weights[i] / total), 3) for i in topics],
+                         [self.feature_names[i] for i in top]))
+        return tags
+
+    def topics(self):
+        return {topic_id: {"label": label, "terms": terms}
+                for topic_id, label, terms in zip(self.ids, self.labels, self.terms)}
+
+    def save(self, path=None):
+        import joblib
+        path = path or os.path.join(model_dir(), MODEL_FILE)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        joblib.dump({"vectorizer": self.vectorizer, "nmf": self.nmf, "version": self.version}, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        blob = model_blob()
+        if blob is not None:
+            blob.upload_from_filename(path)
+            logging.info(f"Uploaded topic model {self.version} to gs://{blob.bucket.name}/{blob.name}")
+
+    @classmethod
+    def load(cls, path=None):
+        import joblib
+        data = joblib.load(path or os.path.join(model_dir(), MODEL_FILE))
+        return cls(data["vectorizer"], data["nmf"], data["version"])
+
+
+_model = None
+_model_mtime = None
+_model_checked = 0.0
+_model_lock = threading.Lock()
+
+
+# Download the shared model when it differs from the local copy
+def sync_model(path):
+    blob = model_blob()
+    if blob is None:
+        return
+    blob.reload()
+    local = f"{path}.generation"
+    current = open(local).read().strip() if os.path.exists(local) and os.path.exists(path) else None
+    if current != str(blob.generation):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        blob.download_to_filename(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        with open(local, "w") as f:
+            f.write(str(blob.generation))
+        logging.info(f"Downloaded topic model from gs://{blob.bucket.name}/{blob.name}")
+
+
+# The saved model, reloaded when a batch run replaces it; None until one has
+# been fitted (or when it can't be loaded, which is logged)
+def get_topic_model():
+    global _model, _model_mtime, _model_checked
+    path = os.path.join(model_dir(), MODEL_FILE)
+    with _model_lock:
+        if time.time() - _model_checked > MODEL_CHECK_SECONDS:
+            _model_checked = time.time()
+            try:
+                sync_model(path)
+            except Exception as e:
+                logging.error(f"Could not fetch the shared topic model: {e}")
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            if _model_mtime is not False:
+                logging.warning(f"No topic model at {path}: new publications are not tagged. Run "
+                                f"python -m database.topics (and set TOPIC_MODEL_BUCKET to share it)")
+                _model_mtime = False
+            return None
+        if mtime != _model_mtime:
+            _model_mtime = mtime
+            try:
+                _model = TopicModel.load(path)
+            except Exception as e:
+                logging.error(f"Could not load the topic model at {path}: {e}")
+                _model = None
+        return _model
+
+
+def tag_fields(model, topics, weights, keywords):
+    return {"topics": topics, "topic_weights": weights, "keywords": keywords, "topic_model": model.version}
+
+
+# One faculty member's entry per topic: publications tagged with it and the
+# summed topic weight
+def faculty_topics(tags):
+    profile = defaultdict(lambda: {"publications": 0, "weight": 0.0})
+    for topics, weights in tags:
+        for topic_id, weight in zip(topics, weights):
+            profile[topic_id]["publications"] += 1
+            profile[topic_id]["weight"] += weight
+    return {topic_id: {"publications": entry["publications"], "weight": round(entry["weight"], 3)}
+            for topic_id, entry in profile.items()}
+
+
+def topics_ref(db, college_id):
+    return db.collection("colleges").document(college_id).collection("analytics").document(TOPICS_DOC)
+
+
+def set_member(index, scholar_id, name, department_id, profile):
+    for topic in index["topics"].values():
+        topic["faculty"].pop(scholar_id, None)
+    index["faculty"][scholar_id] = {"name": name, "department_id": department_id}
+    for topic_id, entry in profile.items():
+        if topic_id in index["topics"]:
+            index["topics"][topic_id]["faculty"][scholar_id] = entry
+
+
+# Replace one member's entries in the college's topic index. Runs in a
+# transaction so concurrent scrapes don't overwrite each other's entries.
+@firestore.transactional
+def _apply_member_topics(transaction, ref, model_version, scholar_id, name, department_id, profile):
+    doc = ref.get(transaction=transaction)
+    index = doc.to_dict() if doc.exists else None
+    if not index or index.get("model") != model_version:
+        # Index from an older model (or none yet): the next batch run rebuilds it
+        return
+    set_member(index, scholar_id, name, department_id, profile)
+    index["updated"] = firestore.SERVER_TIMESTAMP
+    transaction.set(ref, index)
+
+
+@firestore.transactional
+def _remove_member_topics(transaction, ref, scholar_id):
+    doc = ref.get(transaction=transaction)
+    index = doc.to_dict() if doc.exists else None
+    if not index or scholar_id not in index.get("faculty", {}):
+        return
+    for topic in index["topics"].values():
+        topic["faculty"].pop(scholar_id, None)
+    index["faculty"].pop(scholar_id)
+    index["updated"] = firestore.SERVER_TIMESTAMP
+    transaction.set(ref, index)
+
+
+# Take a deleted faculty member out of the college's topic index
+def remove_member_topics(db, college_id, scholar_id):
+    try:
+        _remove_member_topics(db.transaction(), topics_ref(db, college_id), scholar_id)
+    except Exception as e:
+        logging.error(f"Error removing {scholar_id} from the topic index: {e}")
+
+
+# Tag the publications just written for a faculty member and replace their
+# entries in the college's topic index. `records` are all of the member's
+# publication records; only `written_ids` are tagged and written, the rest
+# are tagged in memory for the member's profile (no publication is re-read).
+def tag_faculty_publications(db, college_id, department_id, faculty, records, written_ids):
+    scholar_id = faculty.get("scholar_id")
+    if not scholar_id or not records:
+        return
+    try:
+        model = get_topic_model()
+        if model is None:
+            return
+        pub_ids = list(records)
+        tags = dict(zip(pub_ids, model.tag([publication_text(records[pub_id]) for pub_id in pub_ids])))
+        faculty_ref = db.collection("colleges").document(college_id).collection("departments") \
+            .document(department_id).collection("faculty_members").document(scholar_id)
+        with ParallelBatchWriter(db) as writer:
+            for pub_id in written_ids:
+                writer.set(faculty_ref.collection("publications").document(pub_id),
+                           tag_fields(model, *tags[pub_id]), merge=True)
+
+        _apply_member_topics(db.transaction(), topics_ref(db, college_id), model.version, scholar_id,
+                             faculty.get("name", ""), department_id,
+                             faculty_topics((topics, weights) for topics, weights, _ in tags.values()))
+    except Exception as e:
+        logging.error(f"Error tagging topics for {scholar_id}: {e}")
+
+
+# Batch run: fit the model if needed, tag every publication not tagged by the
+# current model and rebuild each college's topic index
+def tag_all(db, refit=False, n_topics=N_TOPICS, batch_size=1000, max_in_flight=8):
+    members = {}
+    for doc in db.collection_group("faculty_members").select(["name"]).stream():
+        department_ref = doc.reference.parent.parent
+        members[doc.reference.path] = (department_ref.parent.parent.id, department_ref.id, doc.id,
+                                       (doc.to_dict() or {}).get("name", ""))
+    publications = []
+    for pub in db.collection_group("publications").select(PUBLICATION_FIELDS).stream():
+        parent = pub.reference.parent.parent
+        # Skip the college-level canonical publications collection
+        if parent is not None and parent.path in members:
+            publications.append((pub.reference, parent.path, pub.to_dict() or {}))
+    logging.info(f"Loaded {len(publications)} publications of {len(members)} faculty members")
+
+    model = None if refit else get_topic_model()
+    if model is None:
+        started = time.monotonic()
+        model = TopicModel.fit([publication_text(data) for _, _, data in publications], n_topics)
+        model.save()
+        logging.info(f"Fitted {len(model.ids)} topics in {time.monotonic() - started:.1f}s: "
+                     + "; ".join(model.labels))
+
+    # Publication tags per faculty member (path -> [(topics, weights)])
+    member_tags = defaultdict(list)
+    tagged = 0
+    with ParallelBatchWriter(db, max_in_flight=max_in_flight) as writer:
+        for start in range(0, len(publications), batch_size):
+            batch = publications[start:start + batch_size]
+            for (ref, owner, data), tags in zip(batch, model.tag([publication_text(d) for _, _, d in batch])):
+                member_tags[owner].append(tags[:2])
+                if data.get("topic_model") != model.version:
+                    writer.set(ref, tag_fields(model, *tags), merge=True)
+                    tagged += 1
+    logging.info(f"Tagged {tagged} publications ({len(publications) - tagged} already current)")
+
+    indexes = {}
+    for path, (college_id, department_id, scholar_id, name) in members.items():
+        index = indexes.get(college_id)
+        if index is None:
+            index = indexes[college_id] = {
+                "topics": {topic_id: dict(topic, faculty={}) for topic_id, topic in model.topics().items()},
+                "faculty": {},
+                "model": model.version,
+            }
+        set_member(index, scholar_id, name, department_id, faculty_topics(member_tags.get(path, [])))
+    for college_id, index in indexes.items():
+        index["updated"] = firestore.SERVER_TIMESTAMP
+        topics_ref(db, college_id).set(index)
+        logging.info(f"Wrote topic index for {college_id}: {len(index['faculty'])} faculty members")
+    return {"publications": len(publications), "tagged": tagged, "topics": len(model.ids), "colleges": len(indexes)}
+
+
+def query_terms(text):
+    return set(re.findall(r"[a-z][a-z-]+", (text or "").lower()))
+
+
+# Answers topic lookups from memory; the college's index document is re-read
+# at most once per `ttl` seconds
+class TopicIndex:
+    def __init__(self, db, ttl=300):
+        self.db = db
+        self.ttl = ttl
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def get(self, college_id):
+        with self.lock:
+            entry = self.cache.get(college_id)
+            if entry is None or entry[0] < time.time():
+                doc = topics_ref(self.db, college_id).get()
+                entry = (time.time() + self.ttl, doc.to_dict() if doc.exists else None)
+                self.cache[college_id] = entry
+        return entry[1]
+
+    # Topics (with faculty counts), or the faculty for a topic id or a
+    # free-text query matched against the topic terms
+    def lookup(self, college_id, topic_id=None, query=None, department_id=None, limit=50):
+        index = self.get(college_id)
+        if index is None:
+            return None
+        topics = index["topics"]
+        if topic_id is None and not query:
+            return {"topics": [{"id": tid, "label": topic["label"], "terms": topic["terms"],
+                                "faculty_count": len(topic["faculty"])} for tid, topic in sorted(topics.items())]}
+
+        if topic_id is not None:
+            matched = {topic_id: 1.0} if topic_id in topics else {}
+        else:
+            words = query_terms(query)
+            matched = {}
+            for tid, topic in topics.items():
+                terms = query_terms(" ".join(topic["terms"]))
+                overlap = len(words & terms) / len(words) if words else 0
+                if overlap:
+                    matched[tid] = overlap
+
+        scores = defaultdict(float)
+        publications = defaultdict(int)
+        for tid, relevance in matched.items():
+            for scholar_id, entry in topics[tid]["faculty"].items():
+                scores[scholar_id] += relevance * entry["weight"]
+                publications[scholar_id] += entry["publications"]
+        faculty = []
+        for scholar_id in sorted(scores, key=scores.get, reverse=True):
+            member = index["faculty"].get(scholar_id, {})
+            if department_id and member.get("department_id") != department_id:
+                continue
+            faculty.append({"scholar_id": scholar_id, "name": member.get("name", ""),
+                            "department_id": member.get("department_id"),
+                            "publications": publications[scholar_id], "score": round(scores[scholar_id], 3)})
+            if len(faculty) >= limit:
+                break
+        return {"topics": [{"id": tid, "label": topics[tid]["label"]} for tid in matched], "faculty": faculty}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tag publications with topics and build the topic index")
+    parser.add_argument("--refit", action="store_true", help="fit a new model and retag every publication")
+    parser.add_argument("--topics", type=int, default=N_TOPICS, help="number of topics when fitting")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    from database.client import db
+    print(tag_all(db, refit=args.refit, n_topics=args.topics))
@@ -0,0 +1,101 @@
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job:
+    def __init__(self, key, payload):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.payload = payload
+        self.status = QUEUED
+        self.stage = "queued"
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    # Called by the job function to report how far it got (0.0 - 1.0)
+    def update(self, stage, progress=None):
+        self.stage = stage
+        if progress is not None:
+            self.progress = progress
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "key": self.key,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+# In-process job queue backed by a bounded worker pool.
+# Submitting a key that already has a queued or running job returns that
+# job instead of starting a second one.
+class JobQueue:
+    def __init__(self, func, workers=2, keep_finished=3600):
+        self.func = func
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.keep_finished = keep_finished
+        self.jobs = {}
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def submit(self, key, **payload):
+        with self.lock:
+            self._expire()
+            job_id = self.active.get(key)
+            if job_id:
+                return self.jobs[job_id], False
+
+            job = Job(key, payload)
+            self.jobs[job.id] = job
+            self.active[key] = job.id
+        self.executor.submit(self._run, job)
+        return job, True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def in_flight(self):
+        with self.lock:
+            return len(self.active)
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.update("running")
+        try:
+            job.result = self.func(job, **job.payload)
+            job.status = DONE
+            job.update("done", 1.0)
+        except Exception as e:
+            logging.error(f"Job {job.id} ({job.key}) failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+            job.update("failed")
+        finally:
+            job.finished = time.time()
+            with self.lock:
+                if self.active.get(job.key) == job.id:
+                    del self.active[job.key]
+
+    # Drop finished jobs older than keep_finished seconds
+    def _expire(self):
+        cutoff = time.time() - self.keep_finished
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished < cutoff]:
+            del self.jobs[job_id]
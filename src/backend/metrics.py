@@ -0,0 +1,178 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Minimal Prometheus instrumentation: counters, gauges and histograms kept in
+# process memory and rendered in the text exposition format on /metrics.
+# Recording a value is a dict lookup and a few additions under a per-metric
+# lock, so it is cheap enough for every Firestore RPC.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 1500, 2000, 3000, 4000, 8000, 16000)
+
+REGISTRY = []
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+        self.values = {}
+        REGISTRY.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+        return self.header() + [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self.functions = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_label_key(labels)] = value
+
+    # Read the value when /metrics is scraped (e.g. a queue length)
+    def set_function(self, func, **labels):
+        with self.lock:
+            self.functions[_label_key(labels)] = func
+
+    def render(self):
+        with self.lock:
+            items = list(self.values.items())
+            functions = list(self.functions.items())
+        items += [(key, func()) for key, func in functions]
+        return self.header() + [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self.lock:
+            items = [(key, (list(entry[0]), entry[1], entry[2])) for key, entry in self.values.items()]
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Time each request and serve /metrics on a Flask app
+def instrument_app(app):
+    from flask import Response, request, g
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None and request.endpoint != "metrics":
+            HTTP_SECONDS.observe(time.perf_counter() - started, endpoint=request.endpoint or "unknown",
+                                 method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'], endpoint="metrics")
+    def _metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
+
+    return app
+
+
+HTTP_SECONDS = Histogram("litrix_http_request_seconds", "Time spent handling an HTTP request")
+SCHOLAR_SECONDS = Histogram("litrix_scholar_fetch_seconds", "Latency of Google Scholar calls (search, fill, page fetch)")
+SCHOLAR_PAGES = Counter("litrix_scholar_pages_total", "Scholar pages requested, by page type and cache result")
+RATE_LIMIT_WAIT_SECONDS = Histogram("litrix_rate_limit_wait_seconds", "Time spent waiting for a proxy/host rate limit token")
+SCRAPE_STAGE_SECONDS = Histogram("litrix_scrape_stage_seconds", "Duration of each stage of a scrape job")
+FIRESTORE_SECONDS = Histogram("litrix_firestore_rpc_seconds", "Latency of Firestore RPCs (streams: time to first result)")
+FIRESTORE_ERRORS = Counter("litrix_firestore_rpc_errors_total", "Firestore RPCs that raised")
+FIRESTORE_COMMIT_WRITES = Histogram("litrix_firestore_commit_writes", "Writes per Firestore commit (batch size)", buckets=SIZE_BUCKETS)
+LLM_SECONDS = Histogram("litrix_llm_seconds", "Latency of completion API calls (streams: time to first chunk)")
+PROMPT_TOKENS = Histogram("litrix_chat_prompt_tokens", "Tokens in each chat prompt (system message, query and context)", buckets=TOKEN_BUCKETS)
+LLM_ERRORS = Counter("litrix_llm_errors_total", "Completion API calls that raised")
+RESPONSE_CACHE = Counter("litrix_response_cache_total", "Chat answer cache lookups by result")
+RETRIES = Counter("litrix_retries_total", "Retried operations")
+JOBS_IN_FLIGHT = Gauge("litrix_jobs_in_flight", "Jobs queued or running")
+PROXY_REQUESTS = Counter("litrix_proxy_requests_total", "Scholar page requests per proxy, by outcome")
+PROXY_SCORE = Gauge("litrix_proxy_score", "Current health score of each Scholar proxy")
+PROXY_OPEN = Gauge("litrix_proxy_circuit_open", "1 while a Scholar proxy is cooling down or on trial")
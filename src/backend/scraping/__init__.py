@@ -1,20 +1,41 @@
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials, firestore
-from scholarly import scholarly
 import logging
-import openai
+import threading
+from scraping.search_index import FacultySearch
+import os
+import json
+from scraping.response_cache import ResponseCache, response_key
+from database.client import db
+from scraping.context_packer import pack_context, count_tokens
+from metrics import instrument_app, LLM_SECONDS, LLM_ERRORS, RESPONSE_CACHE, PROMPT_TOKENS
 
-# Initialize Firebase
-cred = credentials.Certificate('/Users/ruba/Downloads/Majd/litrix/litrix-f06e0-firebase-adminsdk-5uspj-5aecd2badc.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+faculty_search = FacultySearch(db)
+
+# Publication embeddings, memory-mapped and shared by all worker processes.
+# numpy/scikit-learn are only imported when the first chat request needs them.
+_vectors = None
+_vectors_lock = threading.Lock()
+
+def get_vectors():
+    global _vectors
+    if _vectors is None:
+        with _vectors_lock:
+            if _vectors is None:
+                from scraping.vector_store import VectorStore, HashingEmbedder
+                store = VectorStore(os.environ.get("VECTOR_STORE_DIR", "vector_store"))
+                _vectors = (store, HashingEmbedder(store.dim))
+    return _vectors
+
+# Answers keyed by normalized query + retrieval context
+response_cache = ResponseCache(max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+                               ttl=int(os.environ.get("RESPONSE_CACHE_TTL", 6 * 60 * 60)))
 
 # Initialize Flask
 app = Flask(__name__)
 CORS(app, origins=["https://litrix-f06e0.web.app"])
+instrument_app(app)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
@@ -28,36 +49,103 @@ def chat():
     # Retrieve relevant docs from Firestore
     relevant_docs = retrieve_relevant_docs(query, college, department)
 
-    # Prepare context for GPT
-    context = "\n".join([f"{doc['name']}: {doc['interests']}" for doc in relevant_docs])
-    prompt = f"User Query: {query}\nContext:\n{context}"
+    # Semantically related publications from the local vector store
+    related_pubs = retrieve_related_publications(query, college, department)
+
+    # Most relevant profiles and abstract excerpts within the context token budget
+    context = pack_context(query, relevant_docs, related_pubs)
+    prompt = f"User Query: {query}\nContext:\n{context.text}"
+    prompt_tokens = sum(count_tokens(message["content"]) for message in build_messages(prompt))
+    PROMPT_TOKENS.observe(prompt_tokens)
+    logging.info(f"Chat prompt: {prompt_tokens} tokens, context {context.stats()}")
+    cache_key = response_key(query, context.text)
+
+    # Stream tokens to the client as server-sent events
+    if data.get("stream"):
+        return Response(stream_with_context(sse_events(stream_response(prompt, cache_key))),
+                        mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
     # Generate a response using OpenAI GPT
-    generated_response = generate_response(prompt)
+    generated_response = generate_response(prompt, cache_key)
     
     return jsonify({"response": generated_response})
 
-def retrieve_relevant_docs(query, college, department):
-    collection_ref = db.collection("colleges").document(college).collection("departments").document(department).collection("faculty_members")
-    results = collection_ref.stream()
-    
-    relevant_docs = []
-    
-    for doc in results:
-        data = doc.to_dict()
-        if query.lower() in data.get("interests", "") or query.lower() in data.get("name", "").lower():
-            relevant_docs.append(data)
-
-    return relevant_docs
-
-def generate_response(prompt):
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are an AI-powered assistant for faculty research management."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=500,
-    )
-    
-    return response['choices'][0]['message']['content']
+# Top matches from the in-memory BM25 index (built once per department,
+# kept current by a Firestore listener) instead of streaming every document
+def retrieve_relevant_docs(query, college, department, k=10):
+    return faculty_search.search(query, college, department, k=k)
+
+def retrieve_related_publications(query, college, department):
+    from scraping.vector_store import search_publications
+
+    vector_store, embedder = get_vectors()
+    return search_publications(vector_store, embedder, query, college, department)
+
+def build_messages(prompt):
+    return [
+        {"role": "system", "content": "You are an AI-powered assistant for faculty research management."},
+        {"role": "user", "content": prompt}
+    ]
+
+# The only call into the completion API. OPENAI_BASE_URL can point the client
+# at a local stub server, or tests can replace this function.
+def complete(messages, stream=False):
+    import openai
+
+    # For a stream this is the time until the response starts
+    with LLM_SECONDS.time(stream=str(stream).lower()):
+        try:
+            return openai.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=500,
+                stream=stream,
+            )
+        except Exception:
+            LLM_ERRORS.inc(stream=str(stream).lower())
+            raise
+
+def generate_response(prompt, cache_key=None):
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        RESPONSE_CACHE.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+
+    response = complete(build_messages(prompt))
+    content = response.choices[0].message.content
+    if cache_key:
+        response_cache.put(cache_key, content)
+    return content
+
+# Yield the answer in pieces as the model produces them; a cached answer is
+# yielded whole. The full text is cached once the stream completes.
+def stream_response(prompt, cache_key=None):
+    if cache_key:
+        cached = response_cache.get(cache_key)
+        RESPONSE_CACHE.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    for chunk in complete(build_messages(prompt), stream=True):
+        if not chunk.choices:
+            continue
+        token = chunk.choices[0].delta.content
+        if token:
+            parts.append(token)
+            yield token
+
+    if cache_key:
+        response_cache.put(cache_key, "".join(parts))
+
+def sse_events(tokens):
+    try:
+        for token in tokens:
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield "data: [DONE]\n\n"
+    except Exception as e:
+        logging.error(f"Error streaming response: {e}")
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# Durable per-author crawl progress, so a failed or interrupted crawl resumes
+# where it stopped instead of refetching the author from scratch. Each author
+# gets an append-only JSON-lines file: the filled profile (with publication
+# stubs) first, then one line per publication as soon as it is filled.
+# Finishing an author replaces the file with a one-line "done" marker, which
+# roster runs use to skip authors that were already exported.
+#
+# SCHOLAR_CHECKPOINT_DIR sets the default location.
+
+
+class CrawlState:
+    def __init__(self):
+        self.author = None
+        self.publications = {}
+        self.done = False
+
+
+class CrawlCheckpoint:
+    def __init__(self, root=None, fsync=True):
+        self.root = root or os.environ.get("SCHOLAR_CHECKPOINT_DIR", ".scholar_checkpoints")
+        self.fsync = fsync
+        self.files = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # Scholar ids are [A-Za-z0-9_-], so they are safe file names
+    def path(self, scholar_id):
+        return os.path.join(self.root, f"{scholar_id}.jsonl")
+
+    def _close(self, scholar_id):
+        f = self.files.pop(scholar_id, None)
+        if f is not None:
+            f.close()
+
+    # Progress saved for an author. A line torn by a crash mid-write is cut
+    # off so later appends start on a clean line.
+    def load(self, scholar_id):
+        state = CrawlState()
+        path = self.path(scholar_id)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return state
+        good = 0
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                good += len(line)
+                if "author" in entry:
+                    state.author = entry["author"]
+                elif "index" in entry:
+                    state.publications[entry["index"]] = entry["publication"]
+                elif entry.get("done"):
+                    state.done = True
+        if good < os.path.getsize(path):
+            logging.warning(f"Dropping a partial checkpoint line for {scholar_id}")
+            with self.lock:
+                self._close(scholar_id)
+                with open(path, "r+b") as f:
+                    f.truncate(good)
+        return state
+
+    def is_done(self, scholar_id):
+        try:
+            with open(self.path(scholar_id), "rb") as f:
+                return bool(json.loads(f.readline() or b"{}").get("done"))
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def _append(self, scholar_id, entry, truncate=False):
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            if truncate:
+                self._close(scholar_id)
+            f = self.files.get(scholar_id)
+            if f is None:
+                f = self.files[scholar_id] = open(self.path(scholar_id), "w" if truncate else "a", encoding="utf-8")
+            f.write(line)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    # Begin a fresh crawl of an author (drops any earlier progress)
+    def start(self, scholar_id, author_filled):
+        self._append(scholar_id, {"author": author_filled}, truncate=True)
+
+    def record(self, scholar_id, index, publication):
+        self._append(scholar_id, {"index": index, "publication": publication})
+
+    # Call once the author's output has been written
+    def finish(self, scholar_id):
+        path = self.path(scholar_id)
+        with self.lock:
+            self._close(scholar_id)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(json.dumps({"done": True, "finished_at": time.time()}) + "\n")
+            os.replace(path + ".tmp", path)
+
+    def discard(self, scholar_id):
+        with self.lock:
+            self._close(scholar_id)
+            try:
+                os.remove(self.path(scholar_id))
+            except FileNotFoundError:
+                pass
+
+    def close(self):
+        with self.lock:
+            for scholar_id in list(self.files):
+                self._close(scholar_id)
@@ -0,0 +1,193 @@
+import os
+import re
+import math
+import logging
+import threading
+from collections import Counter
+from scraping.search_index import tokenize
+
+# Builds the chat prompt's context within a token budget. Candidates are the
+# matched faculty profiles (name: interests), chunks of their publication
+# abstracts and the semantically related publications. Each is scored against
+# the query (BM25 over the candidate set, nudged by the rank of the faculty
+# member it came from), near-duplicates (overlapping windows, papers shared
+# by co-authors) are dropped, and the best candidates are packed greedily
+# until CHAT_CONTEXT_TOKENS is used up.
+#
+# Tokens are counted with tiktoken (the model's own encoding) when it is
+# installed and its encoding files are available, otherwise estimated.
+
+CONTEXT_TOKENS = int(os.environ.get("CHAT_CONTEXT_TOKENS", 1500))
+ENCODING_MODEL = "gpt-3.5-turbo"
+
+CHUNK_TOKENS = 120
+CHUNK_OVERLAP_SENTENCES = 1
+# Token-set overlap above which a candidate repeats one already packed
+DUPLICATE_OVERLAP = 0.6
+# Score share for the faculty member's retrieval rank (best match = 1)
+RANK_WEIGHT = 0.3
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+PIECE_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken
+                _encoding = tiktoken.encoding_for_model(ENCODING_MODEL)
+            except Exception as e:
+                logging.warning(f"tiktoken unavailable ({type(e).__name__}); estimating token counts")
+                _encoding = False
+        return _encoding
+
+
+# BPE averages about four characters per token for English words
+def estimate_tokens(text):
+    return sum(math.ceil(len(piece) / 4) for piece in PIECE_RE.findall(text))
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+# Sentence windows of about max_tokens, overlapping by a sentence so a match
+# on a window boundary isn't lost
+def split_chunks(text, max_tokens=CHUNK_TOKENS, overlap=CHUNK_OVERLAP_SENTENCES):
+    sentences = [s.strip() for s in SENTENCE_RE.split(text or "") if s.strip()]
+    chunks, window, size = [], [], 0
+    for sentence in sentences:
+        tokens = count_tokens(sentence)
+        if window and size + tokens > max_tokens:
+            chunks.append(" ".join(window))
+            window = window[-overlap:] if overlap else []
+            size = sum(count_tokens(s) for s in window)
+        window.append(sentence)
+        size += tokens
+    if window and (not chunks or len(window) > overlap):
+        chunks.append(" ".join(window))
+    return chunks
+
+
+class Candidate:
+    def __init__(self, kind, text, rank, name="", title="", year=None):
+        self.kind = kind
+        self.text = text
+        self.rank = rank
+        self.name = name
+        self.title = title
+        self.year = year
+        self.terms = Counter(tokenize(f"{title} {text}"))
+        self.relevance = 0.0
+        self.score = 0.0
+        self.tokens = 0
+
+    def line(self):
+        if self.kind == "profile":
+            return f"{self.name}: {self.text}"
+        year = f" ({self.year})" if self.year else ""
+        if self.kind in ("title", "related"):
+            return f"- {self.name}: {self.title}{year}"
+        return f"- {self.name}, \"{self.title}\"{year}: {self.text}"
+
+
+# Profiles and abstract chunks of the matched faculty (in retrieval order),
+# then the related publications from the vector store
+def candidates(relevant_docs, related_pubs=()):
+    found = []
+    for rank, doc in enumerate(relevant_docs):
+        name = doc.get("name", "")
+        interests = doc.get("interests") or []
+        if isinstance(interests, (list, tuple)):
+            interests = ", ".join(str(i) for i in interests)
+        found.append(Candidate("profile", interests, rank, name))
+        for pub in doc.get("publications") or []:
+            chunks = split_chunks(pub.get("abstract", ""))
+            for chunk in chunks:
+                found.append(Candidate("abstract", chunk, rank, name, pub.get("title", ""), pub.get("pub_year")))
+            if not chunks and pub.get("title"):
+                found.append(Candidate("title", "", rank, name, pub["title"], pub.get("pub_year")))
+    for pub in related_pubs:
+        found.append(Candidate("related", "", len(relevant_docs), pub.get("name", ""), pub.get("title", ""), pub.get("pub_year")))
+    return found
+
+
+# BM25 of each candidate against the query, plus the retrieval rank bonus
+def score(query, found, k1=1.2, b=0.75):
+    terms = set(tokenize(query))
+    n = len(found)
+    if not n:
+        return
+    avg_len = sum(sum(c.terms.values()) for c in found) / n or 1.0
+    df = Counter(term for c in found for term in terms if term in c.terms)
+    ranks = max(c.rank for c in found) + 1
+    for c in found:
+        length = sum(c.terms.values())
+        relevance = 0.0
+        for term in terms:
+            tf = c.terms.get(term, 0)
+            if tf:
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                relevance += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        c.relevance = relevance
+        c.score = relevance + RANK_WEIGHT * (1 - c.rank / ranks)
+
+
+def overlap(a, b):
+    a, b = set(a.terms), set(b.terms)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+class PackedContext:
+    def __init__(self, text, tokens, packed, candidates, duplicates, over_budget):
+        self.text = text
+        self.tokens = tokens
+        self.packed = packed
+        self.candidates = candidates
+        self.duplicates = duplicates
+        self.over_budget = over_budget
+
+    def stats(self):
+        return {"context_tokens": self.tokens, "packed": self.packed, "candidates": self.candidates,
+                "duplicates": self.duplicates, "over_budget": self.over_budget}
+
+
+# Best non-duplicate candidates that fit in `budget` tokens. Abstract chunks
+# and titles have to share a term with the query; the matched profiles and the
+# vector store's related publications were already selected for relevance.
+# Profiles are listed first, then publication excerpts, each in score order.
+def pack_context(query, relevant_docs, related_pubs=(), budget=None):
+    budget = CONTEXT_TOKENS if budget is None else budget
+    found = candidates(relevant_docs, related_pubs)
+    score(query, found)
+    header = "Related publications:"
+    header_tokens = count_tokens(header) + 1
+    chosen, used, duplicates, over_budget = [], 0, 0, 0
+    for c in sorted(found, key=lambda c: c.score, reverse=True):
+        if c.kind in ("abstract", "title") and c.relevance <= 0:
+            continue
+        if c.kind != "profile" and any(p.kind != "profile" and overlap(c, p) >= DUPLICATE_OVERLAP for p in chosen):
+            duplicates += 1
+            continue
+        c.tokens = count_tokens(c.line()) + 1
+        extra = header_tokens if c.kind != "profile" and all(p.kind == "profile" for p in chosen) else 0
+        if used + c.tokens + extra > budget:
+            over_budget += 1
+            continue
+        chosen.append(c)
+        used += c.tokens + extra
+
+    profiles = [c.line() for c in chosen if c.kind == "profile"]
+    excerpts = [c.line() for c in chosen if c.kind != "profile"]
+    lines = profiles + ([header] + excerpts if excerpts else [])
+    return PackedContext("\n".join(lines), used, len(chosen), len(found), duplicates, over_budget)
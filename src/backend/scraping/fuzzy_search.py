@@ -0,0 +1,374 @@
+import math
+import json
+import base64
+import bisect
+import heapq
+import logging
+import threading
+from collections import defaultdict, Counter
+from concurrent.futures import ThreadPoolExecutor
+from scraping.search_index import tokenize
+
+# Server-side fuzzy search over faculty members and publications, so clients
+# get one page of results instead of downloading a whole college to run
+# Fuse.js.
+#
+# Typo tolerance comes from a trigram index over the vocabulary: each query
+# word is expanded to the indexed words whose trigram (Jaccard) similarity is
+# at least `threshold`, and the last word also matches as a prefix, for
+# search-as-you-type. A document scores the sum, over query words, of its
+# best matching word's similarity times the field weight. Results are ordered
+# by score and paged with an opaque keyset cursor, so pages stay stable while
+# the index changes underneath.
+
+FIELD_WEIGHTS = {"name": 3.0, "interests": 2.0, "title": 2.0, "affiliation": 1.0}
+
+# Publication fields read from Firestore for the index and the result rows
+PUBLICATION_FIELDS = ["title", "pub_year", "authors", "journal", "num_citations", "canonical_id"]
+
+# Concurrent publication subcollection reads while loading the index
+LOAD_WORKERS = 8
+
+# Share of the query words a document has to match (rounded up)
+MIN_SHOULD_MATCH = 0.75
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        score, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (float(score), str(doc_id))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+class TrigramIndex:
+    def __init__(self, threshold=0.3):
+        self.threshold = threshold
+        self.postings = defaultdict(dict)   # word -> {doc_id: field weight}
+        self.grams = defaultdict(set)       # trigram -> words
+        self.doc_words = {}
+        self.doc_facets = {}
+        self.doc_data = {}
+        self.sorted_words = None
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_words)
+
+    # Add or replace a document. fields: name -> text or list of texts;
+    # facets: name -> list of values
+    def add(self, doc_id, fields, facets, data):
+        words = {}
+        for field, value in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            for word in tokenize(value):
+                if weight > words.get(word, 0):
+                    words[word] = weight
+        with self.lock:
+            self._remove(doc_id)
+            for word, weight in words.items():
+                if word not in self.postings:
+                    for gram in trigrams(word):
+                        self.grams[gram].add(word)
+                    self.sorted_words = None
+                self.postings[word][doc_id] = weight
+            self.doc_words[doc_id] = words
+            self.doc_facets[doc_id] = facets
+            self.doc_data[doc_id] = data
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        words = self.doc_words.pop(doc_id, None)
+        if words is None:
+            return
+        for word in words:
+            posting = self.postings[word]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[word]
+                for gram in trigrams(word):
+                    self.grams[gram].discard(word)
+                    if not self.grams[gram]:
+                        del self.grams[gram]
+                self.sorted_words = None
+        self.doc_facets.pop(doc_id, None)
+        self.doc_data.pop(doc_id, None)
+
+    def get(self, doc_id):
+        return self.doc_data.get(doc_id)
+
+    # Indexed words similar to `word`: {word: similarity}
+    def expand(self, word, prefix=False):
+        query_grams = trigrams(word)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self.grams.get(gram, ()))
+        matches = {}
+        for candidate, count in shared.items():
+            similarity = count / (len(query_grams) + len(trigrams(candidate)) - count)
+            if similarity >= self.threshold:
+                matches[candidate] = similarity
+        if prefix and len(word) >= 2:
+            if self.sorted_words is None:
+                self.sorted_words = sorted(self.postings)
+            i = bisect.bisect_left(self.sorted_words, word)
+            while i < len(self.sorted_words) and self.sorted_words[i].startswith(word):
+                candidate = self.sorted_words[i]
+                matches[candidate] = max(matches.get(candidate, 0.0), 0.5 + 0.5 * len(word) / len(candidate))
+                i += 1
+        return matches
+
+    # {doc_id: score} for a query; an empty query matches every document
+    def match(self, query):
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words:
+            return dict.fromkeys(self.doc_words, 0.0)
+        scores = defaultdict(float)
+        matched = Counter()
+        for i, word in enumerate(words):
+            best = {}
+            for candidate, similarity in self.expand(word, prefix=i == len(words) - 1).items():
+                for doc_id, weight in self.postings[candidate].items():
+                    score = similarity * weight
+                    if score > best.get(doc_id, 0.0):
+                        best[doc_id] = score
+            for doc_id, score in best.items():
+                scores[doc_id] += score
+                matched[doc_id] += 1
+        need = math.ceil(len(words) * MIN_SHOULD_MATCH)
+        return {doc_id: score for doc_id, score in scores.items() if matched[doc_id] >= need}
+
+    # One page of results. `scope` filters are applied before facet counting
+    # and `filters` after, so the facet counts show what each filter value
+    # would return. filters: facet -> allowed values (or a predicate).
+    def search(self, query, scope=None, filters=None, facets=(), limit=20, cursor=None):
+        with self.lock:
+            hits = self.match(query)
+            hits = {doc_id: score for doc_id, score in hits.items() if self._allowed(doc_id, scope)}
+            counts = {name: Counter() for name in facets}
+            for doc_id in hits:
+                for name in facets:
+                    counts[name].update(self.doc_facets[doc_id].get(name, ()))
+            keys = [(-round(score, 6), doc_id) for doc_id, score in hits.items() if self._allowed(doc_id, filters)]
+            total = len(keys)
+            if cursor is not None:
+                after = (-cursor[0], cursor[1])
+                keys = [key for key in keys if key > after]
+            page = heapq.nsmallest(limit + 1, keys)
+            results = [dict(self.doc_data[doc_id], score=-score) for score, doc_id in page[:limit]]
+            next_cursor = encode_cursor([-page[limit - 1][0], page[limit - 1][1]]) if len(page) > limit else None
+        return {
+            "results": results,
+            "total": total,
+            "next_cursor": next_cursor,
+            "facets": {name: dict(count.most_common()) for name, count in counts.items()},
+        }
+
+    def _allowed(self, doc_id, filters):
+        if not filters:
+            return True
+        doc_facets = self.doc_facets[doc_id]
+        for name, allowed in filters.items():
+            values = doc_facets.get(name, ())
+            if callable(allowed):
+                if not any(allowed(value) for value in values):
+                    return False
+            elif not any(value in allowed for value in values):
+                return False
+        return True
+
+
+def _year(value):
+    try:
+        return int(str(value).strip()[:4])
+    except (TypeError, ValueError):
+        return None
+
+
+# Keeps a TrigramIndex of every faculty member and publication current.
+# Everything is loaded on first use with two collection-group queries, then a
+# listener on faculty documents re-indexes a member (and reloads their
+# publications) whenever the storage functions write their summary.
+# Papers shared by several faculty members (same canonical_id) are indexed
+# once, listing all of their authors.
+class FuzzySearch:
+    def __init__(self, db, threshold=0.3):
+        self.db = db
+        self.index = TrigramIndex(threshold)
+        self.faculty_pubs = {}          # scholar_id -> publication doc ids
+        self.pub_owners = {}            # publication doc id -> {scholar_id: (college, department, pub)}
+        self.watch = None
+        self.initial_snapshot = True
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def index_faculty(self, college_id, department_id, faculty, publications):
+        scholar_id = faculty.get("scholar_id")
+        if not scholar_id:
+            return
+        years = set()
+        current = {}
+        for pub_id, pub in publications:
+            doc_id = f"pub:{pub.get('canonical_id') or scholar_id + '/' + pub_id}"
+            current[doc_id] = dict(pub, id=pub_id)
+            year = _year(pub.get("pub_year") or pub.get("bib", {}).get("pub_year"))
+            if year:
+                years.add(year)
+
+        with self.index.lock:
+            self.index.add(f"faculty:{scholar_id}", {
+                "name": faculty.get("name"),
+                "affiliation": faculty.get("affiliation"),
+                "interests": faculty.get("interests", []),
+            }, {
+                "type": ["faculty"], "college": [college_id], "department": [department_id], "year": sorted(years),
+            }, {
+                "type": "faculty",
+                "scholar_id": scholar_id,
+                "name": faculty.get("name", ""),
+                "affiliation": faculty.get("affiliation", ""),
+                "interests": faculty.get("interests", []),
+                "url_picture": faculty.get("url_picture", ""),
+                "hindex": faculty.get("hindex"),
+                "citedby": faculty.get("citedby"),
+                "pub_count": faculty.get("pub_count", len(current)),
+                "college": college_id,
+                "department": department_id,
+            })
+            for doc_id in self.faculty_pubs.get(scholar_id, set()) - current.keys():
+                self._release(doc_id, scholar_id)
+            for doc_id, pub in current.items():
+                self.pub_owners.setdefault(doc_id, {})[scholar_id] = (college_id, department_id, pub)
+                self._index_publication(doc_id)
+            self.faculty_pubs[scholar_id] = set(current)
+
+    def remove_faculty(self, scholar_id):
+        with self.index.lock:
+            self.index.remove(f"faculty:{scholar_id}")
+            for doc_id in self.faculty_pubs.pop(scholar_id, set()):
+                self._release(doc_id, scholar_id)
+
+    def _release(self, doc_id, scholar_id):
+        owners = self.pub_owners.get(doc_id, {})
+        owners.pop(scholar_id, None)
+        if owners:
+            self._index_publication(doc_id)
+        else:
+            self.pub_owners.pop(doc_id, None)
+            self.index.remove(doc_id)
+
+    def _index_publication(self, doc_id):
+        owners = self.pub_owners[doc_id]
+        college_id, department_id, pub = next(iter(owners.values()))
+        bib = pub.get("bib", {})
+        title = pub.get("title") or bib.get("title") or ""
+        year = _year(pub.get("pub_year") or bib.get("pub_year"))
+        self.index.add(doc_id, {"title": title}, {
+            "type": ["publication"],
+            "college": sorted({owner[0] for owner in owners.values()}),
+            "department": sorted({owner[1] for owner in owners.values()}),
+            "year": [year] if year else [],
+        }, {
+            "type": "publication",
+            "id": pub.get("id"),
+            "title": title,
+            "pub_year": year,
+            "authors": pub.get("authors") or bib.get("author", ""),
+            "journal": pub.get("journal") or bib.get("journal", ""),
+            "num_citations": pub.get("num_citations", 0),
+            "scholar_ids": sorted(owners),
+            "college": college_id,
+            "department": department_id,
+        })
+
+    # A faculty member's publications, read from their own subcollection (a
+    # "publications" collection group query would also return the
+    # college-level canonical copies)
+    def _faculty_publications(self, faculty_ref, faculty):
+        publications = [(pub.id, pub.to_dict()) for pub in
+                        faculty_ref.collection("publications").select(PUBLICATION_FIELDS).stream()]
+        # Documents not yet moved to the slim schema keep their publications inline
+        return publications or [(str(i), pub) for i, pub in enumerate(faculty.get("publications", []))]
+
+    def _load_faculty(self, faculty_ref, faculty, publications=None):
+        department_ref = faculty_ref.parent.parent
+        college_id = department_ref.parent.parent.id
+        if publications is None:
+            publications = self._faculty_publications(faculty_ref, faculty)
+        faculty.setdefault("scholar_id", faculty_ref.id)
+        self.index_faculty(college_id, department_ref.id, faculty, publications)
+
+    def ensure_loaded(self, watch=True):
+        with self.lock:
+            if self.loaded:
+                return
+            members = [(doc.reference, doc.to_dict() or {}) for doc in self.db.collection_group("faculty_members").stream()]
+            with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as pool:
+                loaded = pool.map(lambda member: self._faculty_publications(*member), members)
+                for (faculty_ref, faculty), publications in zip(members, loaded):
+                    self._load_faculty(faculty_ref, faculty, publications)
+            logging.info(f"Fuzzy search index: {len(members)} faculty members, {len(self.pub_owners)} publications")
+
+            if watch:
+                self.watch = self.db.collection_group("faculty_members").on_snapshot(self._on_change)
+            self.loaded = True
+
+    def _on_change(self, snapshots, changes, read_time):
+        # The listener's first snapshot repeats what ensure_loaded() just read
+        if self.initial_snapshot:
+            self.initial_snapshot = False
+            return
+        for change in changes:
+            doc = change.document
+            try:
+                if change.type.name == "REMOVED":
+                    self.remove_faculty(doc.id)
+                else:
+                    self._load_faculty(doc.reference, doc.to_dict() or {})
+            except Exception as e:
+                logging.error(f"Error re-indexing {doc.id} for fuzzy search: {e}")
+
+    # type: "faculty" / "publication"; departments: list; year_from/year_to
+    # bound publication years (faculty match on the years they published in)
+    def search(self, query, college_id=None, types=None, departments=None, year_from=None, year_to=None,
+               limit=20, cursor=None):
+        self.ensure_loaded()
+        scope = {}
+        if college_id:
+            scope["college"] = {college_id}
+        if types:
+            scope["type"] = set(types)
+        filters = {}
+        if departments:
+            filters["department"] = set(departments)
+        if year_from is not None or year_to is not None:
+            low = year_from if year_from is not None else -math.inf
+            high = year_to if year_to is not None else math.inf
+            filters["year"] = lambda year: low <= year <= high
+        return self.index.search(query, scope=scope, filters=filters, facets=("type", "department", "year"),
+                                 limit=limit, cursor=decode_cursor(cursor) if cursor else None)
+
+
+_search = None
+_search_lock = threading.Lock()
+
+
+# Shared instance for the API process
+def get_fuzzy_search(db):
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = FuzzySearch(db)
+        return _search
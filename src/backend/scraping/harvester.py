@@ -0,0 +1,218 @@
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scholarly import scholarly
+from metrics import SCHOLAR_SECONDS
+from scraping.proxy_manager import get_proxy_manager, install_proxy_manager
+
+SCHOLAR_HOST = "scholar.google.com"
+
+
+# Token bucket: allows `rate` requests per second with bursts up to `capacity`
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Block until a token is available and take it
+    def acquire(self):
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Capped exponential backoff with jitter: half the delay is fixed and half
+# random, so retries back off without many workers waking up together
+def backoff_delay(attempt, base=5.0, cap=300.0):
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# One bucket per proxy and one per target host; a request must pass both.
+# Applied by the proxy manager's page fetcher (ProxyManager.rate_limited), so
+# the proxy bucket is the endpoint that actually sends each request, retries
+# included, and pages served from the cache cost nothing.
+class RateLimiter:
+    def __init__(self, proxy_rate=1.0, host_rate=0.5, burst=2):
+        self.proxy_rate = proxy_rate
+        self.host_rate = host_rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def _bucket(self, key, rate):
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(rate, self.burst)
+            return self.buckets[key]
+
+    def acquire(self, proxy=None, host=SCHOLAR_HOST):
+        if proxy:
+            self._bucket(("proxy", proxy), self.proxy_rate).acquire()
+        self._bucket(("host", host), self.host_rate).acquire()
+
+
+# Concurrent author/publication harvester for Google Scholar.
+# Authors run on one pool and their publication fills on another, so a
+# slow author never starves the publication workers of another.
+class Harvester:
+    # on_publication(scholar_id, index, pub_filled) is called for every filled
+    # publication in order; with keep_publications=False they are not kept in
+    # the author result, so a whole author never has to sit in memory.
+    # Pages go through `proxy_manager` (the shared pool by default); each
+    # author's pages, publication fills included, stick to one proxy.
+    # With a `checkpoint` (CrawlCheckpoint) every filled publication is saved
+    # as it completes and a failed author resumes from there.
+    def __init__(self, max_authors=2, max_publications=8, proxy_manager=None,
+                 proxy_rate=1.0, host_rate=0.5, burst=2, on_publication=None, keep_publications=True,
+                 checkpoint=None):
+        self.max_authors = max_authors
+        self.max_publications = max_publications
+        self.proxy_manager = proxy_manager or get_proxy_manager()
+        install_proxy_manager(self.proxy_manager)
+        self.limiter = RateLimiter(proxy_rate=proxy_rate, host_rate=host_rate, burst=burst)
+        self.on_publication = on_publication
+        self.keep_publications = keep_publications
+        self.checkpoint = checkpoint
+        self.pub_executor = None
+        self.lock = threading.Lock()
+        self.authors_done = 0
+        self.publications_done = 0
+        self.started = None
+
+    # Rate limited wrapper around every Scholar request. The pages it fetches
+    # stick to the session's proxy and wait for the limiter per page.
+    def fetch(self, func, *args, session=None):
+        with self.proxy_manager.session(session), self.proxy_manager.rate_limited(self.limiter), \
+                SCHOLAR_SECONDS.time(operation=getattr(func, "__name__", "call")):
+            return func(*args)
+
+    def fill_publication(self, pub, scholar_id=None, index=None):
+        pub_filled = self.fetch(scholarly.fill, pub, session=scholar_id)
+        if self.checkpoint is not None and index is not None:
+            self.checkpoint.record(scholar_id, index, pub_filled)
+        with self.lock:
+            self.publications_done += 1
+        return pub_filled
+
+    # Fetch one author and fill all of their publications concurrently.
+    # Publication order is preserved in the result. With a checkpoint, only
+    # the publications not filled by an earlier attempt are fetched.
+    def harvest_author(self, scholar_id):
+        if self.started is None:
+            self.started = time.monotonic()
+        state = self.checkpoint.load(scholar_id) if self.checkpoint is not None else None
+        if state is not None and state.author is not None and not state.done:
+            author_filled = state.author
+            saved = state.publications
+            logging.info(f"Resuming {author_filled.get('name', scholar_id)} from checkpoint "
+                         f"({len(saved)}/{len(author_filled.get('publications', []))} publications filled)")
+        else:
+            author = self.fetch(scholarly.search_author_id, scholar_id, session=scholar_id)
+            author_filled = self.fetch(scholarly.fill, author, session=scholar_id)
+            saved = {}
+            if self.checkpoint is not None:
+                self.checkpoint.start(scholar_id, author_filled)
+
+        pubs = author_filled.get('publications', [])
+        executor = self.pub_executor or ThreadPoolExecutor(max_workers=self.max_publications)
+        futures = {}
+        try:
+            futures = {i: executor.submit(self.fill_publication, pub, scholar_id, i)
+                       for i, pub in enumerate(pubs) if i not in saved}
+            filled = []
+            for i in range(len(pubs)):
+                pub_filled = saved[i] if i in saved else futures[i].result()
+                if self.on_publication:
+                    self.on_publication(scholar_id, i, pub_filled)
+                if self.keep_publications:
+                    filled.append(pub_filled)
+            author_filled['publications'] = filled
+        except Exception:
+            # Fills already running finish (and are checkpointed); queued ones are dropped
+            for future in futures.values():
+                future.cancel()
+            raise
+        finally:
+            if executor is not self.pub_executor:
+                executor.shutdown(wait=True)
+            self.proxy_manager.end_session(scholar_id)
+
+        with self.lock:
+            self.authors_done += 1
+        logging.info(f"Harvested {author_filled.get('name', scholar_id)} "
+                     f"({len(pubs)} publications) - {self.throughput():.1f} publications/min")
+        return author_filled
+
+    # Harvest many authors at once. `on_author(author, author_filled)` is called
+    # as each one finishes; `on_error(author, exception)` when one fails.
+    # Results are only kept in memory when no `on_author` callback is given.
+    # With a checkpoint, authors finished by an earlier run are skipped and an
+    # author counts as finished once `on_author` has returned.
+    def harvest(self, authors, on_author=None, on_error=None):
+        self.started = time.monotonic()
+        self.authors_done = 0
+        self.publications_done = 0
+        results = {}
+
+        if self.checkpoint is not None:
+            pending = [a for a in authors if not self.checkpoint.is_done(a['scholar_id'])]
+            if len(pending) < len(authors):
+                logging.info(f"Skipping {len(authors) - len(pending)} authors finished by an earlier run")
+            authors = pending
+
+        with ThreadPoolExecutor(max_workers=self.max_publications) as pub_executor, \
+                ThreadPoolExecutor(max_workers=self.max_authors) as author_executor:
+            self.pub_executor = pub_executor
+            futures = {author_executor.submit(self.harvest_author, a['scholar_id']): a for a in authors}
+            for future in as_completed(futures):
+                author = futures[future]
+                try:
+                    author_filled = future.result()
+                except Exception as e:
+                    logging.error(f"Error harvesting scholar {author['scholar_id']}: {e}")
+                    if on_error:
+                        on_error(author, e)
+                    continue
+                if on_author:
+                    on_author(author, author_filled)
+                    if self.checkpoint is not None:
+                        self.checkpoint.finish(author['scholar_id'])
+                else:
+                    results[author['scholar_id']] = author_filled
+            self.pub_executor = None
+
+        stats = self.stats()
+        logging.info(f"Harvest finished: {stats['authors']} authors, {stats['publications']} publications "
+                     f"in {stats['elapsed_seconds']:.0f}s ({stats['publications_per_minute']:.1f} publications/min)")
+        return results
+
+    def throughput(self):
+        if self.started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        return self.publications_done / elapsed * 60 if elapsed > 0 else 0.0
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started if self.started is not None else 0.0
+        return {
+            "authors": self.authors_done,
+            "publications": self.publications_done,
+            "elapsed_seconds": elapsed,
+            "publications_per_minute": self.throughput(),
+        }
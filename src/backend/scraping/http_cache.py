@@ -0,0 +1,215 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from metrics import SCHOLAR_SECONDS, SCHOLAR_PAGES
+
+DAY = 24 * 60 * 60
+
+# How long each kind of Scholar page stays fresh (seconds)
+DEFAULT_TTLS = {
+    "author": 7 * DAY,         # citations?user=...  (profile + publication list)
+    "publication": 30 * DAY,   # citations?view_op=view_citation&citation_for_view=...
+    "citedby": 7 * DAY,        # scholar?cites=...
+    "other": 1 * DAY,
+}
+
+# Query parameters that don't change the page content
+IGNORED_PARAMS = {"oi", "authuser", "sciodt", "ei"}
+
+
+# Canonical form of a URL: lowercase host, sorted query, no fragment or noise params
+def canonical_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS)
+    return urlunsplit((parts.scheme.lower() or "https", parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+def page_type(url):
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    if parts.path.endswith("/citations"):
+        if params.get("view_op") == "view_citation":
+            return "publication"
+        if "user" in params:
+            return "author"
+    if "cites" in params:
+        return "citedby"
+    return "other"
+
+
+# Disk cache for fetched pages. Bodies are stored zlib-compressed in one file
+# per URL; a small SQLite index tracks fetch time, last access and size for
+# TTL checks and LRU eviction.
+class PageCache:
+    def __init__(self, cache_dir=".scholar_cache", max_bytes=512 * 1024 * 1024, ttls=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+        os.makedirs(os.path.join(cache_dir, "pages"), exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                page_type TEXT,
+                fetched_at REAL,
+                last_access REAL,
+                size INTEGER
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS pages_lru ON pages (last_access)")
+        self.conn.commit()
+
+    def _path(self, url):
+        return os.path.join(self.cache_dir, "pages", hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def is_fresh(self, url, fetched_at, now=None):
+        now = now or time.time()
+        return now - fetched_at < self.ttls.get(page_type(url), self.ttls["other"])
+
+    # Pages fetched on this thread inside the block skip the cache (the fresh
+    # bodies are still stored), e.g. for a refresh that must see new counts
+    @contextmanager
+    def bypass(self):
+        previous = getattr(self.local, "bypass", False)
+        self.local.bypass = True
+        try:
+            yield
+        finally:
+            self.local.bypass = previous
+
+    # Return the cached body, or None when missing, stale or bypassed
+    def get(self, url):
+        url = canonical_url(url)
+        with self.lock:
+            if getattr(self.local, "bypass", False):
+                self.misses += 1
+                return None
+            row = self.conn.execute("SELECT fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if not self.is_fresh(url, row[0]):
+                self.stale += 1
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(url), "rb") as f:
+                    body = zlib.decompress(f.read()).decode("utf-8")
+            except (OSError, zlib.error):
+                self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+            self.conn.commit()
+            self.hits += 1
+            return body
+
+    def put(self, url, body):
+        url = canonical_url(url)
+        data = zlib.compress(body.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            with open(self._path(url), "wb") as f:
+                f.write(data)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (url, page_type, fetched_at, last_access, size) VALUES (?, ?, ?, ?, ?)",
+                (url, page_type(url), now, now, len(data)))
+            self.conn.commit()
+            self._evict()
+
+    # Drop least recently used pages until the cache fits in max_bytes
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self.conn.execute("SELECT url, size FROM pages ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(url))
+            except OSError:
+                pass
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+            self.evictions += 1
+        self.conn.commit()
+
+    # URLs whose TTL has run out, e.g. for a nightly refresh job
+    def stale_urls(self, kind=None):
+        now = time.time()
+        with self.lock:
+            rows = self.conn.execute("SELECT url, page_type, fetched_at FROM pages").fetchall()
+        return [url for url, ptype, fetched_at in rows
+                if (kind is None or ptype == kind) and not self.is_fresh(url, fetched_at, now)]
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "pages": count,
+            "bytes": size,
+        }
+
+
+# Route every scholarly page fetch through the cache. All scholarly requests
+# (author profiles, publication fills, searches) go through Navigator._get_page.
+def install_scholar_cache(cache=None, cache_dir=None):
+    from scholarly._navigator import Navigator
+
+    cache = cache or PageCache(cache_dir or os.environ.get("SCHOLAR_CACHE_DIR", ".scholar_cache"))
+    current = Navigator._get_page
+    # Re-installing replaces the cache layer but keeps whatever is beneath it
+    # (e.g. the proxy manager's fetcher, which may also be installed later)
+    original = current.__wrapped__ if getattr(current, "_page_cache", False) else current
+
+    def _get_page(self, pagerequest, premium=False):
+        body = cache.get(pagerequest)
+        SCHOLAR_PAGES.inc(page_type=page_type(pagerequest), cache="miss" if body is None else "hit")
+        if body is not None:
+            return body
+        with SCHOLAR_SECONDS.time(operation="page"):
+            body = _get_page.__wrapped__(self, pagerequest, premium)
+        if body:
+            cache.put(pagerequest, body)
+        return body
+
+    _get_page.__wrapped__ = original
+    _get_page._page_cache = True
+    Navigator._get_page = _get_page
+    logging.info(f"Scholar page cache enabled at {cache.cache_dir}")
+    return cache
+
+
+# Refetch only the pages that have gone stale (run nightly)
+def refresh_stale(cache, kind=None):
+    from scholarly._navigator import Navigator
+
+    nav = Navigator()
+    refreshed = 0
+    for url in cache.stale_urls(kind):
+        try:
+            nav._get_page(url)
+            refreshed += 1
+        except Exception as e:
+            logging.error(f"Error refreshing {url}: {e}")
+    logging.info(f"Refreshed {refreshed} stale pages. Cache stats: {cache.stats()}")
+    return refreshed
@@ -0,0 +1,329 @@
+import os
+import time
+import random
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from metrics import PROXY_REQUESTS, PROXY_SCORE, PROXY_OPEN, RATE_LIMIT_WAIT_SECONDS
+
+# One health-scored pool of Scholar proxies shared by every scrape path
+# (the API scrape job, scraping.py and the harvester). Each endpoint is scored
+# on its recent success rate, latency and CAPTCHA/429 responses; requests go
+# to healthy endpoints in proportion to their score. A CAPTCHA, a 429 or
+# `failure_threshold` failures in a row opens the endpoint's circuit for a
+# cool-down that doubles on every trip; afterwards one trial request decides
+# whether it closes again. Pages for one author crawl stick to one endpoint
+# while it stays healthy.
+#
+# SCHOLAR_PROXIES (comma-separated user:pass@host:port or full URLs)
+# overrides the default gateway; set it to an empty string to go direct.
+DEFAULT_PROXIES = [
+    '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823',
+]
+
+OK = "ok"
+ERROR = "error"
+THROTTLED = "throttled"
+CAPTCHA = "captcha"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Latency at which an endpoint's score is halved
+LATENCY_REFERENCE = 2.0
+
+
+class ScholarFetchError(Exception):
+    pass
+
+
+class ProxyUnavailable(ScholarFetchError):
+    pass
+
+
+def proxy_url(proxy):
+    return proxy if "://" in proxy else f"http://{proxy}"
+
+
+# host:port plus a short hash, so labels and logs never carry credentials
+def proxy_label(proxy):
+    host = proxy.split("://", 1)[-1].rsplit("@", 1)[-1]
+    return f"{host}#{hashlib.sha1(proxy.encode('utf-8')).hexdigest()[:6]}"
+
+
+class ProxyHealth:
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.label = proxy_label(proxy)
+        self.success = 1.0
+        self.latency = None
+        self.blocks = []
+        self.failures = 0
+        self.trips = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.trial = False
+        self.requests = 0
+
+    def score(self, now, block_window):
+        recent_blocks = sum(1 for t in self.blocks if now - t < block_window)
+        latency = self.latency if self.latency is not None else LATENCY_REFERENCE
+        return self.success / (1.0 + latency / LATENCY_REFERENCE) / (1.0 + 2.0 * recent_blocks)
+
+
+class ProxyManager:
+    def __init__(self, proxies, failure_threshold=3, cooldown=60, max_cooldown=1800,
+                 block_window=600, sticky_ttl=900, alpha=0.2, max_wait=300):
+        self.proxies = {proxy: ProxyHealth(proxy) for proxy in dict.fromkeys(proxies)}
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.block_window = block_window
+        self.sticky_ttl = sticky_ttl
+        self.alpha = alpha
+        self.max_wait = max_wait
+        self.sticky = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        for health in self.proxies.values():
+            PROXY_SCORE.set_function(lambda h=health: round(h.score(time.monotonic(), self.block_window), 4), proxy=health.label)
+            PROXY_OPEN.set_function(lambda h=health: int(h.state != CLOSED), proxy=health.label)
+
+    # Session key for the current thread (see session())
+    def current_session(self):
+        return getattr(self.local, "session", None)
+
+    # Requests made inside the block (on this thread) share one endpoint
+    @contextmanager
+    def session(self, key):
+        previous = self.current_session()
+        self.local.session = key
+        try:
+            yield
+        finally:
+            self.local.session = previous
+
+    # Requests made inside the block (on this thread) wait for `limiter`
+    # (harvester.RateLimiter), keyed on the endpoint that sends each one
+    @contextmanager
+    def rate_limited(self, limiter):
+        previous = getattr(self.local, "limiter", None)
+        self.local.limiter = limiter
+        try:
+            yield
+        finally:
+            self.local.limiter = previous
+
+    def wait_turn(self, proxy):
+        limiter = getattr(self.local, "limiter", None)
+        if limiter is not None:
+            with RATE_LIMIT_WAIT_SECONDS.time():
+                limiter.acquire(proxy)
+
+    def end_session(self, key):
+        with self.lock:
+            self.sticky.pop(key, None)
+
+    def _available(self, health, now):
+        if health.state == OPEN and now >= health.open_until:
+            health.state = HALF_OPEN
+            health.trial = False
+        return health.state == CLOSED or (health.state == HALF_OPEN and not health.trial)
+
+    def _choose(self, candidates, now):
+        weights = [max(health.score(now, self.block_window), 0.01) for health in candidates]
+        return random.choices(candidates, weights=weights)[0]
+
+    # Endpoint for the next request; None means connect directly (no proxies
+    # configured). Waits while every endpoint is cooling down.
+    def acquire(self, session_key=None):
+        if not self.proxies:
+            return None
+        session_key = session_key if session_key is not None else self.current_session()
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                for key in [k for k, (_, used) in self.sticky.items() if now - used > self.sticky_ttl]:
+                    del self.sticky[key]
+                bound = self.sticky.get(session_key) if session_key is not None else None
+                if bound and self._available(self.proxies[bound[0]], now):
+                    health = self.proxies[bound[0]]
+                else:
+                    candidates = [h for h in self.proxies.values() if self._available(h, now)]
+                    health = self._choose(candidates, now) if candidates else None
+                if health is not None:
+                    if health.state == HALF_OPEN:
+                        health.trial = True
+                    if session_key is not None:
+                        self.sticky[session_key] = (health.proxy, now)
+                    return health.proxy
+                wait = max(0.5, min(h.open_until for h in self.proxies.values()) - now)
+            if time.monotonic() + wait > deadline:
+                raise ProxyUnavailable(f"All {len(self.proxies)} Scholar proxies are cooling down")
+            time.sleep(min(wait, 5.0))
+
+    def _trip(self, health, now, retry_after=None):
+        cooldown = min(self.max_cooldown, self.cooldown * 2 ** health.trips)
+        if retry_after:
+            cooldown = max(cooldown, retry_after)
+        health.trips += 1
+        health.state = OPEN
+        health.trial = False
+        health.failures = 0
+        health.open_until = now + cooldown * random.uniform(0.9, 1.1)
+        for key in [k for k, (proxy, _) in self.sticky.items() if proxy == health.proxy]:
+            del self.sticky[key]
+        logging.warning(f"Proxy {health.label} cooling down for {cooldown:.0f}s (trip {health.trips})")
+
+    # Record the outcome of one request through `proxy`
+    def report(self, proxy, outcome, latency=None, retry_after=None):
+        if proxy is None:
+            PROXY_REQUESTS.inc(proxy="direct", outcome=outcome)
+            return
+        with self.lock:
+            health = self.proxies.get(proxy)
+            if health is None:
+                return
+            now = time.monotonic()
+            ok = outcome == OK
+            health.requests += 1
+            health.success = (1 - self.alpha) * health.success + self.alpha * (1.0 if ok else 0.0)
+            if ok and latency is not None:
+                health.latency = latency if health.latency is None else (1 - self.alpha) * health.latency + self.alpha * latency
+            if outcome in (CAPTCHA, THROTTLED):
+                health.blocks = [t for t in health.blocks if now - t < self.block_window] + [now]
+
+            if ok:
+                health.failures = 0
+                if health.state == HALF_OPEN:
+                    health.state = CLOSED
+                    health.trips = 0
+                    logging.info(f"Proxy {health.label} is healthy again")
+                health.trial = False
+            else:
+                health.failures += 1
+                # A CAPTCHA or 429 means the exit is flagged: back off straight away
+                if health.state == HALF_OPEN or outcome in (CAPTCHA, THROTTLED) or health.failures >= self.failure_threshold:
+                    self._trip(health, now, retry_after)
+        PROXY_REQUESTS.inc(proxy=health.label, outcome=outcome)
+
+    def stats(self):
+        with self.lock:
+            now = time.monotonic()
+            return [{
+                "proxy": h.label,
+                "state": h.state,
+                "score": round(h.score(now, self.block_window), 4),
+                "success_rate": round(h.success, 3),
+                "latency": round(h.latency, 3) if h.latency is not None else None,
+                "recent_blocks": sum(1 for t in h.blocks if now - t < self.block_window),
+                "requests": h.requests,
+                "cooldown_remaining": round(max(0.0, h.open_until - now), 1) if h.state == OPEN else 0.0,
+            } for h in self.proxies.values()]
+
+
+def configured_proxies():
+    value = os.environ.get("SCHOLAR_PROXIES")
+    if value is None:
+        return list(DEFAULT_PROXIES)
+    return [proxy.strip() for proxy in value.split(",") if proxy.strip()]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_proxy_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ProxyManager(configured_proxies())
+        return _manager
+
+
+def _retry_after(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Route scholarly's page fetches through the manager. The fetcher sits
+# beneath the page cache when that is installed (in either order), so cached
+# pages never touch a proxy. With no proxies configured scholarly's own
+# fetch is used unchanged.
+def install_proxy_manager(manager=None, timeout=20, max_attempts=3, delay=(0.5, 1.5)):
+    import requests
+    from scholarly._navigator import Navigator
+
+    manager = manager or get_proxy_manager()
+    current = Navigator._get_page
+    cache_layer = current if getattr(current, "_page_cache", False) else None
+    below = cache_layer.__wrapped__ if cache_layer else current
+    if getattr(below, "_proxy_manager", None) is manager:
+        return manager
+    original = below.__wrapped__ if getattr(below, "_proxy_manager", None) else below
+
+    sessions = {}
+    sessions_lock = threading.Lock()
+
+    def session_for(proxy):
+        with sessions_lock:
+            session = sessions.get(proxy)
+            if session is None:
+                session = requests.Session()
+                session.proxies = {"http": proxy_url(proxy), "https": proxy_url(proxy)}
+                session.headers.update({
+                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                                  "(KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+                    "Accept-Language": "en-US,en;q=0.9",
+                })
+                sessions[proxy] = session
+            return session
+
+    def _get_page(self, pagerequest, premium=False):
+        if not manager.proxies:
+            manager.wait_turn(None)
+            return original(self, pagerequest, premium)
+        last_error = None
+        for attempt in range(max_attempts):
+            proxy = manager.acquire()
+            manager.wait_turn(proxy)
+            time.sleep(random.uniform(*delay))
+            started = time.monotonic()
+            try:
+                resp = session_for(proxy).get(pagerequest, timeout=timeout)
+            except Exception as e:
+                manager.report(proxy, ERROR)
+                last_error = f"{type(e).__name__} via {proxy_label(proxy)}"
+                continue
+            latency = time.monotonic() - started
+
+            if resp.status_code == 429:
+                manager.report(proxy, THROTTLED, latency, _retry_after(resp.headers.get("Retry-After")))
+            elif resp.status_code == 403 or "/sorry/" in resp.url or self._requests_has_captcha(resp.text):
+                manager.report(proxy, CAPTCHA, latency)
+            elif resp.status_code >= 500:
+                manager.report(proxy, ERROR, latency)
+            else:
+                # The proxy did its job even if Scholar has no such page
+                manager.report(proxy, OK, latency)
+                if resp.status_code == 200:
+                    return resp.text
+                if resp.status_code != 404:
+                    raise ScholarFetchError(f"HTTP {resp.status_code} for {pagerequest}")
+                # Approximate scholar ids can 404 once before redirecting
+            last_error = f"HTTP {resp.status_code} via {proxy_label(proxy)}"
+        raise ScholarFetchError(f"Cannot fetch {pagerequest} after {max_attempts} attempts ({last_error})")
+
+    _get_page.__wrapped__ = original
+    _get_page._proxy_manager = manager
+    if cache_layer:
+        cache_layer.__wrapped__ = _get_page
+    else:
+        Navigator._get_page = _get_page
+    logging.info(f"Scholar requests routed through {len(manager.proxies)} managed proxies")
+    return manager
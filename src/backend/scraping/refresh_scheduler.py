@@ -0,0 +1,183 @@
+import os
+import math
+import functools
+import time
+import heapq
+import logging
+import argparse
+from datetime import datetime, timezone
+from firebase_admin import firestore
+
+# Spends a daily budget of Google Scholar requests on the profiles where a
+# refresh is worth the most, instead of re-scraping whole rosters by hand.
+# Each faculty member is ranked by
+#   - how long ago they were last scraped,
+#   - how many citations they have probably gained since then (citation
+#     velocity from the stored cites_per_year), and
+#   - whether a refresh was requested (POST /api/refresh),
+# divided by the number of Scholar requests the refresh costs. Refreshes run
+# through extract_and_store_profile with the page cache bypassed, so a
+# refresh always spends its budget on pages fetched now. The budget is tracked in Firestore, so
+# several runs a day (e.g. the hourly scheduled function) share one budget.
+
+SCHEDULE_COLLECTION = "refresh_schedule"
+BUDGET_DOC = "budget"
+
+DAILY_BUDGET = int(os.environ.get("REFRESH_DAILY_BUDGET", 300))
+
+FIELDS = ["name", "cites_per_year", "last_scraped", "refresh_requested", "pub_count"]
+
+# Profile fill pages 100 publications at a time, plus the id lookup and the
+# co-author list
+PUBLICATIONS_PER_PAGE = 100
+
+
+def to_timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return value.timestamp()
+    except AttributeError:
+        return None
+
+
+# Recent citations per year: this year's count (so far) plus last year's,
+# spread over the time they cover
+def citation_velocity(cites_per_year, now):
+    if not cites_per_year:
+        return 0.0
+    today = datetime.fromtimestamp(now, timezone.utc)
+    elapsed = (today.timetuple().tm_yday - 1) / 365.0
+    counts = {}
+    for year, count in cites_per_year.items():
+        try:
+            counts[int(year)] = int(count or 0)
+        except (TypeError, ValueError):
+            continue
+    recent = counts.get(today.year, 0) + counts.get(today.year - 1, 0)
+    return recent / (1.0 + elapsed)
+
+
+# Scholar requests one refresh takes
+def refresh_cost(pub_count):
+    if pub_count is None:
+        return 3
+    return 2 + max(1, math.ceil(pub_count / PUBLICATIONS_PER_PAGE))
+
+
+def request_refresh(db, college_id, department_id, scholar_id):
+    db.collection("colleges").document(college_id).collection("departments").document(department_id) \
+        .collection("faculty_members").document(scholar_id) \
+        .set({"refresh_requested": firestore.SERVER_TIMESTAMP}, merge=True)
+
+
+def budget_ref(db):
+    return db.collection(SCHEDULE_COLLECTION).document(BUDGET_DOC)
+
+
+class RefreshScheduler:
+    # stale_days: age that is worth as much as `citation_unit` missed citations
+    # min_age_days: profiles scraped more recently are only refreshed on request
+    # never_scraped_days: age assumed for profiles with no last_scraped yet
+    def __init__(self, db, daily_budget=DAILY_BUDGET, stale_days=90, citation_unit=10,
+                 request_boost=10.0, min_age_days=1, never_scraped_days=365):
+        self.db = db
+        self.daily_budget = daily_budget
+        self.stale_days = stale_days
+        self.citation_unit = citation_unit
+        self.request_boost = request_boost
+        self.min_age_days = min_age_days
+        self.never_scraped_days = never_scraped_days
+        self.queue = []
+
+    def priority(self, faculty, now):
+        last_scraped = to_timestamp(faculty.get("last_scraped"))
+        age_days = (now - last_scraped) / 86400 if last_scraped else self.never_scraped_days
+        requested = to_timestamp(faculty.get("refresh_requested"))
+        requested = requested is not None and (last_scraped is None or requested > last_scraped)
+        if age_days < self.min_age_days and not requested:
+            return 0.0
+        missed = citation_velocity(faculty.get("cites_per_year"), now) * age_days / 365
+        value = age_days / self.stale_days + missed / self.citation_unit
+        return value + self.request_boost if requested else value
+
+    def push(self, scholar_id, college_id, department_id, faculty, now=None):
+        value = self.priority(faculty, now or time.time())
+        if value <= 0:
+            return
+        cost = refresh_cost(faculty.get("pub_count"))
+        heapq.heappush(self.queue, (-value / cost, scholar_id, college_id, department_id, cost, value))
+
+    # Rank every faculty member (one projected collection-group query)
+    def load(self):
+        self.queue = []
+        now = time.time()
+        for doc in self.db.collection_group("faculty_members").select(FIELDS).stream():
+            department_ref = doc.reference.parent.parent
+            college_ref = department_ref.parent.parent
+            self.push(doc.id, college_ref.id, department_ref.id, doc.to_dict() or {}, now)
+        logging.info(f"Refresh queue: {len(self.queue)} candidates")
+        return len(self.queue)
+
+    def remaining_budget(self):
+        today = datetime.now(timezone.utc).date().isoformat()
+        snapshot = budget_ref(self.db).get()
+        usage = snapshot.to_dict() if snapshot.exists else {}
+        if usage.get("date") != today:
+            budget_ref(self.db).set({"date": today, "used": 0})
+            return self.daily_budget
+        return max(0, self.daily_budget - int(usage.get("used", 0)))
+
+    def spend(self, cost):
+        budget_ref(self.db).set({"used": firestore.Increment(cost)}, merge=True)
+
+    # Refresh the most valuable profiles until today's budget (or the time
+    # limit, for runs inside a function timeout) is used up
+    def run(self, refresh=None, time_limit=None, dry_run=False):
+        if refresh is None:
+            from scraping.scraping import extract_and_store_profile
+            refresh = functools.partial(extract_and_store_profile, fresh=True)
+        if not self.queue:
+            self.load()
+        remaining = self.remaining_budget()
+        deadline = time.monotonic() + time_limit if time_limit else None
+        summary = {"refreshed": 0, "failed": 0, "spent": 0, "deferred": 0}
+
+        while self.queue:
+            if deadline and time.monotonic() > deadline:
+                break
+            _, scholar_id, college_id, department_id, cost, value = heapq.heappop(self.queue)
+            if cost > remaining:
+                summary["deferred"] += 1
+                continue
+            logging.info(f"Refreshing {scholar_id} ({college_id}/{department_id}): value {value:.2f}, cost {cost}")
+            remaining -= cost
+            summary["spent"] += cost
+            if dry_run:
+                summary["refreshed"] += 1
+                continue
+            self.spend(cost)
+            if refresh(scholar_id, college_id, department_id):
+                summary["refreshed"] += 1
+            else:
+                summary["failed"] += 1
+
+        summary["deferred"] += len(self.queue)
+        summary["remaining_budget"] = remaining
+        logging.info(f"Refresh run finished: {summary}")
+        return summary
+
+
+if __name__ == '__main__':
+    from database.client import db
+
+    parser = argparse.ArgumentParser(description="Refresh the most valuable stale Scholar profiles")
+    parser.add_argument("--budget", type=int, default=DAILY_BUDGET, help="Scholar requests per day")
+    parser.add_argument("--time-limit", type=float, help="Stop after this many seconds")
+    parser.add_argument("--dry-run", action="store_true", help="Only log what would be refreshed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    RefreshScheduler(db, daily_budget=args.budget).run(time_limit=args.time_limit, dry_run=args.dry_run)
@@ -0,0 +1,53 @@
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# Lowercase, strip punctuation and collapse whitespace so trivially different
+# phrasings of the same question share a cache entry
+def normalize_query(query):
+    query = re.sub(r"[^\w\s]", " ", (query or "").lower())
+    return " ".join(query.split())
+
+
+# Cache key: normalized query plus a hash of the retrieval context, so an
+# answer is reused only while the underlying faculty data is unchanged
+def response_key(query, context):
+    context_hash = hashlib.sha1((context or "").encode("utf-8")).hexdigest()
+    return hashlib.sha1(f"{normalize_query(query)}\0{context_hash}".encode("utf-8")).hexdigest()
+
+
+# Thread-safe LRU cache with a per-entry TTL
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=6 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
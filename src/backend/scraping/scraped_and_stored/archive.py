@@ -0,0 +1,332 @@
+import os
+import mmap
+import time
+import zlib
+import struct
+import logging
+import threading
+import msgpack
+
+# Archive layout, one directory per department:
+#   {root}/{department}/shard-00000.lpa   blocks of msgpack records
+#   {root}/{department}/shard-00000.idx   msgpack {key: [block_offset, record_offset, record_length]}
+#
+# Records are grouped into ~64 KB blocks, each zlib-compressed on its own and
+# framed with a 4-byte length, so one record can be read by decompressing a
+# single block. Keys are "author/{scholar_id}" and "pub/{scholar_id}/{pub_id}".
+#
+# Every crawl of an author gets a crawl id, stored on each publication record,
+# on the author record and in the index. The author record is written after
+# the publications, so it marks the crawl complete: readers serve the
+# publications of the newest completed crawl, wherever shard rollover put
+# them, and ignore older (or unfinished) crawls.
+# A shard whose writer died before writing its index can be re-indexed with
+# rebuild_index().
+
+SHARD_SUFFIX = ".lpa"
+INDEX_SUFFIX = ".idx"
+BLOCK_HEADER = struct.Struct("<I")
+
+
+def author_key(scholar_id):
+    return f"author/{scholar_id}"
+
+
+def pub_key(scholar_id, pub_id):
+    return f"pub/{scholar_id}/{pub_id}"
+
+
+def pack(record):
+    return msgpack.packb(record, use_bin_type=True, default=str)
+
+
+def record_key(record):
+    if record["type"] == "author":
+        return author_key(record["scholar_id"])
+    return pub_key(record["scholar_id"], record["pub_id"])
+
+
+# Index entries are [block_offset, record_offset, record_length, crawl];
+# archives written before crawl ids have no fourth element (crawl 0)
+def entry_crawl(location):
+    return location[3] if len(location) > 3 else 0
+
+
+def shard_paths(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(SHARD_SUFFIX))
+
+
+# Appends records to a new shard in the department's directory, rolling over
+# to another shard after max_shard_bytes. Safe to call from several threads.
+class ArchiveWriter:
+    def __init__(self, root, department, block_size=64 * 1024, max_shard_bytes=256 * 1024 * 1024, level=6):
+        self.directory = os.path.join(root, department)
+        os.makedirs(self.directory, exist_ok=True)
+        self.block_size = block_size
+        self.max_shard_bytes = max_shard_bytes
+        self.level = level
+        self.lock = threading.Lock()
+        self.file = None
+        self.records = 0
+        self.crawls = {}
+        self.last_crawl = 0
+        self._open_shard()
+
+    def _open_shard(self):
+        existing = shard_paths(self.directory)
+        number = int(os.path.basename(existing[-1])[6:11]) + 1 if existing else 0
+        # Exclusive create, so two writers never share a shard
+        while True:
+            self.path = os.path.join(self.directory, f"shard-{number:05d}{SHARD_SUFFIX}")
+            try:
+                self.file = open(self.path, "xb")
+                break
+            except FileExistsError:
+                number += 1
+        self.index = {}
+        self.block = bytearray()
+        self.block_keys = []
+
+    def _flush_block(self):
+        if not self.block:
+            return
+        offset = self.file.tell()
+        data = zlib.compress(bytes(self.block), self.level)
+        self.file.write(BLOCK_HEADER.pack(len(data)))
+        self.file.write(data)
+        for key, record_offset, record_length, crawl in self.block_keys:
+            self.index[key] = [offset, record_offset, record_length, crawl]
+        self.block = bytearray()
+        self.block_keys = []
+
+    def _close_shard(self):
+        self._flush_block()
+        self.file.close()
+        with open(self.path[:-len(SHARD_SUFFIX)] + INDEX_SUFFIX, "wb") as f:
+            f.write(msgpack.packb(self.index, use_bin_type=True))
+
+    def write(self, record):
+        data = pack(record)
+        with self.lock:
+            self.block_keys.append((record_key(record), len(self.block), len(data), record.get("crawl", 0)))
+            self.block += data
+            self.records += 1
+            if len(self.block) >= self.block_size:
+                self._flush_block()
+                if self.file.tell() >= self.max_shard_bytes:
+                    self._close_shard()
+                    self._open_shard()
+
+    # Crawl id for the author's current crawl, started by their first
+    # publication and finished by write_author(). Ids increase across writers.
+    def crawl_id(self, scholar_id):
+        with self.lock:
+            crawl = self.crawls.get(scholar_id)
+            if crawl is None:
+                crawl = self.last_crawl = max(time.time_ns(), self.last_crawl + 1)
+                self.crawls[scholar_id] = crawl
+            return crawl
+
+    def write_author(self, author):
+        scholar_id = author["scholar_id"]
+        crawl = self.crawl_id(scholar_id)
+        header = {k: v for k, v in author.items() if k != "publications"}
+        self.write(dict(header, type="author", scholar_id=scholar_id, crawl=crawl))
+        with self.lock:
+            self.crawls.pop(scholar_id, None)
+
+    def write_publication(self, scholar_id, pub_id, publication):
+        self.write({"type": "publication", "scholar_id": scholar_id, "pub_id": pub_id, "data": publication,
+                    "crawl": self.crawl_id(scholar_id)})
+
+    def close(self):
+        with self.lock:
+            self._close_shard()
+        logging.info(f"Archived {self.records} records to {self.directory}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def iter_blocks(buf):
+    offset = 0
+    while offset + BLOCK_HEADER.size <= len(buf):
+        (length,) = BLOCK_HEADER.unpack_from(buf, offset)
+        start = offset + BLOCK_HEADER.size
+        if start + length > len(buf):
+            return  # truncated final block from an interrupted write
+        yield offset, zlib.decompress(buf[start:start + length])
+        offset = start + length
+
+
+# Recreate a shard's index by scanning its blocks
+def rebuild_index(shard_path):
+    index = {}
+    with open(shard_path, "rb") as f:
+        buf = f.read()
+    for block_offset, block in iter_blocks(buf):
+        unpacker = msgpack.Unpacker(raw=False)
+        unpacker.feed(block)
+        position = 0
+        for record in unpacker:
+            end = unpacker.tell()
+            index[record_key(record)] = [block_offset, position, end - position, record.get("crawl", 0)]
+            position = end
+    with open(shard_path[:-len(SHARD_SUFFIX)] + INDEX_SUFFIX, "wb") as f:
+        f.write(msgpack.packb(index, use_bin_type=True))
+    return index
+
+
+# Random and sequential access to one department's archive through mmap
+class ArchiveReader:
+    def __init__(self, root, department):
+        self.directory = os.path.join(root, department)
+        self.shards = []
+        self.keys = {}
+        self.author_pubs = {}
+        authors = {}
+        pubs = {}
+        for path in shard_paths(self.directory):
+            if os.path.getsize(path) == 0:
+                continue
+            index_path = path[:-len(SHARD_SUFFIX)] + INDEX_SUFFIX
+            if os.path.exists(index_path):
+                with open(index_path, "rb") as f:
+                    index = msgpack.unpackb(f.read(), raw=False)
+            else:
+                index = rebuild_index(path)
+            f = open(path, "rb")
+            shard = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.shards.append(shard)
+            for key, location in index.items():
+                if key.startswith("author/"):
+                    # Newest crawl wins (later shard on a tie)
+                    current = authors.get(key[len("author/"):])
+                    if current is None or entry_crawl(location) >= entry_crawl(current[1]):
+                        authors[key[len("author/"):]] = (shard, location)
+                else:
+                    pubs.setdefault(key, {})[entry_crawl(location)] = (shard, location)
+
+        for scholar_id, entry in authors.items():
+            self.keys[author_key(scholar_id)] = entry
+        # Only the publications of each author's newest completed crawl
+        for key, by_crawl in pubs.items():
+            scholar_id = key[4:].split("/", 1)[0]
+            author = authors.get(scholar_id)
+            if author is None:
+                continue
+            entry = by_crawl.get(entry_crawl(author[1]))
+            if entry is not None:
+                self.keys[key] = entry
+                self.author_pubs.setdefault(scholar_id, []).append(key)
+        self.block_cache = {}
+
+    def _block(self, shard, block_offset):
+        cache_key = (id(shard), block_offset)
+        block = self.block_cache.get(cache_key)
+        if block is None:
+            buf = shard[1]
+            (length,) = BLOCK_HEADER.unpack_from(buf, block_offset)
+            start = block_offset + BLOCK_HEADER.size
+            block = zlib.decompress(buf[start:start + length])
+            # Only the most recent block is kept; sequential reads hit it
+            self.block_cache = {cache_key: block}
+        return block
+
+    def get(self, key):
+        entry = self.keys.get(key)
+        if entry is None:
+            return None
+        shard, (block_offset, record_offset, record_length) = entry[0], entry[1][:3]
+        block = self._block(shard, block_offset)
+        return msgpack.unpackb(block[record_offset:record_offset + record_length], raw=False)
+
+    def get_author(self, scholar_id):
+        record = self.get(author_key(scholar_id))
+        if record is None:
+            return None
+        record = dict(record)
+        record.pop("type", None)
+        return record
+
+    def get_publication(self, scholar_id, pub_id):
+        record = self.get(pub_key(scholar_id, pub_id))
+        return record["data"] if record else None
+
+    def scholar_ids(self):
+        return [key[len("author/"):] for key in self.keys if key.startswith("author/")]
+
+    # (pub_id, publication) pairs for one author, in archive order
+    def publications(self, scholar_id):
+        prefix = f"pub/{scholar_id}/"
+        entries = sorted((self.shards.index(self.keys[key][0]), self.keys[key][1], key) for key in self.author_pubs.get(scholar_id, []))
+        for _, _, key in entries:
+            yield key[len(prefix):], self.get(key)["data"]
+
+    # Authors in the same shape as the old per-author JSON files
+    def iter_authors(self):
+        for scholar_id in self.scholar_ids():
+            author = self.get_author(scholar_id)
+            author["publications"] = [pub for _, pub in self.publications(scholar_id)]
+            yield author
+
+    def close(self):
+        for f, buf in self.shards:
+            buf.close()
+            f.close()
+        self.shards = []
+
+
+# Publication id inside the archive: Scholar's author_pub_id, else its position
+def archive_pub_id(publication, position):
+    return publication.get("author_pub_id") or f"idx{position:05d}"
+
+
+# Convert a folder of per-author JSON files into the archive
+def convert_json_folder(json_folder, root, department):
+    from scraping.scraped_and_stored.bulk_ingest import stream_author_file
+
+    converted = 0
+    with ArchiveWriter(root, department) as writer:
+        for name in sorted(os.listdir(json_folder)):
+            if not name.endswith(".json"):
+                continue
+            header = {}
+            position = 0
+            pending = []
+            try:
+                for event in stream_author_file(os.path.join(json_folder, name)):
+                    if event[0] == "field":
+                        header[event[1]] = event[2]
+                        continue
+                    pending.append(event[1])
+                    if header.get("scholar_id"):
+                        for publication in pending:
+                            writer.write_publication(header["scholar_id"], archive_pub_id(publication, position), publication)
+                            position += 1
+                        pending = []
+            except ValueError as e:
+                print(f"Error reading {name}: {e}")
+                continue
+            if not header.get("scholar_id"):
+                print(f"Missing scholar_id in {name}. Skipping.")
+                continue
+            for publication in pending:
+                writer.write_publication(header["scholar_id"], archive_pub_id(publication, position), publication)
+                position += 1
+            writer.write_author(header)
+            converted += 1
+    print(f"Converted {converted} author files from {json_folder} into {os.path.join(root, department)}")
+    return converted
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python -m scraping.scraped_and_stored.archive <json_folder> <archive_root> <department_id>
+    convert_json_folder(*sys.argv[1:4])
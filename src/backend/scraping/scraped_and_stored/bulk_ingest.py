@@ -0,0 +1,341 @@
+import os
+import json
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from firebase_admin import firestore
+from database.bulk_writer import ParallelBatchWriter
+from database.manifest import MANIFEST_COLLECTION, MANIFEST_DOC, publication_hash
+from database.rollups import faculty_contribution, update_department_rollup
+from database.dedup import assign_canonical_ids, canonical_document
+from scraping.scraped_and_stored.records import faculty_summary, merge_fields, publication_id, publication_record
+
+# Author files larger than this are streamed instead of parsed in the pool
+STREAM_THRESHOLD = 8 * 1024 * 1024
+
+WHITESPACE = " \t\n\r"
+NUMBER_START = "-0123456789"
+NUMBER_CHARS = "0123456789+-.eE"
+
+# Authors whose writes are flushed together before their manifests and
+# rollup contributions are written
+MANIFEST_GROUP = 50
+
+
+# Walk a scraped author JSON file without loading it whole. Yields
+# ("field", key, value) for each top-level key and ("publication", item)
+# for each element of the "publications" array, one at a time.
+def stream_author_file(path, chunk_size=1024 * 1024):
+    decoder = json.JSONDecoder()
+    with open(path, 'r') as f:
+        state = {"buf": "", "pos": 0, "eof": False}
+
+        def fill():
+            more = f.read(chunk_size)
+            if not more:
+                state["eof"] = True
+            state["buf"] = state["buf"][state["pos"]:] + more
+            state["pos"] = 0
+
+        def peek():
+            while True:
+                buf, pos = state["buf"], state["pos"]
+                while pos < len(buf) and buf[pos] in WHITESPACE:
+                    pos += 1
+                state["pos"] = pos
+                if pos < len(buf):
+                    return buf[pos]
+                if state["eof"]:
+                    raise ValueError(f"Unexpected end of file in {path}")
+                fill()
+
+        def expect(char):
+            if peek() != char:
+                raise ValueError(f"Expected '{char}' at offset {state['pos']} in {path}")
+            state["pos"] += 1
+
+        def decode():
+            peek()
+            while True:
+                buf, pos = state["buf"], state["pos"]
+                # A number may continue in the next chunk ("1." + "5e10"), so
+                # read until something other than a number character follows it
+                if buf[pos] in NUMBER_START:
+                    end = pos
+                    while end < len(buf) and buf[end] in NUMBER_CHARS:
+                        end += 1
+                    if end == len(buf) and not state["eof"]:
+                        fill()
+                        continue
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    if end < len(buf) or state["eof"]:
+                        state["pos"] = end
+                        return value
+                except json.JSONDecodeError:
+                    if state["eof"]:
+                        raise
+                fill()
+
+        expect("{")
+        if peek() == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            if key == "publications":
+                expect("[")
+                if peek() == "]":
+                    state["pos"] += 1
+                else:
+                    while True:
+                        yield ("publication", decode())
+                        if peek() == ",":
+                            state["pos"] += 1
+                            continue
+                        expect("]")
+                        break
+            else:
+                yield ("field", key, decode())
+            if peek() == ",":
+                state["pos"] += 1
+                continue
+            expect("}")
+            return
+
+
+# Turn one author's data into the documents to write
+def author_documents(faculty_data, publications):
+    records = {}
+    for publication in publications:
+        pub_id = publication_id(publication)
+        if pub_id:
+            records[pub_id] = merge_fields(publication_record(publication))
+    return {
+        "college_id": faculty_data.get('college_id', 'faculty_computing'),
+        "department_id": faculty_data.get('department_id', 'dept_it'),
+        "faculty": faculty_summary(faculty_data, records.values()),
+        "publications": records,
+    }
+
+
+# Process pool worker: parse one (small) author file
+def parse_author_file(path):
+    with open(path, 'r') as f:
+        faculty_data = json.load(f)
+    return author_documents(faculty_data, faculty_data.get('publications', []))
+
+
+# Stream a large author file straight into the writer
+def ingest_streamed(writer, path, faculty_ref_for, manifests):
+    faculty_data = {}
+    pending = []
+    faculty_ref = None
+    manifest = {}
+    # Title, year and citations of every publication already written, for the
+    # summary and the rollups
+    written = []
+    for event in stream_author_file(path):
+        if event[0] == "field":
+            faculty_data[event[1]] = event[2]
+            continue
+        # Publications are buffered until the scholar_id has been seen
+        pending.append(event[1])
+        if faculty_ref is None and faculty_data.get('scholar_id'):
+            faculty_ref = faculty_ref_for(faculty_data)
+        if faculty_ref is not None:
+            college_id = faculty_data.get('college_id', 'faculty_computing')
+            department_id = faculty_data.get('department_id', 'dept_it')
+            records = {}
+            for publication in pending:
+                pub_id = publication_id(publication)
+                if pub_id:
+                    records[pub_id] = merge_fields(publication_record(publication))
+            assign_canonical_ids(writer.db, college_id, records)
+            for pub_id, record in records.items():
+                write_publication(writer, faculty_ref, college_id, department_id, pub_id, record, manifest)
+                written.append({"title": record.get("title"), "pub_year": record.get("pub_year"),
+                                "num_citations": record.get("num_citations", 0)})
+            pending = []
+
+    if not faculty_data.get('scholar_id'):
+        raise ValueError(f"Missing scholar_id in {path}")
+    docs = author_documents(faculty_data, pending)
+    publications = written + list(docs["publications"].values())
+    docs["faculty"] = faculty_summary(faculty_data, publications)
+    faculty_ref = faculty_ref or faculty_ref_for(faculty_data)
+    manifests.add(faculty_ref, write_author(writer, faculty_ref, docs, manifest), rollup_entry(docs, publications))
+
+
+# Queue one publication and its canonical copy, and record it in the manifest.
+# The record already carries its canonical_id, so the manifest hash matches
+# the one store_faculty_data's sync computes.
+def write_publication(writer, faculty_ref, college_id, department_id, pub_id, record, manifest):
+    writer.set(faculty_ref.collection("publications").document(pub_id), record, merge=True)
+    canonical = canonical_document(writer.db, college_id, department_id, faculty_ref.id, pub_id, record)
+    if canonical is not None:
+        writer.set(canonical[0], canonical[1], merge=True)
+    manifest[pub_id] = {"hash": publication_hash(record), "num_citations": record.get("num_citations", 0)}
+
+
+# Queue an author's documents; returns their delta-sync manifest entries
+def write_author(writer, faculty_ref, docs, manifest=None):
+    manifest = dict(manifest or {})
+    # Link papers shared with colleagues, as store_faculty_data does
+    assign_canonical_ids(writer.db, docs["college_id"], docs["publications"])
+    # Publications live only in the subcollection; drop any legacy array
+    writer.set(faculty_ref, dict(docs["faculty"], publications=firestore.DELETE_FIELD), merge=True)
+    for pub_id, record in docs["publications"].items():
+        write_publication(writer, faculty_ref, docs["college_id"], docs["department_id"], pub_id, record, manifest)
+    return manifest
+
+
+# (college_id, department_id, rollup contribution) for an author's documents
+def rollup_entry(docs, publications=None):
+    publications = list(docs["publications"].values()) if publications is None else publications
+    return docs["college_id"], docs["department_id"], faculty_contribution(docs["faculty"], publications)
+
+
+# Delta-sync manifests and rollup contributions of the authors being
+# ingested. A manifest must never describe publications that were not
+# committed, so writes are flushed every `group_size` authors and the group's
+# manifests (and rollup contributions) are only written when no commit failed
+# in the meantime (otherwise the old manifests stay and the next sync rewrites
+# those publications). Bulk mode deletes nothing, so entries are merged into
+# the existing manifest: publications missing from the new file stay listed
+# and the next sync_publications removes them.
+class ManifestQueue:
+    def __init__(self, writer, group_size=MANIFEST_GROUP):
+        self.writer = writer
+        self.group_size = group_size
+        self.pending = []
+        self.errors = writer.stats()["errors"]
+        self.skipped = 0
+
+    def add(self, faculty_ref, manifest, rollup=None):
+        self.pending.append((faculty_ref, manifest, rollup))
+        if len(self.pending) >= self.group_size:
+            self.commit()
+
+    def commit(self):
+        self.writer.flush()
+        errors = self.writer.stats()["errors"]
+        if errors > self.errors:
+            logging.error(f"{errors - self.errors} writes failed; not updating the manifests of "
+                          f"{len(self.pending)} authors")
+            self.skipped += len(self.pending)
+        else:
+            departments = {}
+            for faculty_ref, manifest, rollup in self.pending:
+                self.writer.set(faculty_ref.collection(MANIFEST_COLLECTION).document(MANIFEST_DOC),
+                                {"entries": manifest}, merge=True)
+                if rollup is not None:
+                    college_id, department_id, contribution = rollup
+                    departments.setdefault((college_id, department_id), {})[faculty_ref.id] = contribution
+            # One rollup transaction per department for the whole group
+            if not self.writer.dry_run:
+                for (college_id, department_id), contributions in departments.items():
+                    update_department_rollup(self.writer.db, college_id, department_id, contributions)
+        self.pending = []
+        self.errors = errors
+
+
+# Bulk version of upload_faculty_data: small files are parsed in a process
+# pool, large ones are streamed, and every write goes through a parallel
+# batch writer. No document is read first. Publications get their canonical
+# ids and copies as in store_faculty_data, but the collaboration graph and
+# topic index are not updated per author: rebuild them after a bulk load
+# (python -m database.collaborations --rebuild COLLEGE, python -m database.topics).
+def bulk_upload_faculty_data(db, json_folder, workers=None, max_in_flight=8, dry_run=False):
+    def faculty_ref_for(faculty_data):
+        return db.collection("colleges").document(faculty_data.get('college_id', 'faculty_computing')) \
+            .collection("departments").document(faculty_data.get('department_id', 'dept_it')) \
+            .collection("faculty_members").document(faculty_data['scholar_id'])
+
+    paths = [os.path.join(json_folder, name) for name in sorted(os.listdir(json_folder)) if name.endswith('.json')]
+    small = [p for p in paths if os.path.getsize(p) <= STREAM_THRESHOLD]
+    large = [p for p in paths if os.path.getsize(p) > STREAM_THRESHOLD]
+    started = time.monotonic()
+    authors = 0
+    failed = 0
+
+    with ParallelBatchWriter(db, max_in_flight=max_in_flight, dry_run=dry_run) as writer:
+        manifests = ManifestQueue(writer)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(parse_author_file, path): path for path in small}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    docs = future.result()
+                except Exception as e:
+                    print(f"Error parsing {os.path.basename(path)}: {e}")
+                    failed += 1
+                    continue
+                if not docs["faculty"].get("scholar_id"):
+                    print(f"Error: Missing scholar_id in {os.path.basename(path)}. Skipping.")
+                    failed += 1
+                    continue
+                faculty_ref = faculty_ref_for(dict(docs["faculty"], college_id=docs["college_id"], department_id=docs["department_id"]))
+                manifests.add(faculty_ref, write_author(writer, faculty_ref, docs), rollup_entry(docs))
+                authors += 1
+
+        for path in large:
+            try:
+                ingest_streamed(writer, path, faculty_ref_for, manifests)
+                authors += 1
+            except Exception as e:
+                print(f"Error streaming {os.path.basename(path)}: {e}")
+                failed += 1
+        manifests.commit()
+
+    stats = writer.stats()
+    elapsed = time.monotonic() - started
+    stats.update({"authors": authors, "failed_files": failed, "skipped_manifests": manifests.skipped, "elapsed_seconds": elapsed,
+                  "docs_per_second": stats["written"] / elapsed if elapsed > 0 else 0.0})
+    prefix = "[dry run] " if dry_run else ""
+    print(f"{prefix}Ingested {authors} authors, {stats['written']} documents in {elapsed:.1f}s "
+          f"({stats['docs_per_second']:.0f} docs/sec, {stats['commits']} commits, {failed} failed files)")
+    return stats
+
+
+# Bulk upload one department's archive (see archive.py)
+def bulk_upload_archive(db, archive_root, department, college_id='faculty_computing', max_in_flight=8, dry_run=False):
+    from scraping.scraped_and_stored.archive import ArchiveReader
+
+    reader = ArchiveReader(archive_root, department)
+    authors = 0
+    with ParallelBatchWriter(db, max_in_flight=max_in_flight, dry_run=dry_run) as writer:
+        manifests = ManifestQueue(writer)
+        for author in reader.iter_authors():
+            author.setdefault('college_id', college_id)
+            author.setdefault('department_id', department)
+            docs = author_documents(author, author['publications'])
+            faculty_ref = db.collection("colleges").document(docs["college_id"]) \
+                .collection("departments").document(docs["department_id"]) \
+                .collection("faculty_members").document(author['scholar_id'])
+            manifests.add(faculty_ref, write_author(writer, faculty_ref, docs), rollup_entry(docs))
+            authors += 1
+        manifests.commit()
+    reader.close()
+    stats = writer.stats()
+    stats["authors"] = authors
+    stats["skipped_manifests"] = manifests.skipped
+    print(f"Ingested {authors} authors, {stats['written']} documents from the {department} archive "
+          f"({stats['docs_per_second']:.0f} docs/sec)")
+    return stats
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk upload scraped author JSON files to Firestore")
+    parser.add_argument("json_folder")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--max-in-flight", type=int, default=8, help="concurrent batch commits")
+    parser.add_argument("--dry-run", action="store_true", help="parse and count writes without committing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    from scraping.scraped_and_stored.store_json_files import db
+    bulk_upload_faculty_data(db, args.json_folder, workers=args.workers,
+                             max_in_flight=args.max_in_flight, dry_run=args.dry_run)
@@ -1,67 +1,109 @@
-import scholarly
-from scholarly import scholarly
 import json
 import logging
 import time
-import random
-import requests
+from scraping.harvester import Harvester, backoff_delay
+from scraping.checkpoint import CrawlCheckpoint
+from scraping.http_cache import install_scholar_cache
+from scraping.scraped_and_stored.archive import ArchiveWriter, archive_pub_id
+from metrics import RETRIES
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 
-# List of proxies 
-proxy_pool = [
-   '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-   '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-   '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-]
-def get_random_proxy():
-    return random.choice(proxy_pool)
-
-def fetch_author_and_publications(scholar_id, filename):
-    proxy = get_random_proxy()  # Get a random proxy
-    try:
-        author = scholarly.search_author_id(scholar_id)
-        author_filled = scholarly.fill(author)
-
-        # Fetch each publication's details
-        publications = []
-        for pub in author_filled['publications']:
-            pub_filled = scholarly.fill(pub)  # Fill each publication with full details
-            publications.append(pub_filled)
-
-        author_filled['publications'] = publications
-        logging.info(f"Successfully scraped data for {author_filled['name']}")
-
-        # Convert the author's data to JSON format
-        author_json = json.dumps(author_filled, indent=4)
-
-        # Save the JSON data to a file
-        with open(filename, 'w') as json_file:
-            json.dump(author_filled, json_file, indent=4)
+# Serve unchanged Scholar pages from the on-disk cache
+page_cache = install_scholar_cache()
+
+def write_author_json(author_filled, filename):
+    # Save the JSON data to a file
+    with open(filename, 'w') as json_file:
+        json.dump(author_filled, json_file, indent=4)
+
+def author_filename(author):
+    return f"{author['name'].replace(' ', '_')}_data.json"  # Create a filename based on the author's name
+
+# Retries back off exponentially (capped, with jitter) and resume from the
+# crawl checkpoint, so only the publications not yet filled are refetched
+def fetch_author_and_publications(scholar_id, filename, harvester=None, max_attempts=6):
+    harvester = harvester or Harvester(max_authors=1, checkpoint=CrawlCheckpoint())
+    for attempt in range(max_attempts):
+        try:
+            # Fetch the author and fill each publication's details concurrently
+            author_filled = harvester.harvest_author(scholar_id)
+            logging.info(f"Successfully scraped data for {author_filled['name']}")
+
+            write_author_json(author_filled, filename)
+            if harvester.checkpoint is not None:
+                harvester.checkpoint.finish(scholar_id)
             logging.info(f"Data for scholar {scholar_id} exported to {filename}")
-
-    except Exception as e:
-        logging.error(f"Error fetching or exporting data for scholar {scholar_id}: {e}")
-        logging.error(f"Retrying after delay...")
-        time.sleep(5)
-        fetch_author_and_publications(scholar_id, filename)
-        
-# Function to export multiple authors in smaller batches
-def export_multiple_authors(authors_data, batch_size=5):
-    total_authors = len(authors_data)
-    for start_idx in range(0, total_authors, batch_size):
-        end_idx = min(start_idx + batch_size, total_authors)
-        logging.info(f"Processing batch {start_idx + 1} to {end_idx}")
-        # Process each author in the batch
-        for author in authors_data[start_idx:end_idx]:
-            scholar_id = author['scholar_id']
-            filename = f"{author['name'].replace(' ', '_')}_data.json"  # Create a filename based on the author's name
-            fetch_author_and_publications(scholar_id, filename) 
-        # Delay between batches
-        batch_delay = random.uniform(5, 7)  # Delay between 5 to 7 seconds between batches
-        logging.info(f"Waiting for {batch_delay:.2f} seconds before the next batch...")
-        time.sleep(batch_delay)
+            return author_filled
+
+        except Exception as e:
+            logging.error(f"Error fetching or exporting data for scholar {scholar_id}: {e}")
+            if attempt + 1 == max_attempts:
+                break
+            delay = backoff_delay(attempt)
+            logging.error(f"Retrying in {delay:.0f}s (attempt {attempt + 2} of {max_attempts})...")
+            RETRIES.inc(operation="fetch_author")
+            time.sleep(delay)
+
+    logging.error(f"Giving up on scholar {scholar_id}; the next run resumes from its checkpoint")
+    return None
+
+# Function to export multiple authors concurrently.
+# max_authors / max_publications set how many fills run at once; the
+# rate limits (requests per second) replace the fixed delay between batches.
+# Progress is checkpointed, so running the same list again after an
+# interruption skips exported authors and resumes partly crawled ones;
+# resume=False starts the list over.
+def export_multiple_authors(authors_data, max_authors=2, max_publications=8, proxy_rate=1.0, host_rate=0.5,
+                            checkpoint_dir=None, resume=True):
+    checkpoint = CrawlCheckpoint(checkpoint_dir)
+    if not resume:
+        for author in authors_data:
+            checkpoint.discard(author['scholar_id'])
+    harvester = Harvester(max_authors=max_authors, max_publications=max_publications,
+                          proxy_rate=proxy_rate, host_rate=host_rate, checkpoint=checkpoint)
+
+    def on_author(author, author_filled):
+        filename = author_filename(author)
+        write_author_json(author_filled, filename)
+        logging.info(f"Data for scholar {author['scholar_id']} exported to {filename}")
+
+    # Authors that fail in the pool are retried one at a time
+    def on_error(author, e):
+        fetch_author_and_publications(author['scholar_id'], author_filename(author), harvester)
+
+    harvester.harvest(authors_data, on_author=on_author, on_error=on_error)
+    checkpoint.close()
+    logging.info(f"Scholar page cache: {page_cache.stats()}")
+    logging.info(f"Scholar proxies: {harvester.proxy_manager.stats()}")
+    return harvester.stats()
+
+# Export several department rosters in one run, e.g.
+# export_rosters({"cs": cs_authors_list, "it": it_authors_list}). Rerunning it
+# after an interruption continues where it stopped.
+def export_rosters(rosters, **kwargs):
+    stats = {}
+    for department, authors_data in rosters.items():
+        logging.info(f"Exporting {department} roster ({len(authors_data)} authors)")
+        stats[department] = export_multiple_authors(authors_data, **kwargs)
+    return stats
+
+# Stream authors into the department's compact archive as they are scraped,
+# instead of keeping every publication in memory and writing one JSON file each
+def export_authors_to_archive(authors_data, archive_root, department, max_authors=2, max_publications=8):
+    with ArchiveWriter(archive_root, department) as writer:
+        def on_publication(scholar_id, i, pub_filled):
+            writer.write_publication(scholar_id, archive_pub_id(pub_filled, i), pub_filled)
+
+        def on_author(author, author_filled):
+            writer.write_author(dict(author_filled, scholar_id=author['scholar_id']))
+
+        harvester = Harvester(max_authors=max_authors, max_publications=max_publications,
+                              on_publication=on_publication, keep_publications=False)
+        harvester.harvest(authors_data, on_author=on_author)
+    logging.info(f"Scholar page cache: {page_cache.stats()}")
+    return harvester.stats()
 
 # data for multiple authors
 cs_authors_list = [
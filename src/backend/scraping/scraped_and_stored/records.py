@@ -0,0 +1,100 @@
+import re
+
+# Extract DOI from publication URL
+def extract_doi(pub_url):
+    if not pub_url:
+        return None
+    doi_pattern = r'10.\d{4,9}/[-._;()/:A-Z0-9]+'
+    match = re.search(doi_pattern, pub_url, re.IGNORECASE)
+    return match.group(0) if match else None
+
+# Fields stored on the faculty member document
+def faculty_fields(faculty_data):
+    return {
+        "scholar_id": faculty_data.get("scholar_id"),
+        "name": faculty_data.get("name"),
+        "affiliation": faculty_data.get("affiliation"),
+        "email_domain": faculty_data.get("email_domain"),
+        "homepage": faculty_data.get("homepage"),
+        "interests": faculty_data.get("interests", []),
+        "hindex": faculty_data.get("hindex"),
+        "hindex5y": faculty_data.get("hindex5y"),
+        "i10index": faculty_data.get("i10index"),
+        "i10index5y": faculty_data.get("i10index5y"),
+        "citedby": faculty_data.get("citedby"),
+        "citedby5y": faculty_data.get("citedby5y"),
+        "cites_per_year": faculty_data.get("cites_per_year", {}),
+        "coauthors": faculty_data.get("coauthors", []),
+        "url_picture": faculty_data.get("url_picture", "")
+    }
+
+# Document ID for a publication
+def publication_id(publication):
+    # First choice: Use 'author_pub_id' if available
+    pub_id = publication.get('author_pub_id')
+
+    # Second choice: Use the extracted DOI if 'author_pub_id' is not available
+    if not pub_id:
+        pub_url = publication.get('pub_url', "")
+        pub_id = extract_doi(pub_url)
+    return pub_id
+
+# Fields stored on a publication document
+def publication_record(publication):
+    return {
+        "title": publication.get('bib', {}).get("title"),
+        "authors": publication.get('bib', {}).get("author", ""),
+        "pub_year": publication.get('bib', {}).get("pub_year", ""),
+        "journal": publication.get('bib', {}).get("journal", ""),
+        "pages": publication.get('bib', {}).get("pages", ""),
+        "volume": publication.get('bib', {}).get("volume", ""),
+        "number": publication.get('bib', {}).get("number", ""),
+        "citation": publication.get('bib', {}).get("citation", ""),
+        "publisher": publication.get('bib', {}).get("publisher", ""),
+        "abstract": publication.get('bib', {}).get("abstract", ""),
+        "num_citations": publication.get('num_citations', 0),
+        "pub_url": publication.get('pub_url', ""),
+        "cites_per_year": publication.get("cites_per_year", {}),
+        "filled": publication.get("filled", False),
+        "author_pub_id": publication.get("author_pub_id", ""),
+        "citedby_url": publication.get("citedby_url", ""),
+        "cites_id": publication.get("cites_id", [])
+    }
+
+# A publication from the profile's list page (filled=False) only has a title,
+# year and citation counts; its empty bib fields and the filled flag are left
+# out so a merge write keeps the abstract and authors of a full scrape
+def merge_fields(record):
+    if record.get("filled"):
+        return record
+    return {key: value for key, value in record.items() if key != "filled" and value not in ("", None, [], {})}
+
+# Titles of the most recent publications kept on the faculty document
+RECENT_TITLES = 5
+
+def publication_year(publication):
+    year = publication.get("pub_year") or publication.get('bib', {}).get("pub_year")
+    try:
+        return int(str(year).strip()[:4])
+    except (TypeError, ValueError):
+        return None
+
+# Publication count and most recent titles for the faculty summary. Accepts
+# scraped publications ('bib' dicts) or stored publication records.
+def publication_summary(publications, recent=RECENT_TITLES):
+    entries = []
+    for publication in publications:
+        title = publication.get("title") or publication.get('bib', {}).get("title") or ""
+        entries.append((publication_year(publication) or 0, title))
+    entries.sort(key=lambda entry: entry[0], reverse=True)
+    return {
+        "pub_count": len(entries),
+        "recent_titles": [{"title": title, "pub_year": year or None} for year, title in entries[:recent] if title],
+    }
+
+# Slim faculty document: profile, metrics and a publication summary. The
+# publications themselves are only stored in the publications subcollection.
+def faculty_summary(faculty_data, publications=None):
+    if publications is None:
+        publications = faculty_data.get("publications", [])
+    return dict(faculty_fields(faculty_data), **publication_summary(publications))
@@ -1,24 +1,18 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
+import scraping
+from firebase_admin import firestore
 #from backend.scraping.utils import extract_doi
-import re
+from database.manifest import sync_publications
+from database.recursive_delete import delete_faculty_subtrees
+from database.rollups import update_faculty_rollup
+from database.collaborations import refresh_collaborations
+from database.topics import tag_faculty_publications
+from database.dedup import assign_canonical_ids, store_canonical, remove_canonical_refs
+from scraping.scraped_and_stored.records import faculty_fields, faculty_summary, merge_fields, publication_id, publication_record
 
-# Initialize Firebase with your service account credentials
-cred = credentials.Certificate('/Users/ruba/Downloads/Majd/litrix/litrix-f06e0-firebase-adminsdk-5uspj-5aecd2badc.json')
-firebase_admin.initialize_app(cred)
-
-# Initialize Firestore
-db = firestore.client()
-
-# Extract DOI from publication URL
-def extract_doi(pub_url):
-    if not pub_url:
-        return None
-    doi_pattern = r'10.\d{4,9}/[-._;()/:A-Z0-9]+'
-    match = re.search(doi_pattern, pub_url, re.IGNORECASE)
-    return match.group(0) if match else None
+# Shared Firestore client (FIREBASE_CREDENTIALS or default credentials)
+from database.client import db
 
 # Function to check if a faculty member exists and retrieve their data
 def get_faculty_member_data(faculty_ref):
@@ -27,8 +21,11 @@ def get_faculty_member_data(faculty_ref):
         return doc.to_dict()  # Return existing data if the document exists
     return None
 
-# Function to store or update a single faculty member and their publications in Firestore
-def store_faculty_data(college_id, department_id, faculty_data):
+# Function to store or update a single faculty member and their publications in Firestore.
+# The faculty document only gets a summary (pub_count, recent_titles); the
+# publications go to the subcollection. extra_fields are merged into the
+# faculty document (e.g. last_scraped).
+def store_faculty_data(college_id, department_id, faculty_data, extra_fields=None):
     scholar_id = faculty_data.get('scholar_id')
 
     # Validate that scholar_id is not None
@@ -42,88 +39,67 @@ def store_faculty_data(college_id, department_id, faculty_data):
     # Reference to the faculty member document in Firestore
     faculty_ref = db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members").document(scholar_id)
 
-    # Check if the faculty member exists
-    existing_data = get_faculty_member_data(faculty_ref)
+    # Collect the faculty member's publications for the subcollection
+    records = {}
+    for publication in faculty_data.get('publications', []):
+        pub_id = publication_id(publication)
+
+        # If neither author_pub_id nor DOI is available, skip the publication
+        if not pub_id:
+            print(f"Invalid pub_id for publication '{publication.get('title', '')}' in faculty {scholar_id}. Skipping publication.")
+            continue
 
-    if existing_data:
-        print(f"Faculty member {scholar_id} already exists. Updating fields.")
+        records[pub_id] = merge_fields(publication_record(publication))
+
+    stats = None
+    if 'publications' in faculty_data:
+        # Link papers shared with colleagues (same DOI or near-identical title + year)
+        assign_canonical_ids(db, college_id, records)
+
+        # Write only new or changed publications (using merge=True to avoid overwriting everything).
+        # Done before the faculty document, whose write is what the search listeners react to.
+        stats = sync_publications(db, faculty_ref, records, merge=True)
+        print(f"Synced publications for {scholar_id}: {stats['new']} new, {stats['changed']} changed, "
+              f"{stats['deleted']} deleted, {stats['writes_avoided']} writes avoided")
+
+    # Add or update faculty member data (using merge=True to avoid overwriting existing fields).
+    # No read first: set with merge creates or updates the document either way.
+    # A publications array left on older documents is removed.
+    if 'publications' in faculty_data:
+        fields = faculty_summary(faculty_data, records.values())
     else:
-        print(f"Storing new faculty member {scholar_id}.")
-
-    # Add or update faculty member data (using merge=True to avoid overwriting existing fields)
-    faculty_ref.set({
-        "scholar_id": faculty_data.get("scholar_id"),
-        "name": faculty_data.get("name"),
-        "affiliation": faculty_data.get("affiliation"),
-        "email_domain": faculty_data.get("email_domain"),
-        "homepage": faculty_data.get("homepage"),
-        "interests": faculty_data.get("interests", []),
-        "hindex": faculty_data.get("hindex"),
-        "hindex5y": faculty_data.get("hindex5y"),
-        "i10index": faculty_data.get("i10index"),
-        "i10index5y": faculty_data.get("i10index5y"),
-        "citedby": faculty_data.get("citedby"),
-        "citedby5y": faculty_data.get("citedby5y"),
-        "cites_per_year": faculty_data.get("cites_per_year", {}),
-        "coauthors": faculty_data.get("coauthors", []),
-        "url_picture": faculty_data.get("url_picture", "")
-    }, merge=True)
+        fields = faculty_fields(faculty_data)
+    fields["publications"] = firestore.DELETE_FIELD
+    fields.update(extra_fields or {})
+    faculty_ref.set(fields, merge=True)
 
     print(f"Committed faculty member data for {scholar_id}")
 
-# Handle publications in batches of 400 (or less if remaining publications are fewer)
-    batch = db.batch()
-    publication_count = 0
-    # Add or update faculty member's publications as a subcollection
-    if 'publications' in faculty_data:
-        for publication in faculty_data['publications']:
-            # First choice: Use 'author_pub_id' if available
-            pub_id = publication.get('author_pub_id')
-
-            # Second choice: Use the extracted DOI if 'author_pub_id' is not available
-            if not pub_id:
-                pub_url = publication.get('pub_url', "")
-                pub_id = extract_doi(pub_url)
-            
-            # If neither author_pub_id nor DOI is available, skip the publication
-            if not pub_id:
-                print(f"Invalid pub_id for publication '{publication.get('title', '')}' in faculty {scholar_id}. Skipping publication.")
-                continue
-
-            # Reference to the publication document
-            pub_ref = faculty_ref.collection("publications").document(pub_id)
-
-            # Add or update publication data (using merge=True to avoid overwriting everything)
-            batch.set(pub_ref, {
-                "title": publication.get('bib', {}).get("title"),
-                "authors": publication.get('bib', {}).get("author", ""),
-                "pub_year": publication.get('bib', {}).get("pub_year", ""),
-                "journal": publication.get('bib', {}).get("journal", ""),
-                "pages": publication.get('bib', {}).get("pages", ""),
-                "volume": publication.get('bib', {}).get("volume", ""),
-                "number": publication.get('bib', {}).get("number", ""),
-                "citation": publication.get('bib', {}).get("citation", ""),
-                "publisher": publication.get('bib', {}).get("publisher", ""),
-                "abstract": publication.get('bib', {}).get("abstract", ""),
-                "num_citations": publication.get('num_citations', 0),
-                "pub_url": publication.get('pub_url', ""),
-                "cites_per_year": publication.get("cites_per_year", {}),
-                "filled": publication.get("filled", False),
-                "author_pub_id": publication.get("author_pub_id", ""),
-                "citedby_url": publication.get("citedby_url", ""),
-                "cites_id": publication.get("cites_id", [])
-            }, merge=True)
-            publication_count += 1
-              # Commit the batch if we've added 400 publications
-            if publication_count % 400 == 0:
-                batch.commit()
-                print(f"Committed batch of 400 publications for {scholar_id}")
-                batch = db.batch()
-        # Commit any remaining publications
-        if publication_count % 400 != 0:
-            batch.commit()
-            print(f"Committed final batch of {publication_count % 400} publications for {scholar_id}")
-        
+    if stats is not None:
+        # One canonical copy per paper for department-level queries
+        store_canonical(db, college_id, department_id, scholar_id, {pub_id: records[pub_id] for pub_id in stats['written_ids']})
+        remove_canonical_refs(db, college_id, department_id, scholar_id, stats['removed_ids'])
+
+        # Keep the department/college analytics rollups current
+        update_faculty_rollup(db, college_id, department_id, faculty_data, records.values())
+        refresh_collaborations(db, college_id, department_id, faculty_data, records.values())
+
+        # Topic tags for the publications just written, and this member's topic index entries
+        tag_faculty_publications(db, college_id, department_id, faculty_data, records, stats['written_ids'])
+
+        # Chat retrieval sees the new publications without waiting for the listener
+        scraping.faculty_search.update(college_id, department_id, faculty_summary(faculty_data, records.values()), list(records.values()))
+
+        # ... and the semantic search over publication abstracts
+        try:
+            from scraping.vector_store import update_faculty_vectors
+            store, embedder = scraping.get_vectors()
+            update_faculty_vectors(store, embedder, college_id, department_id, faculty_data, records,
+                                   stats['written_ids'], stats['removed_ids'])
+        except Exception as e:
+            print(f"Error updating publication vectors for {scholar_id}: {e}")
+    return stats
+
 # Function to upload all JSON files from a folder
 def upload_faculty_data(json_folder):
     for filename in os.listdir(json_folder):
@@ -146,32 +122,15 @@ def upload_faculty_data(json_folder):
             store_faculty_data(college_id, department_id, faculty_data)
 
 # Run the function to upload all JSON files from the specified folder
-upload_faculty_data('/Users/ruba/Documents/GitHub/litrix/src/backend/scraping/scraped_and_stored/json_files/it_json_files')
-
-
-# Function to selectively delete faculty members and their publications
-def delete_selected_faculty(college_id, department_id, scholar_ids_to_delete):
-    faculty_members_ref = db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members")
-    
-    # Get all faculty members in the department
-    faculty_members = faculty_members_ref.stream()
-
-    for faculty in faculty_members:
-        if faculty.id in scholar_ids_to_delete:
-            # Delete all publications for the faculty member
-            faculty_ref = faculty_members_ref.document(faculty.id)
-            publications_ref = faculty_ref.collection("publications")
-            publications = publications_ref.stream()
-            
-            for publication in publications:
-                publications_ref.document(publication.id).delete()
-                print(f"Deleted publication {publication.id} for faculty {faculty.id}")
-            
-            # Delete the faculty member
-            faculty_ref.delete()
-            print(f"Deleted faculty member {faculty.id}")
-        else:
-            print(f"Skipped faculty member {faculty.id}, not in deletion list.")
+if __name__ == '__main__':
+    upload_faculty_data('/Users/ruba/Documents/GitHub/litrix/src/backend/scraping/scraped_and_stored/json_files/it_json_files')
+
+
+# Function to selectively delete faculty members and their publications.
+# Addresses the faculty docs directly and deletes their subcollections in
+# parallel batches; pass checkpoint_path to make a large cleanup resumable.
+def delete_selected_faculty(college_id, department_id, scholar_ids_to_delete, checkpoint_path=None):
+    return delete_faculty_subtrees(db, college_id, department_id, scholar_ids_to_delete, checkpoint_path=checkpoint_path)
 
 scholar_ids_to_delete =[
     'AeYwTUYAAAAJ', 'BqE8XJUAAAAJ', 'CiEU7s8AAAAJ', 'Gtbbx1YAAAAJ',
@@ -1,25 +1,11 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
 import scholarly
 from scholarly import scholarly
-import random
 import logging
-from database.firestore import store_publications
-
-# Set Up List of Proxies
-proxy_pool = [
-    '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823',
-    '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823',
-    '542bd662984a24e6624b__cr.gb,us,no,ie,au:31bb55cc5004a097@gw.dataimpulse.com:823'
-]
-
-def get_random_proxy():
-    return random.choice(proxy_pool)
-
-# Initialize Firebase with service account
-cred = credentials.Certificate('/Users/ruba/Downloads/litrix-main/litrix-698fe-firebase-adminsdk-9d1cb-6e9330d347.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+from contextlib import nullcontext
+from firebase_admin import firestore
+from scraping.scraped_and_stored.store_json_files import store_faculty_data
+from scraping.http_cache import install_scholar_cache
+from scraping.proxy_manager import install_proxy_manager
 
 # Configure Logging
 logging.basicConfig(
@@ -31,36 +17,32 @@ logging.basicConfig(
     ]
 )
 
+# Serve unchanged Scholar pages from the on-disk cache
+page_cache = install_scholar_cache()
 
+# Fetch the pages that miss the cache through the shared proxy pool
+proxies = install_proxy_manager()
 
-def extract_and_store_profile(scholar_id, college, department):
-    try:
-        # Extract data from Google Scholar
-        author = scholarly.search_author_id(scholar_id)
-        author_filled = scholarly.fill(author)
 
-        # Store data in Firestore
-        faculty_ref = db.collection('colleges').document(college).collection('departments').document(department).collection('faculty_members').document(scholar_id)
-        faculty_ref.set({
-            "name": author_filled.get("name", ""),
-            "scholar_id": scholar_id,
-            "affiliation": author_filled.get("affiliation", ""),
-            "interests": author_filled.get("interests", []),
-            "hindex": author_filled.get("hindex", 0),
-            "email_domain": author_filled.get("email_domain", ""),
-            "homepage": author_filled.get("homepage", ""),
-            "hindex5y": author_filled.get("hindex5y", 0),
-            "i10index": author_filled.get("i10index", 0),
-            "i10index5y": author_filled.get("i10index5y", 0),
-            "citedby": author_filled.get("citedby", 0),
-            "citedby5y": author_filled.get("citedby5y", 0),
-            "cites_per_year": author_filled.get("cites_per_year", {}),
-            "coauthors": author_filled.get("coauthors", []),
-            "url_picture": author_filled.get("url_picture", ""),
-            "publications": author_filled.get("publications", [])
-        }, merge=True)
 
-        store_publications(scholar_id, college, department)
+# fresh=True fetches every page from Scholar instead of the page cache
+# (refreshes), so the stored profile is never older than the refresh
+def extract_and_store_profile(scholar_id, college, department, fresh=False):
+    try:
+        # Extract data from Google Scholar, keeping the crawl on one proxy
+        try:
+            with proxies.session(scholar_id), (page_cache.bypass() if fresh else nullcontext()):
+                author = scholarly.search_author_id(scholar_id)
+                author_filled = scholarly.fill(author)
+        finally:
+            proxies.end_session(scholar_id)
+
+        # Store the slim faculty summary and the publications subcollection
+        # (also updates the rollups and collaboration graph)
+        store_faculty_data(college, department, dict(author_filled, scholar_id=scholar_id), extra_fields={
+            "last_scraped": firestore.SERVER_TIMESTAMP,
+            "refresh_requested": firestore.DELETE_FIELD,
+        })
         logging.info(f"Stored data for scholar_id: {scholar_id}")
         return True
         
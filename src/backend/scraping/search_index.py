@@ -0,0 +1,215 @@
+import re
+import math
+import heapq
+import logging
+import threading
+from collections import defaultdict, Counter
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "that", "the", "their", "this", "to", "using", "via", "with", "who",
+    "what", "which", "works", "work", "does", "do", "about", "me", "find", "show",
+}
+
+# Extra weight for matches in each field (applied as repeated term frequency)
+FIELD_WEIGHTS = {"name": 3, "interests": 2, "titles": 1, "abstracts": 1}
+
+
+def tokenize(text):
+    if not text:
+        return []
+    if isinstance(text, (list, tuple)):
+        text = " ".join(str(t) for t in text)
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+# In-memory BM25 index over faculty members. Each document is one faculty
+# member (name, interests, publication titles and abstracts) tagged with its
+# (college, department) scope so queries can be limited to one department.
+class BM25Index:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)   # term -> {doc_id: weighted tf}
+        self.doc_terms = {}                 # doc_id -> Counter of its terms
+        self.doc_len = {}
+        self.doc_scope = {}
+        self.doc_data = {}
+        self.total_len = 0
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    # Add or replace a document
+    def add(self, doc_id, fields, scope=None, data=None):
+        terms = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                terms[token] += weight
+
+        with self.lock:
+            self._remove(doc_id)
+            for term, tf in terms.items():
+                self.postings[term][doc_id] = tf
+            length = sum(terms.values())
+            self.doc_terms[doc_id] = terms
+            self.doc_len[doc_id] = length
+            self.doc_scope[doc_id] = scope
+            self.doc_data[doc_id] = data
+            self.total_len += length
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+        self.total_len -= self.doc_len.pop(doc_id)
+        self.doc_scope.pop(doc_id, None)
+        self.doc_data.pop(doc_id, None)
+
+    def _in_scope(self, doc_id, college, department):
+        scope = self.doc_scope.get(doc_id) or (None, None)
+        return (college is None or scope[0] == college) and (department is None or scope[1] == department)
+
+    # Top-k (doc_id, score) pairs for a query
+    def search(self, query, k=10, college=None, department=None):
+        terms = set(tokenize(query))
+        with self.lock:
+            n = len(self.doc_len)
+            if not n or not terms:
+                return []
+            avgdl = self.total_len / n
+            scores = defaultdict(float)
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    if not self._in_scope(doc_id, college, department):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / avgdl)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def get(self, doc_id):
+        return self.doc_data.get(doc_id)
+
+
+# Build the indexed fields for one faculty member
+def faculty_fields(faculty, publications=()):
+    titles = []
+    abstracts = []
+    for pub in publications:
+        bib = pub.get("bib", {})
+        titles.append(pub.get("title") or bib.get("title") or "")
+        abstracts.append(pub.get("abstract") or bib.get("abstract") or "")
+    return {
+        "name": faculty.get("name", ""),
+        "interests": faculty.get("interests", []),
+        "titles": titles,
+        "abstracts": abstracts,
+    }
+
+
+# Add or refresh one faculty member in the index (call after storing them)
+def index_faculty(index, college_id, department_id, faculty, publications=()):
+    doc_id = faculty.get("scholar_id")
+    if not doc_id:
+        return
+    summary = {k: v for k, v in faculty.items() if k != "publications"}
+    # Kept for the chat context packer, which chunks the matched members' abstracts
+    summary["publications"] = [{
+        "title": pub.get("title") or pub.get("bib", {}).get("title") or "",
+        "pub_year": pub.get("pub_year") or pub.get("bib", {}).get("pub_year"),
+        "abstract": pub.get("abstract") or pub.get("bib", {}).get("abstract") or "",
+    } for pub in publications]
+    index.add(doc_id, faculty_fields(faculty, publications), scope=(college_id, department_id), data=summary)
+
+
+def faculty_members_ref(db, college_id, department_id):
+    return db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members")
+
+
+def load_faculty(index, faculty_ref, college_id, department_id, faculty=None):
+    if faculty is None:
+        faculty = faculty_ref.get().to_dict()
+    publications = [pub.to_dict() for pub in faculty_ref.collection("publications").stream()]
+    # Documents not yet moved to the slim schema keep their publications inline
+    publications = publications or faculty.get("publications", [])
+    faculty.setdefault("scholar_id", faculty_ref.id)
+    index_faculty(index, college_id, department_id, faculty, publications)
+
+
+# Index a whole department once, then keep it current with a Firestore
+# listener that re-indexes only the faculty documents that change.
+def build_department_index(index, db, college_id, department_id, watch=True):
+    members_ref = faculty_members_ref(db, college_id, department_id)
+    count = 0
+    for doc in members_ref.stream():
+        load_faculty(index, doc.reference, college_id, department_id, doc.to_dict())
+        count += 1
+    logging.info(f"Indexed {count} faculty members for {college_id}/{department_id}")
+
+    if not watch:
+        return None
+
+    # The listener's first snapshot repeats everything streamed above
+    initial = [True]
+
+    def on_change(snapshots, changes, read_time):
+        if initial[0]:
+            initial[0] = False
+            return
+        for change in changes:
+            doc = change.document
+            if change.type.name == "REMOVED":
+                index.remove(doc.id)
+            else:
+                load_faculty(index, doc.reference, college_id, department_id, doc.to_dict())
+
+    return members_ref.on_snapshot(on_change)
+
+
+# One shared index per process; departments are loaded on first use
+class FacultySearch:
+    def __init__(self, db):
+        self.db = db
+        self.index = BM25Index()
+        self.loaded = {}
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self, college_id, department_id):
+        key = (college_id, department_id)
+        with self.lock:
+            if key not in self.loaded:
+                self.loaded[key] = build_department_index(self.index, self.db, college_id, department_id)
+
+    # Re-index a faculty member that was just stored. Departments not loaded
+    # yet are skipped (their first search streams them). Publications stored
+    # without an abstract (profile list entries) keep the one indexed before.
+    def update(self, college_id, department_id, faculty, publications):
+        with self.lock:
+            if (college_id, department_id) not in self.loaded:
+                return
+        previous = self.index.get(faculty.get("scholar_id")) or {}
+        abstracts = {pub["title"]: pub["abstract"] for pub in previous.get("publications", [])}
+        publications = [pub if pub.get("abstract") else dict(pub, abstract=abstracts.get(pub.get("title"), ""))
+                        for pub in publications]
+        index_faculty(self.index, college_id, department_id, faculty, publications)
+
+    def search(self, query, college_id, department_id, k=10):
+        self.ensure_loaded(college_id, department_id)
+        hits = self.index.search(query, k=k, college=college_id, department=department_id)
+        return [self.index.get(doc_id) for doc_id, score in hits]
@@ -1,15 +1,12 @@
 import time
 import random
 import re
-import firebase_admin
-from firebase_admin import credentials, firestore
 import logging
+from database.recursive_delete import delete_faculty_subtrees
 import traceback
 
-# Initialize Firebase with service account
-cred = credentials.Certificate('/Users/ruba/Downloads/litrix-main/litrix-698fe-firebase-adminsdk-9d1cb-6e9330d347.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+# Shared Firestore client (FIREBASE_CREDENTIALS or default credentials)
+from database.client import db
 
 # Delay to avoid rate-limiting issues
 def delay():
@@ -25,29 +22,11 @@ def extract_doi(pub_url):
     return match.group(0) if match else None
 
 
-# Function to selectively delete faculty members and their publications
-def delete_selected_faculty(college_id, department_id, scholar_ids_to_delete):
-    faculty_members_ref = db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members")
-    
-    # Get all faculty members in the department
-    faculty_members = faculty_members_ref.stream()
-
-    for faculty in faculty_members:
-        if faculty.id in scholar_ids_to_delete:
-            # Delete all publications for the faculty member
-            faculty_ref = faculty_members_ref.document(faculty.id)
-            publications_ref = faculty_ref.collection("publications")
-            publications = publications_ref.stream()
-            
-            for publication in publications:
-                publications_ref.document(publication.id).delete()
-                print(f"Deleted publication {publication.id} for faculty {faculty.id}")
-            
-            # Delete the faculty member
-            faculty_ref.delete()
-            print(f"Deleted faculty member {faculty.id}")
-        else:
-            print(f"Skipped faculty member {faculty.id}, not in deletion list.")
+# Function to selectively delete faculty members and their publications.
+# Addresses the faculty docs directly and deletes their subcollections in
+# parallel batches; pass checkpoint_path to make a large cleanup resumable.
+def delete_selected_faculty(college_id, department_id, scholar_ids_to_delete, checkpoint_path=None):
+    return delete_faculty_subtrees(db, college_id, department_id, scholar_ids_to_delete, checkpoint_path=checkpoint_path)
 
 # Helper function to convert non-string fields to strings where necessary
 def sanitize_field(field):
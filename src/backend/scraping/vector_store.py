@@ -0,0 +1,304 @@
+import os
+import json
+import logging
+import threading
+import fcntl
+from contextlib import contextmanager
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.json"
+
+
+# Stateless embedder: signed feature hashing of word uni/bigrams, L2 normalised.
+# Needs no fitting, so appends never invalidate vectors already stored and
+# every worker process produces identical vectors.
+class HashingEmbedder:
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.vectorizer = HashingVectorizer(n_features=dim, alternate_sign=True, norm="l2",
+                                            stop_words="english", ngram_range=(1, 2))
+
+    def embed(self, texts):
+        return self.vectorizer.transform(texts).toarray().astype(np.float32)
+
+
+# TF-IDF + truncated SVD (LSA) embedder. Gives better semantic neighbours than
+# hashing but has to be fitted on the corpus; saved next to the store with joblib.
+class TfidfSvdEmbedder:
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.pipeline = None
+
+    def fit(self, texts):
+        from sklearn.pipeline import make_pipeline
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.decomposition import TruncatedSVD
+        from sklearn.preprocessing import Normalizer
+
+        self.pipeline = make_pipeline(
+            TfidfVectorizer(stop_words="english", sublinear_tf=True, min_df=2),
+            TruncatedSVD(n_components=self.dim, random_state=0),
+            Normalizer(copy=False),
+        )
+        self.pipeline.fit(texts)
+        return self
+
+    def embed(self, texts):
+        return self.pipeline.transform(texts).astype(np.float32)
+
+    def save(self, path):
+        import joblib
+        joblib.dump(self.pipeline, path)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+        embedder = cls()
+        embedder.pipeline = joblib.load(path)
+        embedder.dim = embedder.pipeline[-2].n_components
+        return embedder
+
+
+# Append-only float32 matrix on disk, read through np.memmap so every worker
+# process shares the same page cache instead of loading its own copy.
+# ids.json maps row -> id and records deleted rows; compact() rewrites both.
+class VectorStore:
+    def __init__(self, path, dim=512, chunk_rows=65536):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        self.vectors_path = os.path.join(path, VECTORS_FILE)
+        self.ids_path = os.path.join(path, IDS_FILE)
+        if not os.path.exists(self.ids_path):
+            self._write_sidecar({"dim": dim, "ids": [], "deleted": [], "meta": {}})
+            open(self.vectors_path, "wb").close()
+
+        self.sidecar_mtime = None
+        self.matrix = None
+        self._reload()
+
+    def _write_sidecar(self, sidecar):
+        tmp = self.ids_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(sidecar, f)
+        os.replace(tmp, self.ids_path)
+
+    # Writers in other processes are serialised with an flock on the store dir
+    @contextmanager
+    def _write_lock(self):
+        with self.lock, open(os.path.join(self.path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Re-map the matrix when another process has appended or compacted
+    def _reload(self):
+        mtime = os.path.getmtime(self.ids_path)
+        if mtime == self.sidecar_mtime:
+            return
+        with open(self.ids_path, "r") as f:
+            sidecar = json.load(f)
+        self.dim = sidecar["dim"]
+        self.ids = sidecar["ids"]
+        self.meta = sidecar.get("meta", {})
+        self.deleted = set(sidecar["deleted"])
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids) if row not in self.deleted}
+        rows = len(self.ids)
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+        self.live = np.ones(rows, dtype=bool)
+        if self.deleted:
+            self.live[list(self.deleted)] = False
+        self.prefix_masks = {}
+        self.sidecar_mtime = mtime
+
+    def __len__(self):
+        self._reload()
+        return len(self.row_of)
+
+    def __contains__(self, doc_id):
+        self._reload()
+        return doc_id in self.row_of
+
+    # Append vectors for ids; an id already present is replaced (old row tombstoned)
+    def append(self, ids, vectors, meta=None):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.shape != (len(ids), self.dim):
+            raise ValueError(f"Expected vectors of shape ({len(ids)}, {self.dim}), got {vectors.shape}")
+        with self._write_lock():
+            self._reload()
+            with open(self.ids_path, "r") as f:
+                sidecar = json.load(f)
+            deleted = set(sidecar["deleted"])
+            for doc_id in ids:
+                if doc_id in self.row_of:
+                    deleted.add(self.row_of[doc_id])
+            with open(self.vectors_path, "r+b") as f:
+                # Drop any rows left over from an interrupted append
+                f.truncate(len(sidecar["ids"]) * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(vectors.tobytes())
+            sidecar["ids"].extend(ids)
+            sidecar["deleted"] = sorted(deleted)
+            if meta:
+                sidecar.setdefault("meta", {}).update(meta)
+            self._write_sidecar(sidecar)
+            self.sidecar_mtime = None
+            self._reload()
+
+    def delete(self, ids):
+        with self._write_lock():
+            self._reload()
+            with open(self.ids_path, "r") as f:
+                sidecar = json.load(f)
+            deleted = set(sidecar["deleted"])
+            for doc_id in ids:
+                if doc_id in self.row_of:
+                    deleted.add(self.row_of[doc_id])
+                    sidecar.get("meta", {}).pop(doc_id, None)
+            sidecar["deleted"] = sorted(deleted)
+            self._write_sidecar(sidecar)
+            self.sidecar_mtime = None
+            self._reload()
+
+    # Rewrite the matrix without deleted rows
+    def compact(self):
+        with self._write_lock():
+            self._reload()
+            keep = np.flatnonzero(self.live)
+            tmp = self.vectors_path + ".tmp"
+            with open(tmp, "wb") as f:
+                for start in range(0, len(keep), self.chunk_rows):
+                    f.write(np.ascontiguousarray(self.matrix[keep[start:start + self.chunk_rows]]).tobytes())
+            ids = [self.ids[row] for row in keep]
+            meta = {doc_id: self.meta[doc_id] for doc_id in ids if doc_id in self.meta}
+            removed = len(self.ids) - len(ids)
+            self.matrix = None
+            os.replace(tmp, self.vectors_path)
+            self._write_sidecar({"dim": self.dim, "ids": ids, "deleted": [], "meta": meta})
+            self.sidecar_mtime = None
+            self._reload()
+            logging.info(f"Compacted vector store {self.path}: removed {removed} rows, {len(ids)} remain")
+            return removed
+
+    def _mask(self, prefix):
+        if prefix is None:
+            return self.live
+        if prefix not in self.prefix_masks:
+            self.prefix_masks[prefix] = self.live & np.fromiter(
+                (doc_id.startswith(prefix) for doc_id in self.ids), dtype=bool, count=len(self.ids))
+        return self.prefix_masks[prefix]
+
+    # Batched cosine top-k. `queries` is (m, dim) of L2-normalised vectors;
+    # returns one [(id, score), ...] list per query. `prefix` limits results
+    # to ids starting with it (e.g. "college/department/").
+    def search(self, queries, k=10, prefix=None):
+        self._reload()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        m = queries.shape[0]
+        if self.matrix is None:
+            return [[] for _ in range(m)]
+
+        mask = self._mask(prefix)
+        best_scores = np.full((m, 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((m, 0), dtype=np.int64)
+        rows = self.matrix.shape[0]
+        for start in range(0, rows, self.chunk_rows):
+            block = self.matrix[start:start + self.chunk_rows]
+            scores = queries @ block.T
+            scores[:, ~mask[start:start + self.chunk_rows]] = -np.inf
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        results = []
+        for i in range(m):
+            hits = []
+            for j in order[i]:
+                score = best_scores[i, j]
+                if np.isfinite(score):
+                    hits.append((self.ids[best_rows[i, j]], float(score)))
+            results.append(hits)
+        return results
+
+    def get_meta(self, doc_id):
+        return self.meta.get(doc_id)
+
+
+def publication_text(pub):
+    bib = pub.get("bib", {})
+    title = pub.get("title") or bib.get("title") or ""
+    abstract = pub.get("abstract") or bib.get("abstract") or ""
+    return f"{title}. {abstract}"
+
+
+# Embed and append one faculty member's publications. Ids are
+# "{college}/{department}/{scholar_id}/{pub_id}" so searches can be scoped.
+def index_publications(store, embedder, college_id, department_id, faculty, publications, batch_size=256):
+    scholar_id = faculty.get("scholar_id")
+    items = []
+    for pub_id, pub in publications:
+        items.append((f"{college_id}/{department_id}/{scholar_id}/{pub_id}", pub))
+
+    for start in range(0, len(items), batch_size):
+        chunk = items[start:start + batch_size]
+        ids = [doc_id for doc_id, _ in chunk]
+        vectors = embedder.embed([publication_text(pub) for _, pub in chunk])
+        meta = {doc_id: {"scholar_id": scholar_id, "name": faculty.get("name", ""),
+                         "title": pub.get("title") or pub.get("bib", {}).get("title", "")}
+                for doc_id, pub in chunk}
+        store.append(ids, vectors, meta)
+    return len(items)
+
+
+# Keep a faculty member's vectors current after a store: embed the written
+# publications and drop the removed ones. A profile list entry (no abstract)
+# that is already embedded keeps its vector, which includes the abstract.
+def update_faculty_vectors(store, embedder, college_id, department_id, faculty, records, written_ids, removed_ids=()):
+    prefix = f"{college_id}/{department_id}/{faculty.get('scholar_id')}/"
+    publications = [(pub_id, records[pub_id]) for pub_id in written_ids
+                    if records[pub_id].get("abstract") or prefix + pub_id not in store]
+    if removed_ids:
+        store.delete([prefix + pub_id for pub_id in removed_ids])
+    return index_publications(store, embedder, college_id, department_id, faculty, publications)
+
+
+# Embed every publication in a department from Firestore
+def build_department_vectors(store, embedder, db, college_id, department_id):
+    members_ref = db.collection("colleges").document(college_id).collection("departments").document(department_id).collection("faculty_members")
+    total = 0
+    for doc in members_ref.stream():
+        faculty = doc.to_dict()
+        faculty.setdefault("scholar_id", doc.id)
+        publications = [(pub.id, pub.to_dict()) for pub in doc.reference.collection("publications").stream()]
+        total += index_publications(store, embedder, college_id, department_id, faculty, publications)
+    logging.info(f"Embedded {total} publications for {college_id}/{department_id}")
+    return total
+
+
+# Semantic search over publication abstracts within one department
+def search_publications(store, embedder, query, college_id, department_id, k=5):
+    hits = store.search(embedder.embed([query]), k=k, prefix=f"{college_id}/{department_id}/")[0]
+    return [dict(store.get_meta(doc_id) or {}, id=doc_id, score=score) for doc_id, score in hits if score > 0]
+
+
+if __name__ == '__main__':
+    import sys
+    from scraping import db
+
+    # python -m scraping.vector_store <store_dir> <college_id> <department_id>
+    store_dir, college_id, department_id = sys.argv[1:4]
+    store = VectorStore(store_dir)
+    build_department_vectors(store, HashingEmbedder(store.dim), db, college_id, department_id)
+    store.compact()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules import from the backend root (from database..., from scraping...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
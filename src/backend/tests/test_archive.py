@@ -0,0 +1,54 @@
+from scraping.scraped_and_stored.archive import ArchiveWriter, ArchiveReader, shard_paths
+
+
+def publication(scholar_id, i, version=1):
+    return {"author_pub_id": f"{scholar_id}:{i}", "bib": {"title": f"Paper {i} v{version}"}, "num_citations": i}
+
+
+def write_author(writer, scholar_id, count, version=1):
+    for i in range(count):
+        writer.write_publication(scholar_id, f"p{i:03d}", publication(scholar_id, i, version))
+    writer.write_author({"scholar_id": scholar_id, "name": scholar_id.upper(), "publications": []})
+
+
+def test_round_trip_across_shard_rollover(tmp_path):
+    with ArchiveWriter(str(tmp_path), "cs", block_size=256, max_shard_bytes=512) as writer:
+        write_author(writer, "a", 60)
+    assert len(shard_paths(str(tmp_path / "cs"))) > 1
+
+    reader = ArchiveReader(str(tmp_path), "cs")
+    pubs = list(reader.publications("a"))
+    assert [pub_id for pub_id, _ in pubs] == [f"p{i:03d}" for i in range(60)]
+    assert reader.get_author("a")["name"] == "A"
+    reader.close()
+
+
+def test_interleaved_authors_across_shards(tmp_path):
+    with ArchiveWriter(str(tmp_path), "cs", block_size=256, max_shard_bytes=512) as writer:
+        for i in range(30):
+            writer.write_publication("a", f"p{i:03d}", publication("a", i))
+            writer.write_publication("b", f"p{i:03d}", publication("b", i))
+        writer.write_author({"scholar_id": "a", "name": "A"})
+        writer.write_author({"scholar_id": "b", "name": "B"})
+
+    reader = ArchiveReader(str(tmp_path), "cs")
+    assert sorted(reader.scholar_ids()) == ["a", "b"]
+    assert len(list(reader.publications("a"))) == 30
+    assert len(list(reader.publications("b"))) == 30
+    reader.close()
+
+
+def test_rescrape_replaces_older_crawl(tmp_path):
+    with ArchiveWriter(str(tmp_path), "cs", block_size=256, max_shard_bytes=512) as writer:
+        write_author(writer, "a", 40)
+    with ArchiveWriter(str(tmp_path), "cs", block_size=256, max_shard_bytes=512) as writer:
+        write_author(writer, "a", 25, version=2)
+        # An unfinished crawl (no author record) is ignored
+        writer.write_publication("a", "p999", publication("a", 999, version=3))
+        writer.crawls.clear()
+
+    reader = ArchiveReader(str(tmp_path), "cs")
+    pubs = list(reader.publications("a"))
+    assert len(pubs) == 25
+    assert all(pub["bib"]["title"].endswith("v2") for _, pub in pubs)
+    reader.close()
@@ -0,0 +1,49 @@
+import json
+import pytest
+from scraping.scraped_and_stored.bulk_ingest import stream_author_file
+
+
+def events(path, chunk_size):
+    return list(stream_author_file(str(path), chunk_size=chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1024])
+def test_numbers_split_across_chunks(tmp_path, chunk_size):
+    data = {"scholar_id": "abc", "citedby": 1.5e10, "hindex": 15000000000.0, "i10index": -12,
+            "publications": [{"num_citations": 42, "score": 2.5E-3}, {"num_citations": 7}],
+            "cites_per_year": {"2020": 123456}}
+    path = tmp_path / "author.json"
+    path.write_text(json.dumps(data))
+
+    fields = {e[1]: e[2] for e in events(path, chunk_size) if e[0] == "field"}
+    pubs = [e[1] for e in events(path, chunk_size) if e[0] == "publication"]
+    assert fields == {k: v for k, v in data.items() if k != "publications"}
+    assert pubs == data["publications"]
+
+
+def test_number_at_end_of_file_is_an_error(tmp_path):
+    path = tmp_path / "author.json"
+    path.write_text('{"hindex": 12')
+    with pytest.raises(ValueError):
+        events(path, 1)
+
+
+def test_manifest_skipped_when_publications_fail():
+    from benchmarks.fake_firestore import FakeFirestore
+    from database.bulk_writer import ParallelBatchWriter
+    from scraping.scraped_and_stored.bulk_ingest import ManifestQueue, write_author, author_documents
+
+    class FailingFirestore(FakeFirestore):
+        def batch(self):
+            raise RuntimeError("unavailable")
+
+    db = FailingFirestore()
+    faculty_ref = db.collection("faculty_members").document("abc")
+    docs = author_documents({"scholar_id": "abc"}, [{"author_pub_id": "abc:1", "bib": {"title": "Paper"}}])
+    with ParallelBatchWriter(db, retries=0) as writer:
+        manifests = ManifestQueue(writer)
+        manifests.add(faculty_ref, write_author(writer, faculty_ref, docs))
+        manifests.commit()
+    assert manifests.skipped == 1
+    # faculty doc, publication and its canonical copy
+    assert writer.stats()["errors"] == 3
@@ -0,0 +1,35 @@
+from database.collaborations import graph_inputs, compute_recommendations
+
+
+def member(name, *papers, coauthors=()):
+    publications = [{"authors": " and ".join(authors)} for authors in papers]
+    faculty = {"name": name, "interests": ["machine learning"],
+               "coauthors": [{"scholar_id": c} for c in coauthors]}
+    return graph_inputs(faculty, publications, "cs")
+
+
+def suggested(recommendations, scholar_id):
+    return {s["scholar_id"] for s in recommendations[scholar_id]}
+
+
+def test_colleague_sharing_own_name_key_is_linked():
+    inputs = {"ali": member("Ali Smith", ["Ali Smith", "Amal Smith"]),
+              "amal": member("Amal Smith", ["Amal Smith", "Other Person"]),
+              "omar": member("Omar Khan", ["Omar Khan"])}
+    assert inputs["ali"]["author_keys"] == {"a smith": 1}
+    # Already co-authors, so not suggested to each other
+    assert suggested(compute_recommendations(inputs), "ali") == {"omar"}
+
+
+def test_ambiguous_name_key_is_not_guessed():
+    inputs = {"ali": member("Ali Smith", ["Ali Smith", "B Jones"]),
+              "bob": member("Bob Jones", ["Bob Jones"]),
+              "ben": member("Ben Jones", ["Ben Jones"])}
+    assert suggested(compute_recommendations(inputs), "ali") == {"bob", "ben"}
+
+
+def test_profile_coauthor_settles_ambiguous_key():
+    inputs = {"ali": member("Ali Smith", ["Ali Smith", "B Jones"], coauthors=["bob"]),
+              "bob": member("Bob Jones", ["Bob Jones"]),
+              "ben": member("Ben Jones", ["Ben Jones"])}
+    assert suggested(compute_recommendations(inputs), "ali") == {"ben"}
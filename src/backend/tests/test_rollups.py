@@ -0,0 +1,25 @@
+from database.rollups import faculty_contribution, aggregate
+
+
+def test_shared_papers_counted_once_per_department():
+    members = {
+        "a": faculty_contribution({"hindex": 3}, [{"pub_year": "2020", "canonical_id": "x"},
+                                                  {"pub_year": "2021", "canonical_id": "y"},
+                                                  {"pub_year": "2021"}]),
+        "b": faculty_contribution({"hindex": 4}, [{"pub_year": "2020", "canonical_id": "x"}]),
+    }
+    assert members["a"]["canonical_count"] == 2
+    rollup = aggregate(members)
+    assert rollup["publications"] == 4
+    assert rollup["unique_publications"] == 3
+    assert rollup["by_year"]["2020"]["unique_publications"] == 1
+    assert rollup["by_year"]["2021"]["unique_publications"] == 1
+
+
+def test_contributions_with_canonical_map_still_aggregate():
+    members = {
+        "a": faculty_contribution({"hindex": 3}, [{"pub_year": "2021", "canonical_id": "y"}]),
+        "old": {"name": "", "hindex": 1, "i10index": 0, "citedby": 0, "publications": 2,
+                "pubs_by_year": {"2021": 2}, "cites_by_year": {}, "canonical": {"y": "2021"}},
+    }
+    assert aggregate(members)["unique_publications"] == 2